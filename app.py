@@ -3,6 +3,8 @@ import os
 import csv
 import cv2
 import shutil
+import time
+import threading
 import numpy as np
 from datetime import datetime
 
@@ -19,11 +21,27 @@ from PyQt5.QtGui import (
     QPainter, QColor, QPen, QBrush, QLinearGradient, QPalette
 )
 
+from backend.memory import MB, MEMORY
+from backend.metrics import METRICS
+from backend.pacing import PaceController
+from backend.profiling import PROFILE_SESSIONS, SamplingProfiler
+from backend.roster import read_roster, resolve_roster
+from backend.session import PRESENCE_INTERVAL, AttendanceSession
+from backend.worker import INFERENCE, InferenceWorker, RemoteSession, SharedFrameRing
+
 # ─── Paths ────────────────────────────────────────────────────────────────────
 DATASET_DIR     = "data/registered_faces"
 ATTENDANCE_FILE = "attendance.csv"
 NUM_IMAGES      = 25
 
+# Stage timings: "overlay" shows them in the camera status bar, "log" prints
+# them every METRICS_LOG_EVERY seconds, anything else keeps them internal
+METRICS_MODE      = os.environ.get("ATTEND_METRICS", "").lower()
+METRICS_LOG_EVERY = 10
+
+# Preview refresh while waiting for the next inference (backend/pacing.py)
+PREVIEW_INTERVAL  = 0.03
+
 # ─── UI CHANGE: Refined colour tokens — deeper blacks, better contrast hierarchy ─
 C_BG       = "#080808"           # UI CHANGE: slightly deeper background
 C_SURFACE  = "#0f0f0f"           # UI CHANGE: richer sidebar surface
@@ -218,22 +236,86 @@ class DonutChart(QWidget):
         p.end()
 
 
+# ─── Frame Ring ──────────────────────────────────────────────────────────────
+# Preallocated frame buffers shared by the camera thread and the GUI. Frames are
+# handed over by reference; a slot is only rewritten `size` frames later, so a
+# consumer that keeps up never sees a frame change under it. Anything that must
+# outlive that keeps its own copy (CameraThread.inferred for captures).
+
+class FrameRing:
+    def __init__(self, size=4):
+        self.size  = size
+        self.slots = []
+
+    def put(self, frame, frame_id):
+        if not self.slots or self.slots[0].shape != frame.shape:
+            self.slots = [np.empty_like(frame) for _ in range(self.size)]
+        i = frame_id % self.size
+        cv2.flip(frame, 1, dst=self.slots[i])
+        return self.slots[i]
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self.slots)
+
+
 # ─── Camera Thread ───────────────────────────────────────────────────────────
-# !! NO LOGIC CHANGES — untouched !!
+# Every frame gets an id; results carry the id of the frame they were computed
+# on, so pages can pair a frame with its inference output without re-running it.
+#
+# By default the thread only captures: inference runs in a worker process
+# (backend/worker.py) that reads frames from a shared memory ring, so the GUI
+# stays smooth while inference is saturated, and a crashed worker is restarted
+# with the students already present. ATTEND_INFERENCE=thread, or a worker that
+# fails to start, runs inference here instead.
 
 class CameraThread(QThread):
     frame_ready   = pyqtSignal(np.ndarray)
     results_ready = pyqtSignal(list, set)
 
-    def __init__(self, engine, mode="attendance"):
+    def __init__(self, engine, mode="attendance", roster=None):
         super().__init__()
         self.engine   = engine
         self.mode     = mode
+        self.roster   = roster
         self._running = False
-        self.recognized = set()
+        self.remote   = INFERENCE == "process"
+        if self.remote:
+            try:
+                self.ring = SharedFrameRing()
+            except Exception as e:
+                print("Shared frame ring unavailable, running in-process:", e)
+                METRICS.inc("errors")
+                self.remote = False
+        if self.remote:
+            self.session = RemoteSession(roster) if mode == "attendance" else None
+        else:
+            self.session = AttendanceSession(engine, roster) if mode == "attendance" else None
+            self.ring    = FrameRing()
+        self.recognized = self.session.present if self.session else set()
+        self.frame_id = 0
+        self.pace     = PaceController(engine)
+        self.worker   = None
+        self.client   = None
+        self.restart  = None
+        self.restart_error = None
+        self.in_flight = False
+        self.next_due = 0.0
+        # register mode: (frame id, private copy of the frame, results) of the
+        # last frame inference ran on, so capture saves exactly that frame
+        self.inferred = None
+        self.sent     = None
+        self.worker_brief = ""
+        self.profiler = None
+        self.worker_profile = None
+        MEMORY.track(f"ring.{mode}", lambda: self.ring.nbytes)
 
     def run(self):
         self._running = True
+        if self.profiler:
+            self.profiler.add_thread(threading.get_ident(), "camera")
+        if self.remote:
+            self._start_worker()
         for i in range(3):
             cap = cv2.VideoCapture(i)
             if cap.isOpened():
@@ -242,41 +324,165 @@ class CameraThread(QThread):
         cap.set(cv2.CAP_PROP_FRAME_WIDTH,  1280)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
+        raw = None
+        last_log = time.monotonic()
         while self._running:
-            ret, frame = cap.read()
+            with METRICS.time("capture"):
+                ret, raw = cap.read(raw)
             if not ret:
+                METRICS.inc("dropped_frames")
                 break
-            frame = cv2.flip(frame, 1)
-
-            results = []
+            METRICS.inc("frames")
+            self.frame_id += 1
+            fid = self.frame_id
             try:
-                faces = self.engine.app.get(frame)
-
-                if self.mode == "attendance":
-                    from backend.engine import remove_duplicates
-                    faces = remove_duplicates(faces)
-                    for face in faces:
-                        name, score = self.engine.match(face.embedding)
-                        x1,y1,x2,y2 = map(int, face.bbox)
-                        results.append({"name": name, "score": float(score), "box": (x1,y1,x2,y2)})
-                        if name != "Unknown":
-                            self.recognized.add(name)
-                else:
-                    for face in faces:
-                        x1,y1,x2,y2 = map(int, face.bbox)
-                        results.append({"box": (x1,y1,x2,y2)})
+                frame = self.ring.put(raw, fid)
             except Exception as e:
-                print("Camera thread error:", e)
+                if not self.remote:
+                    raise
+                # no shared memory for the frame (e.g. /dev/shm full)
+                self._start_worker(error=e)
+                frame = self.ring.put(raw, fid)
 
-            self.results_ready.emit(results, set(self.recognized))
-            self.frame_ready.emit(frame.copy())
-            self.msleep(30)
+            results = self._infer_remote(frame, fid) if self.remote else self._infer(frame, fid)
+
+            if METRICS_MODE == "log" and time.monotonic() - last_log >= METRICS_LOG_EVERY:
+                last_log = time.monotonic()
+                print("Metrics:", self.brief())
+
+            if results is not None:
+                self.results_ready.emit(results, set(self.recognized))
+            self.frame_ready.emit(frame)
+            self.msleep(int(min(max(self.next_due - time.monotonic(), 0), PREVIEW_INTERVAL) * 1000))
 
         cap.release()
 
+    def _infer(self, frame, fid):
+        # the pace controller decides how often frames go through inference
+        # (and at what detection size); the preview keeps the camera's rate
+        if time.monotonic() < self.next_due:
+            return None
+        started = self.pace.start()
+        results = None
+        try:
+            if self.mode == "attendance":
+                # the session skips faces it already knows, and once the
+                # whole roster is present only checks every few seconds
+                if self.session.due():
+                    with MEMORY.trace("frame"):
+                        results = self.session.process(frame)
+                    for r in results:
+                        r["frame_id"] = fid
+            else:
+                # register mode keeps the embeddings so capture can run the
+                # duplicate check without a second inference on the frame
+                with MEMORY.trace("frame"):
+                    faces = self.engine.analyze(frame)
+                results = []
+                for face in faces:
+                    x1,y1,x2,y2 = map(int, face.bbox)
+                    results.append({"box": (x1,y1,x2,y2), "embedding": face.embedding,
+                                    "skipped": face.skipped, "frame_id": fid})
+                self.inferred = (fid, frame.copy(), results)
+        except Exception as e:
+            print("Camera thread error:", e)
+            METRICS.inc("errors")
+            METRICS.inc("dropped_frames")
+            results = []
+        if results is not None:
+            self.next_due = time.monotonic() + self.pace.observe(started)
+        return results
+
+    def _start_worker(self, error=None):
+        try:
+            if error is not None:
+                raise error
+            self.worker = InferenceWorker.shared(self.engine)
+            if self.client is None:
+                self.client = self.worker.connect()
+            present = self.session.present if self.session else ()
+            self.worker.start(self.client, self.mode, self.roster, present, profile=self.profiler is not None)
+        except Exception as e:
+            # no worker: fall back to inference in this thread
+            print("Inference worker unavailable, running in-process:", e)
+            METRICS.inc("errors")
+            self.remote, self.worker = False, None
+            # nothing reads the shared ring any more
+            if isinstance(self.ring, SharedFrameRing):
+                self.ring.close(unlink=True)
+                self.ring = FrameRing()
+            if self.session is not None:
+                present = self.session.present
+                self.session = AttendanceSession(self.engine, self.roster)
+                for name in present:
+                    self.session.mark(name)
+                self.recognized = self.session.present
+        self.in_flight = False
+
+    def _infer_remote(self, frame, fid):
+        # hand the newest frame to the worker when it is free and due, and
+        # pick up whatever it has finished; never waits for inference
+        results = None
+        reply = self.worker.poll(self.client)
+        if reply is not None and reply[0] == "results":
+            _, result_fid, results, present, complete, wait, self.worker_brief = reply
+            self.in_flight = False
+            if self.sent is not None and self.sent[0] == result_fid:
+                self.inferred = (result_fid, self.sent[1], results)
+            self.next_due = time.monotonic() + wait
+            if self.session is not None:
+                self.session.present.update(present)
+                self.session.complete = complete
+
+        if self.in_flight and not self.worker.alive:
+            # the worker died mid-frame; reload its models off this thread so
+            # the preview keeps running, then hand it this session's progress
+            if self.restart is None:
+                self.restart_error = None
+                self.restart = threading.Thread(target=self._restart_worker,
+                                                name="attend-restart", daemon=True)
+                self.restart.start()
+            if self.restart.is_alive():
+                return results
+            self.restart = None
+            self._start_worker(self.restart_error)
+            if not self.remote:
+                return results
+
+        if not self.in_flight and time.monotonic() >= self.next_due:
+            self.worker.send(self.client, self.ring, fid)
+            self.in_flight = True
+            if self.mode == "register":
+                # the ring slot is reused before the results come back
+                self.sent = (fid, frame.copy())
+        return results
+
+    def _restart_worker(self):
+        try:
+            InferenceWorker.shared(self.engine)
+        except Exception as e:
+            self.restart_error = e
+
+    def brief(self):
+        if self.remote:
+            return f"{METRICS.brief()} · worker: {self.worker_brief or 'starting'}"
+        return f"{METRICS.brief()} · {self.pace.brief()}"
+
     def stop(self):
         self._running = False
         self.wait()
+        if self.worker is not None:
+            state = self.worker.stop(self.client)
+            self.worker.disconnect(self.client)
+            if state is not None:
+                present, evidence, self.worker_profile = state
+                if self.session is not None:
+                    self.session.present.update(present)
+                    if evidence is not None:
+                        self.session.evidence = evidence
+        if isinstance(self.ring, SharedFrameRing):
+            self.ring.close(unlink=True)
+        MEMORY.untrack(f"ring.{self.mode}")
 
 
 # ─── Camera Card ─────────────────────────────────────────────────────────────
@@ -294,6 +500,7 @@ class CameraCard(QWidget):
             }}
         """)
         shadow(self, blur=40, opacity=140)
+        self._view = None
         v = QVBoxLayout(self)
         v.setContentsMargins(0, 0, 0, 0)
 
@@ -352,25 +559,43 @@ class CameraCard(QWidget):
             self.cam_status_lbl.setStyleSheet(f"color: {C_SUBTEXT}; background: transparent;")
 
     def update_frame(self, frame, results=None):
+        # Frames arrive as shared ring buffers: never draw on them. Scale to the
+        # label's device-pixel size first and draw the overlay on the small copy.
+        h, w = frame.shape[:2]
+        dpr  = self.feed.devicePixelRatioF()
+        s    = min(self.feed.width() * dpr / w, self.feed.height() * dpr / h)
+        tw, th = max(int(w * s), 1), max(int(h * s), 1)
+        if self._view is None or self._view.shape[:2] != (th, tw):
+            self._view = np.empty((th, tw, 3), np.uint8)
+        view = cv2.resize(frame, (tw, th), dst=self._view, interpolation=cv2.INTER_LINEAR)
+
         if results:
             for r in results:
-                x1,y1,x2,y2 = r["box"]
+                x1,y1,x2,y2 = (int(c * s) for c in r["box"])
                 name  = r.get("name","")
                 score = r.get("score", 0)
                 color = (48,209,88) if name not in ("Unknown","") else (255,55,95)
+                # UI CHANGE: matches still gathering evidence in amber
+                if r.get("pending"):
+                    color = (10,159,255)
+                # UI CHANGE: faces skipped by the quality gate in grey, with the reason
+                if r.get("skipped"):
+                    color, name, score = (147,142,142), f"skipped: {r['skipped']}", 0
                 # UI CHANGE: thinner box (1px) for cleaner overlay
-                cv2.rectangle(frame,(x1,y1),(x2,y2),color,1)
+                cv2.rectangle(view,(x1,y1),(x2,y2),color,1)
                 if name:
                     tag = f"{name}  {score:.2f}" if score else name
-                    cv2.putText(frame, tag, (x1, y1-10),
+                    if r.get("guest"):
+                        tag += "  (other class)"
+                    elif r.get("pending"):
+                        tag += "  (confirming)"
+                    cv2.putText(view, tag, (x1, y1-10),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.55, color, 1, cv2.LINE_AA)
-        h,w,ch = frame.shape
-        img = QImage(frame.data, w, h, ch*w, QImage.Format_BGR888)
+
+        img = QImage(view.data, tw, th, view.strides[0], QImage.Format_BGR888)
         pix = QPixmap.fromImage(img)
-        self.feed.setPixmap(
-            pix.scaled(self.feed.width(), self.feed.height(),
-                       Qt.KeepAspectRatio, Qt.SmoothTransformation)
-        )
+        pix.setDevicePixelRatio(dpr)
+        self.feed.setPixmap(pix)
 
 
 # ─── Sidebar ─────────────────────────────────────────────────────────────────
@@ -427,7 +652,7 @@ class Sidebar(QWidget):
         ("⊕", "Register Student"),
     ]
 
-    def __init__(self, parent=None):
+    def __init__(self, model_name="buffalo_l", parent=None):
         super().__init__(parent)
         self.setFixedWidth(220)  # UI CHANGE: slightly wider for better breathing room
         self.setStyleSheet(f"""
@@ -492,7 +717,7 @@ class Sidebar(QWidget):
         v.addStretch()
 
         # UI CHANGE: bottom model info pill
-        model_pill = QLabel("buffalo_l · ArcFace")
+        model_pill = QLabel(f"{model_name} · ArcFace")
         model_pill.setFont(QFont("SF Pro Text", 10))
         model_pill.setAlignment(Qt.AlignCenter)
         model_pill.setStyleSheet(f"""
@@ -658,7 +883,7 @@ class DashboardPage(QWidget):
                             continue
                         parts = line.split()
                         if len(parts) >= 3:
-                            if parts[-1] == "Present":
+                            if parts[2] == "Present":
                                 present += 1
                             else:
                                 absent += 1
@@ -686,6 +911,8 @@ class AttendancePage(QWidget):
         super().__init__(parent)
         self.engine     = engine
         self.cam_thread = None
+        self.profiler   = None
+        self.roster     = None
         self.latest_results = []
         self.recognized = set()
         self.setStyleSheet(f"background: {C_BG};")
@@ -724,6 +951,19 @@ class AttendancePage(QWidget):
         """)
         info_row.addWidget(self.status_pill)
 
+        # UI CHANGE: roster pill — which class this session is for
+        self.roster_pill = QLabel("All students")
+        self.roster_pill.setFont(QFont("SF Pro Text", 12))
+        self.roster_pill.setAlignment(Qt.AlignCenter)
+        self.roster_pill.setStyleSheet(f"""
+            color: {C_SUBTEXT};
+            background: {C_CARD};
+            border: 1px solid {C_BORDER};
+            border-radius: 20px;
+            padding: 4px 14px;
+        """)
+        info_row.addWidget(self.roster_pill)
+
         self.count_badge = QLabel("0 recognized")
         self.count_badge.setFont(QFont("SF Pro Text", 12))
         self.count_badge.setAlignment(Qt.AlignCenter)
@@ -748,24 +988,61 @@ class AttendancePage(QWidget):
         row.setSpacing(10)
         self.start_btn = pill_btn("Start Session", primary=True)
         self.stop_btn  = pill_btn("End & Save")
+        self.roster_btn = pill_btn("Load Roster")
         self.stop_btn.setEnabled(False)
         self.start_btn.clicked.connect(self._start)
         self.stop_btn.clicked.connect(self._stop)
+        self.roster_btn.clicked.connect(self._load_roster)
+        row.addWidget(self.roster_btn)
         row.addStretch()
         row.addWidget(self.stop_btn)
         row.addWidget(self.start_btn)
         v.addLayout(row)
 
+    def _load_roster(self):
+        # second click clears the roster back to all registered students
+        if self.roster is not None:
+            self.roster = None
+            self.roster_btn.setText("Load Roster")
+            self.roster_pill.setText("All students")
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Load Class Roster", "", "Roster Files (*.txt *.csv);;All Files (*)"
+        )
+        if not path:
+            return
+        try:
+            roster, missing = resolve_roster(read_roster(path), self.engine.names)
+        except Exception as e:
+            print("Roster load error:", e)
+            return
+        if missing:
+            print(f"Roster entries not registered ({len(missing)}):", ", ".join(missing))
+        if not roster:
+            return
+        self.roster = roster
+        self.roster_btn.setText("Clear Roster")
+        self.roster_pill.setText(f"{os.path.splitext(os.path.basename(path))[0]} · {len(roster)} students")
+
     def _start(self):
         if self.cam_thread and self.cam_thread.isRunning():
             return
         self.recognized = set()
-        self.cam_thread = CameraThread(self.engine, mode="attendance")
+        self.cam_thread = CameraThread(self.engine, mode="attendance", roster=self.roster)
         self.cam_thread.frame_ready.connect(self._frame)
         self.cam_thread.results_ready.connect(self._results)
+        if PROFILE_SESSIONS:
+            # profile the whole session: camera thread plus GUI rendering
+            # here, inference in the worker's own profile (backend/worker.py)
+            self.profiler = SamplingProfiler("session")
+            self.profiler.add_thread(threading.get_ident(), "gui")
+            self.cam_thread.profiler = self.profiler
+            self.profiler.start()
+        MEMORY.start_session()
         self.cam_thread.start()
         self.start_btn.setEnabled(False)
         self.stop_btn.setEnabled(True)
+        self.roster_btn.setEnabled(False)
         # UI CHANGE: update status pill styling on session start
         self.status_pill.setText("● Live")
         self.status_pill.setStyleSheet(f"""
@@ -783,9 +1060,15 @@ class AttendancePage(QWidget):
     def _results(self, results, names):
         self.latest_results = results
         self.recognized     = names
+        if METRICS_MODE == "overlay":
+            brief = self.cam_thread.brief() if self.cam_thread else METRICS.brief()
+            self.cam_card.cam_status_lbl.setText(f"Live · {brief}")
         # UI CHANGE: count badge updates live
         n = len(names)
-        self.count_badge.setText(f"{n} student{'s' if n != 1 else ''} recognized")
+        if self.cam_thread and self.cam_thread.session.complete:
+            self.count_badge.setText(f"All {n} present · checking every {PRESENCE_INTERVAL:g}s")
+        else:
+            self.count_badge.setText(f"{n} student{'s' if n != 1 else ''} recognized")
         self.count_badge.setStyleSheet(f"""
             color: {C_PRESENT if n > 0 else C_SUBTEXT};
             background: {C_PRESENT_DIM if n > 0 else C_CARD};
@@ -795,11 +1078,17 @@ class AttendancePage(QWidget):
         """)
 
     def _stop(self):
+        evidence, worker_profile = None, None
         if self.cam_thread:
             self.cam_thread.stop()
+            # stop() merges the worker's last frame into the session
+            self.recognized = set(self.cam_thread.session.present)
+            evidence = self.cam_thread.session.evidence
+            worker_profile = self.cam_thread.worker_profile
             self.cam_thread = None
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
+        self.roster_btn.setEnabled(True)
         # UI CHANGE: reset status pill on stop
         self.status_pill.setText("● Inactive")
         self.status_pill.setStyleSheet(f"""
@@ -812,9 +1101,21 @@ class AttendancePage(QWidget):
         self.cam_card.set_active(False)
         try:
             from src.attendance import write_attendance
-            write_attendance(self.recognized)
+            with METRICS.time("persist"):
+                write_attendance(self.recognized, self.roster, evidence)
         except Exception as e:
             print("Attendance write error:", e)
+            METRICS.inc("errors")
+        if self.profiler:
+            path = self.profiler.stop()
+            self.profiler = None
+            if path:
+                print("Session profile written to", path)
+        if worker_profile:
+            print("Inference worker profile written to", worker_profile)
+        peak = MEMORY.end_session()
+        if peak:
+            print(f"Session peak RSS {peak / MB:.0f} MB")
         self.session_finished.emit()
 
 # ─── Results Page ─────────────────────────────────────────────────────────────
@@ -843,7 +1144,7 @@ class ResultsPage(QWidget):
         outer.setContentsMargins(0, 0, 0, 0)
         outer.addWidget(self.scroll)
 
-    def load(self, recognized_names):
+    def load(self, recognized_names, roster=None):
         inner = QWidget()
         inner.setStyleSheet(f"background: {C_BG};")
         v = QVBoxLayout(inner)
@@ -862,9 +1163,11 @@ class ResultsPage(QWidget):
 
         v.addSpacing(28)
 
-        # Build sorted data (NO LOGIC CHANGE)
+        # Build sorted data: the session roster if one was loaded, else every student
         all_students = []
-        if os.path.isdir(DATASET_DIR):
+        if roster is not None:
+            all_students = sorted(roster, key=lambda x: x.split("_",1)[-1].lower())
+        elif os.path.isdir(DATASET_DIR):
             all_students = sorted(
                 [n for n in os.listdir(DATASET_DIR) if os.path.isdir(os.path.join(DATASET_DIR, n))],
                 key=lambda x: x.split("_",1)[-1].lower()
@@ -1108,7 +1411,6 @@ class RegisterPage(QWidget):
         self.count        = 0
         self.student_name = ""
         self.latest_res   = []
-        self._frame_buf   = None
         self.setStyleSheet(f"background: {C_BG};")
 
         v = QVBoxLayout(self)
@@ -1265,7 +1567,6 @@ class RegisterPage(QWidget):
         self.retake_btn.setEnabled(False)
 
     def _on_frame(self, frame):
-        self._frame_buf = frame.copy()
         self.cam_card.update_frame(frame, self.latest_res)
 
     def _on_results(self, results, _):
@@ -1273,14 +1574,20 @@ class RegisterPage(QWidget):
         self.cap_btn.setEnabled(True)
 
     def _capture(self):
-        if self._frame_buf is None:
+        inferred = self.cam_thread.inferred if self.cam_thread else None
+        if inferred is None:
             return
 
-        try:
-            faces = self.engine.app.get(self._frame_buf)
+        # save the frame the latest results were computed on, not the newest
+        # preview frame: the duplicate check and the quality gate then judge
+        # the saved image without a second inference
+        _, frame, faces = inferred
 
+        try:
             for face in faces:
-                name, score = self.engine.match(face.embedding)
+                if face["embedding"] is None:
+                    continue
+                name, score = self.engine.match(face["embedding"])
 
                 if name != "Unknown" and score > 0.5:
                     # UI CHANGE: styled warning message in prog_lbl
@@ -1292,18 +1599,25 @@ class RegisterPage(QWidget):
         except Exception as e:
             print("Duplication check error:", e)
 
-        if not self.latest_res:
+        if not faces:
             # UI CHANGE: styled no-face warning
             self.prog_lbl.setText("No face detected")
             self.prog_lbl.setStyleSheet(f"color: {C_ABSENT}; background: transparent;")
             self.cap_btn.setEnabled(False)
             return
 
+        # UI CHANGE: refuse shots the quality gate would skip at attendance time
+        skipped = [r["skipped"] for r in faces if r.get("skipped")]
+        if faces and len(skipped) == len(faces):
+            self.prog_lbl.setText(f"Face not clear enough ({skipped[0]}), try again")
+            self.prog_lbl.setStyleSheet(f"color: {C_ABSENT}; background: transparent;")
+            return
+
         d = os.path.join(DATASET_DIR, self.student_name)
         os.makedirs(d, exist_ok=True)
 
         path = os.path.join(d, f"{self.student_name}_{self.count}.jpg")
-        cv2.imwrite(path, self._frame_buf)
+        cv2.imwrite(path, frame)
 
         if self.count < NUM_IMAGES:
             self.count += 1
@@ -1325,7 +1639,15 @@ class RegisterPage(QWidget):
 
     def _confirm(self):
         try:
-            self.engine.load_faces()
+            # only the new student's folder is embedded, once: by the inference
+            # worker when it runs, after which this process takes the rows from
+            # the embedding cache for its duplicate check without loading models
+            persons = {self.student_name}
+            worker = InferenceWorker.running()
+            if worker:
+                worker.apply(persons, lambda: self.engine.gallery.apply(self.engine, persons, cached_only=True))
+            else:
+                self.engine.gallery.apply(self.engine, persons)
         except Exception as e:
             print("Reload error:", e)
 
@@ -1362,7 +1684,6 @@ class RegisterPage(QWidget):
         self.close_btn.setEnabled(False)
         self.open_btn.setEnabled(True)
 
-        self._frame_buf = None
         self.latest_res = []
 
         self.cam_card.feed.setText("No camera feed")
@@ -1400,13 +1721,17 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print("Engine load error:", e)
 
+        # load the inference worker's models while the user picks a page
+        if self.engine and INFERENCE == "process":
+            threading.Thread(target=self._start_worker, name="worker-start", daemon=True).start()
+
         root  = QWidget()
         root_h = QHBoxLayout(root)
         root_h.setContentsMargins(0, 0, 0, 0)
         root_h.setSpacing(0)
         self.setCentralWidget(root)
 
-        self.sidebar = Sidebar()
+        self.sidebar = Sidebar(self.engine.model_pack if self.engine else "no model")
         self.sidebar.nav.connect(self._nav)
         root_h.addWidget(self.sidebar)
 
@@ -1432,16 +1757,23 @@ class MainWindow(QMainWindow):
         self.pg_results.retake.connect(self._retake)
         
 
+    def _start_worker(self):
+        try:
+            InferenceWorker.shared(self.engine)
+        except Exception as e:
+            # the camera thread tries again and falls back to in-process inference
+            print("Inference worker start error:", e)
+
     def _nav(self, idx):
         pages = [self.pg_dash, self.pg_attend, self.pg_register]
         self.stack.setCurrentWidget(pages[idx])
         if idx == 0:
             self.pg_dash.refresh()
 
-    def _show_results(self, names):
+    def _show_results(self, names, roster=None):
         if self.stack.indexOf(self.pg_results) == -1:
             self.stack.addWidget(self.pg_results)
-        self.pg_results.load(names)
+        self.pg_results.load(names, roster)
         self.stack.setCurrentWidget(self.pg_results)
 
     def _retake(self):
@@ -1453,12 +1785,15 @@ class MainWindow(QMainWindow):
         self.pg_dash.refresh()
 
         # show results page (keep your existing flow)
-        self._show_results(self.pg_attend.recognized)
+        self._show_results(self.pg_attend.recognized, self.pg_attend.roster)
 
     def closeEvent(self, e):
         for pg in [self.pg_attend, self.pg_register]:
             if pg.cam_thread:
                 pg.cam_thread.stop()
+        worker = InferenceWorker.running()
+        if worker:
+            worker.close()
         e.accept()
 
 
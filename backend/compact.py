@@ -0,0 +1,268 @@
+"""Compact a gallery to a few representative images per student.
+
+Every registration adds 25 near-identical captures (more with retakes), and
+each one is a row that every match is compared with. This keeps the `--keep`
+most representative images of each identity (k-medoids on cosine distance)
+and flags outliers: images whose nearest other image belongs to somebody
+else, usually a mislabelled or badly lit capture. Outliers are never kept.
+
+    python -m backend.compact --gallery default --keep 5 --out default-compact
+    python -m backend.compact --keep 3 --dry-run --report compact.json
+    python -m backend.compact --keep 5 --in-place
+
+By default the compacted gallery is written as a new named gallery under
+data/galleries/<out> (see backend/gallery.py), with its embedding cache
+filled in, so it can be tried with {"gallery": "<out>"} before replacing
+anything. --in-place moves the dropped images of the gallery itself to
+data/.pruned/<gallery>/ instead; a running server picks that up through the
+gallery watcher.
+
+The report compares the full and the compacted gallery: rows, matrix memory,
+match time per probe, and leave-one-out accuracy at the match threshold over
+every image (rank1, FAR, FRR, as in benchmarks/evaluate.py).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from backend.embedding_cache import EmbeddingCache
+from backend.engine import DET_SIZE, SIM_THRESHOLD, Engine
+from backend.gallery import DEFAULT_GALLERY, GALLERIES_DIR, GALLERY_NAME, Gallery
+from backend.memory import MB, names_nbytes
+
+KEEP         = 5
+PRUNED_DIR   = "data/.pruned"
+MEDOID_ITERS = 10
+DUPLICATE    = 1 - 1e-6
+CHUNK        = 1024
+
+
+def nearest_by_identity(probes, probe_ids, probe_rows, gallery, gallery_ids, gallery_rows):
+    # -> (best score against the probe's own identity, best against anyone
+    # else) per probe; rows are image numbers, so a probe is never compared
+    # with its own image
+    own = np.full(len(probes), -np.inf, np.float32)
+    other = np.full(len(probes), -np.inf, np.float32)
+
+    for start in range(0, len(probes), CHUNK):
+        stop = start + CHUNK
+        sims = probes[start:stop] @ gallery.T
+        sims[probe_rows[start:stop, None] == gallery_rows[None, :]] = -np.inf
+        same = probe_ids[start:stop, None] == gallery_ids[None, :]
+        own[start:stop] = np.where(same, sims, -np.inf).max(axis=1, initial=-np.inf)
+        other[start:stop] = np.where(same, -np.inf, sims).max(axis=1, initial=-np.inf)
+
+    return own, other
+
+
+def identity_ids(names, people):
+    # -> identity number of every row, people being the sorted distinct names
+    number = {name: i for i, name in enumerate(people)}
+    return np.array([number[n] for n in names])
+
+
+def accuracy(own, other, threshold):
+    genuine = np.isfinite(own)
+    correct = genuine & (own > other) & (own > threshold)
+    return {
+        "rank1": float(np.mean(own[genuine] > other[genuine])) if genuine.any() else 0.0,
+        "far": float(np.mean(other > threshold)),
+        "frr": float(1 - correct[genuine].mean()) if genuine.any() else 0.0,
+    }
+
+
+def medoids(emb, k):
+    # indices of up to k representative rows: farthest-first start, then
+    # k-medoids (assign to the nearest medoid, move each medoid to its
+    # cluster's most central member) until nothing changes. Seeding stops
+    # early once every remaining row duplicates a chosen one.
+    n = len(emb)
+    if n <= k:
+        return list(range(n))
+
+    sims = emb @ emb.T
+    chosen = [int(sims.sum(axis=1).argmax())]
+    while len(chosen) < k:
+        nearest = sims[:, chosen].max(axis=1)
+        nearest[chosen] = np.inf
+        i = int(nearest.argmin())
+        if nearest[i] >= DUPLICATE:
+            break
+        chosen.append(i)
+
+    for _ in range(MEDOID_ITERS):
+        cluster = sims[:, chosen].argmax(axis=1)
+        moved = []
+        for c, medoid in enumerate(chosen):
+            members = np.flatnonzero(cluster == c)
+            if not len(members):
+                moved.append(medoid)
+                continue
+            moved.append(int(members[sims[np.ix_(members, members)].sum(axis=1).argmax()]))
+        if moved == chosen:
+            break
+        chosen = moved
+
+    return sorted(set(chosen))
+
+
+def match_ms(gallery, repeat=200):
+    if not len(gallery):
+        return 0.0
+    probe = gallery[0]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        (gallery @ probe).argmax()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def compact(emb, names, keep=KEEP):
+    # -> (rows kept, {row: nearest other identity} for the outliers)
+    people = sorted(set(names))
+    ids = identity_ids(names, people)
+    rows = np.arange(len(names))
+
+    own, other = nearest_by_identity(emb, ids, rows, emb, ids, rows)
+
+    outliers = {}
+    for i in np.flatnonzero(np.isfinite(own) & (other > own)):
+        sims = emb @ emb[i]
+        sims[ids == ids[i]] = -np.inf
+        outliers[int(i)] = names[int(sims.argmax())]
+
+    kept = []
+    for p in range(len(people)):
+        members = np.flatnonzero(ids == p)
+        clean = np.array([i for i in members if i not in outliers])
+        # a student whose every image looks like somebody else still keeps some
+        pool = clean if len(clean) else members
+        kept += [int(pool[i]) for i in medoids(emb[pool], keep)]
+
+    return sorted(kept), outliers
+
+
+def report(emb, names, kept, threshold):
+    people = sorted(set(names))
+    ids = identity_ids(names, people)
+    rows = np.arange(len(names))
+    kept = np.array(kept, dtype=np.int64)
+
+    full = accuracy(*nearest_by_identity(emb, ids, rows, emb, ids, rows), threshold)
+    small = accuracy(*nearest_by_identity(emb, ids, rows, emb[kept], ids[kept], kept), threshold)
+
+    kept_names = [names[i] for i in kept]
+    return {
+        "identities": len(people),
+        "rows": [len(names), len(kept)],
+        "matrix_mb": [round((emb.nbytes + names_nbytes(names)) / MB, 3),
+                      round((emb[kept].nbytes + names_nbytes(kept_names)) / MB, 3)],
+        "match_ms": [round(match_ms(emb), 4), round(match_ms(emb[kept]), 4)],
+        "threshold": threshold,
+        "full": {k: round(v, 4) for k, v in full.items()},
+        "compact": {k: round(v, 4) for k, v in small.items()},
+    }
+
+
+def write_gallery(out, engine, gallery, emb, paths, kept):
+    root = os.path.join(GALLERIES_DIR, out)
+    if os.path.exists(root):
+        raise SystemExit(f"{root} already exists; pick another --out or remove it")
+
+    target = Gallery(out, root)
+    cache = EmbeddingCache(target.cache_tag(engine.model_tag))
+
+    for i in kept:
+        dest = os.path.join(root, os.path.relpath(paths[i], gallery.root))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.copy2(paths[i], dest)
+        # the embedding is already known: seed the new gallery's cache
+        cache.put(dest, emb[i])
+
+    cache.save()
+    return root
+
+
+def prune_in_place(gallery, paths, kept):
+    kept = set(kept)
+    root = os.path.join(PRUNED_DIR, gallery.name)
+    moved = 0
+    for i, path in enumerate(paths):
+        if i in kept:
+            continue
+        dest = os.path.join(root, os.path.relpath(path, gallery.root))
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(path, dest)
+        moved += 1
+    return root, moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep a few representative images per student")
+    parser.add_argument("--gallery", default=DEFAULT_GALLERY)
+    parser.add_argument("--keep", type=int, default=KEEP, help="images kept per student")
+    parser.add_argument("--pack", help="model pack (default: ATTEND_MODEL_PACK)")
+    parser.add_argument("--det-size", type=int, default=DET_SIZE)
+    parser.add_argument("--threshold", type=float, default=SIM_THRESHOLD)
+    parser.add_argument("--out", help="name of the compacted gallery (default: <gallery>-compact)")
+    parser.add_argument("--in-place", action="store_true", help=f"move dropped images to {PRUNED_DIR}/")
+    parser.add_argument("--dry-run", action="store_true", help="only report")
+    parser.add_argument("--report", help="write the report as .json")
+    args = parser.parse_args()
+
+    if args.keep < 1:
+        parser.error("--keep must be at least 1")
+    out = args.out or f"{args.gallery}-compact"
+    if not GALLERY_NAME.match(out) or out == DEFAULT_GALLERY:
+        parser.error(f"invalid gallery name {out!r}")
+
+    engine = Engine(model_pack=args.pack, det_size=args.det_size, load_gallery=False)
+    gallery = Gallery(args.gallery)
+    emb, names, paths = gallery.samples(engine)
+    if not len(names):
+        raise SystemExit(f"No faces in gallery {gallery.name!r}")
+
+    kept, outliers = compact(emb, names, args.keep)
+    summary = report(emb, names, kept, args.threshold)
+
+    print(f"{gallery.name}: {summary['identities']} students, "
+          f"{summary['rows'][0]} -> {summary['rows'][1]} rows (keep {args.keep})")
+    print(f"{'':<10}{'rows':>8}{'MB':>9}{'match_ms':>10}{'rank1':>8}{'far':>8}{'frr':>8}")
+    for col, label in ((0, "full"), (1, "compact")):
+        acc = summary[label]
+        print(f"{label:<10}{summary['rows'][col]:>8}{summary['matrix_mb'][col]:>9.3f}"
+              f"{summary['match_ms'][col]:>10.4f}{acc['rank1']:>8.3f}{acc['far']:>8.3f}{acc['frr']:>8.3f}")
+
+    if outliers:
+        print(f"{len(outliers)} outliers (closer to another student):")
+        for i, closer in sorted(outliers.items(), key=lambda item: paths[item[0]]):
+            print(f"  {paths[i]}  ({names[i]}, closer to {closer})")
+
+    if args.report:
+        summary.update({
+            "gallery": gallery.name,
+            "keep": args.keep,
+            "kept": [paths[i] for i in kept],
+            "outliers": [{"path": paths[i], "identity": names[i], "closer_to": c} for i, c in outliers.items()],
+        })
+        with open(args.report, "w") as f:
+            json.dump(summary, f, indent=2)
+        print("Wrote", args.report)
+
+    if args.dry_run:
+        return
+
+    if args.in_place:
+        root, moved = prune_in_place(gallery, paths, kept)
+        print(f"Moved {moved} images to {root}")
+    else:
+        root = write_gallery(out, engine, gallery, emb, paths, kept)
+        print(f"Wrote gallery {out!r} to {root}")
+
+
+if __name__ == "__main__":
+    main()
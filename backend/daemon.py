@@ -0,0 +1,336 @@
+"""Headless attendance service for fixed classroom cameras.
+
+Runs the capture and recognition loop of backend.engine.run without drawing
+or a display, controlled through a small local JSON API:
+
+    GET  /status            session state, camera, pace decisions
+    GET  /recognitions      faces in the latest processed frame, students present
+    POST /session/start     {"roster": [...], "gallery": name, "fallback": bool}
+    POST /session/stop      ends the session and writes attendance.csv
+    GET  /metrics           Prometheus text format
+
+The camera is only open during a session. Attendance is written with
+src.attendance.write_attendance, like the desktop app. Roster files are only
+read from the command line (--roster-file); API clients send the roster
+inline. The API listens on 127.0.0.1 by default, or on a Unix socket:
+
+    python -m backend.daemon --port 8765
+    python -m backend.daemon --socket /run/attend.sock --start --roster-file cse3a.csv
+    curl --unix-socket /run/attend.sock -X POST localhost/session/start
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+
+from backend.engine import Engine
+from backend.gallery import DEFAULT_GALLERY
+from backend.metrics import METRICS
+from backend.pacing import PaceController
+from backend.roster import ROSTER_FALLBACK, read_roster, resolve_roster
+from backend.session import AttendanceSession
+from backend.watcher import WATCH_INTERVAL, GalleryWatcher
+
+DAEMON_CAMERA = os.environ.get("ATTEND_DAEMON_CAMERA", "0")
+DAEMON_HOST   = os.environ.get("ATTEND_DAEMON_HOST", "127.0.0.1")
+DAEMON_PORT   = int(os.environ.get("ATTEND_DAEMON_PORT", "8765") or 8765)
+DAEMON_SOCKET = os.environ.get("ATTEND_DAEMON_SOCKET", "")
+
+CAMERA_WIDTH  = 1280
+CAMERA_HEIGHT = 720
+
+
+class CameraError(Exception):
+
+    # the camera could not be opened; a hardware problem, not a session conflict
+    pass
+
+
+def open_camera(source):
+    # a number is a device index, anything else a file or stream URL
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise CameraError(f"cannot open camera {source!r}")
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    # frames waiting in the driver are stale by the time the pace allows the
+    # next one, so keep as few as the backend lets us
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+
+class Daemon:
+
+    def __init__(self, engine, camera=DAEMON_CAMERA):
+        self.engine = engine
+        self.camera = camera
+        self.lock = threading.Lock()
+        self.session = None
+        self.started = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.pace = PaceController(engine)
+        self.latest = []
+        self.latest_at = None
+        self.error = None
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, roster=None, gallery=None, fallback=ROSTER_FALLBACK):
+        # -> entries of the roster that matched nobody
+        with self.lock:
+            # a session whose camera failed still has to be stopped, so its
+            # attendance is written
+            if self.session is not None:
+                raise RuntimeError("a session is already running")
+
+            missing = []
+            names = self.engine.galleries.get(gallery).names
+            if roster is not None:
+                roster, missing = resolve_roster(roster, names)
+                if not roster:
+                    raise ValueError("no roster entries are registered")
+
+            cap = open_camera(self.camera)
+
+            self.session = AttendanceSession(self.engine, roster, fallback, gallery)
+            self.started = time.time()
+            self.latest, self.latest_at, self.error = [], None, None
+            self.pace = PaceController(self.engine)
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._loop, args=(cap,), name="daemon-camera", daemon=True)
+            self.thread.start()
+
+        print(f"Session started ({len(self.session.roster)} students)")
+        return missing
+
+    def stop(self):
+        # -> summary of the session, after writing its attendance
+        with self.lock:
+            if self.session is None:
+                raise RuntimeError("no session is running")
+            self.stop_event.set()
+            if self.thread is not None:
+                self.thread.join()
+            self.thread = None
+            session = self.session
+
+            # the session is only dropped once its attendance is written, so
+            # a failed write can be retried with another stop
+            # without a roster the sheet lists the session's gallery; only the
+            # default one is the registered_faces folder write_attendance reads
+            roster = session.roster if session.scoped else None
+            if roster is None and session.gallery.name != DEFAULT_GALLERY:
+                roster = set(session.gallery.names)
+
+            from src.attendance import write_attendance
+            with METRICS.time("persist"):
+                write_attendance(session.present, roster, session.evidence)
+            self.session = None
+
+        print(f"Session ended, {len(session.present)} present")
+        return {
+            "count": len(session.present),
+            "students": sorted(session.present),
+            "absent": sorted(session.roster - session.present),
+            "evidence": {name: session.evidence.record(name) for name in session.present},
+        }
+
+    def _loop(self, cap):
+        session = self.session
+        try:
+            while not self.stop_event.is_set():
+                with METRICS.time("capture"):
+                    ret, frame = cap.read()
+                if not ret:
+                    METRICS.inc("dropped_frames")
+                    self.error = "camera stopped delivering frames"
+                    print("Daemon camera error:", self.error)
+                    break
+                METRICS.inc("frames")
+
+                # registration images are mirrored, so live frames are too
+                frame = cv2.flip(frame, 1)
+
+                wait = self.pace.interval
+                if session.due():
+                    started = self.pace.start()
+                    try:
+                        results = session.process(frame)
+                    except Exception as e:
+                        print("Daemon error:", e)
+                        METRICS.inc("errors")
+                        METRICS.inc("dropped_frames")
+                        results = []
+                    wait = self.pace.observe(started)
+                    self.latest, self.latest_at = results, time.time()
+
+                self.stop_event.wait(wait)
+        finally:
+            cap.release()
+
+    def status(self):
+        session = self.session
+        status = {
+            "active": session is not None,
+            "camera": self.camera,
+            "camera_running": self.running,
+            "model_pack": self.engine.model_pack,
+            "pace": self.pace.describe(),
+        }
+        if self.error:
+            status["error"] = self.error
+        if session is not None:
+            status.update({
+                "started": self.started,
+                "gallery": session.gallery.name,
+                "roster": len(session.roster),
+                "present": len(session.present),
+                "complete": session.complete,
+            })
+        return status
+
+    def recognitions(self):
+        session = self.session
+        return {
+            "at": self.latest_at,
+            "faces": self.latest,
+            "present": sorted(session.present) if session is not None else [],
+        }
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    service = None
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._json(200, self.service.status())
+        elif self.path == "/recognitions":
+            self._json(200, self.service.recognitions())
+        elif self.path == "/metrics":
+            self._send(200, METRICS.render().encode(), "text/plain; version=0.0.4")
+        else:
+            self._json(404, {"status": "error", "error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._json(400, {"status": "error", "error": "body is not JSON"})
+
+        if self.path == "/session/start":
+            # a path would let any client read the first column of host files
+            if "roster_file" in body:
+                return self._json(400, {"status": "error", "error": "send the roster inline as \"roster\""})
+            roster = body.get("roster")
+            if roster is not None and not (isinstance(roster, list) and all(isinstance(r, str) for r in roster)):
+                return self._json(400, {"status": "error", "error": "roster must be a list of names"})
+            try:
+                missing = self.service.start(roster, body.get("gallery"),
+                                            bool(body.get("fallback", ROSTER_FALLBACK)))
+            except CameraError as e:
+                return self._json(503, {"status": "error", "error": str(e)})
+            except RuntimeError as e:
+                return self._json(409, {"status": "error", "error": str(e)})
+            except ValueError as e:
+                return self._json(400, {"status": "error", "error": str(e)})
+            self._json(200, {"status": "started", "missing": missing})
+
+        elif self.path == "/session/stop":
+            try:
+                summary = self.service.stop()
+            except RuntimeError as e:
+                return self._json(409, {"status": "error", "error": str(e)})
+            self._json(200, {"status": "ended", **summary})
+
+        else:
+            self._json(404, {"status": "error", "error": "not found"})
+
+    def _json(self, code, payload):
+        self._send(code, json.dumps(payload).encode(), "application/json")
+
+    def _send(self, code, data, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o660)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless attendance service")
+    parser.add_argument("--camera", default=DAEMON_CAMERA, help="device index, file or stream URL")
+    parser.add_argument("--host", default=DAEMON_HOST)
+    parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--start", action="store_true", help="start a session right away")
+    parser.add_argument("--roster-file", help="class roster for --start")
+    args = parser.parse_args()
+
+    engine = Engine()
+    engine.warm_up()
+
+    if WATCH_INTERVAL > 0:
+        GalleryWatcher(engine).start()
+
+    Handler.service = Daemon(engine, args.camera)
+
+    if args.start:
+        roster = read_roster(args.roster_file) if args.roster_file else None
+        missing = Handler.service.start(roster)
+        if missing:
+            print("Not registered:", ", ".join(missing))
+
+    if args.socket:
+        server = UnixHTTPServer(args.socket, Handler)
+        print(f"Listening on {args.socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), Handler)
+        print(f"Listening on http://{args.host}:{args.port}")
+
+    # service managers stop the daemon with SIGTERM: shut the server down
+    # (from another thread, serve_forever is waiting in this one) so the
+    # running session's attendance is still written below
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown, daemon=True).start())
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if Handler.service.session is not None:
+            Handler.service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+
+CACHE_DIR = "data/.cache"
+
+# On-disk cache of one embedding per image, for a single model configuration
+# (the tag, e.g. "buffalo_l_det640"). Entries are keyed by path and invalidated
+# when the file's size or mtime changes. Images with no detectable face are
+# cached too, so they are not re-run on every load.
+
+
+class EmbeddingCache:
+
+    def __init__(self, tag, cache_dir=CACHE_DIR):
+        self.tag = tag
+        self.path = os.path.join(cache_dir, f"embeddings-{tag}.npz")
+        self.entries = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            data = np.load(self.path, allow_pickle=False)
+            if str(data["tag"]) != self.tag:
+                return
+            for i, path in enumerate(data["paths"]):
+                emb = data["embeddings"][i] if data["has_face"][i] else None
+                self.entries[str(path)] = (int(data["stamps"][i][0]), int(data["stamps"][i][1]),
+                                           emb, float(data["latency_ms"][i]))
+        except Exception as e:
+            print("Embedding cache unreadable, rebuilding:", e)
+            self.entries = {}
+
+    @staticmethod
+    def stamp(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path):
+        # -> (hit, embedding or None, latency_ms)
+        entry = self.entries.get(path)
+        if entry is None:
+            return False, None, 0.0
+        size, mtime, emb, latency = entry
+        if (size, mtime) != self.stamp(path):
+            return False, None, 0.0
+        return True, emb, latency
+
+    def put(self, path, emb, latency_ms=0.0):
+        size, mtime = self.stamp(path)
+        if emb is not None:
+            emb = np.asarray(emb, np.float32)
+        self.entries[path] = (size, mtime, emb, float(latency_ms))
+        self.dirty = True
+
+    def drop(self, path):
+        if self.entries.pop(path, None) is not None:
+            self.dirty = True
+
+    def prune(self):
+        # forget images that were deleted since they were cached
+        for path in [p for p in self.entries if not os.path.exists(p)]:
+            self.drop(path)
+
+    def save(self):
+        if not self.dirty:
+            return
+        paths = list(self.entries)
+        dim = next((e[2].shape[0] for e in self.entries.values() if e[2] is not None), 0)
+        embeddings = np.zeros((len(paths), dim), np.float32)
+        has_face = np.zeros(len(paths), bool)
+        stamps = np.zeros((len(paths), 2), np.int64)
+        latency = np.zeros(len(paths), np.float32)
+        for i, path in enumerate(paths):
+            size, mtime, emb, ms = self.entries[path]
+            stamps[i] = (size, mtime)
+            latency[i] = ms
+            if emb is not None:
+                embeddings[i] = emb
+                has_face[i] = True
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # per-process temp name (np.savez wants the .npz suffix), so workers
+        # saving together never rename each other's half-written file
+        tmp = f"{self.path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp, tag=np.array(self.tag), paths=np.array(paths, dtype=str),
+                 stamps=stamps, embeddings=embeddings, has_face=has_face, latency_ms=latency)
+        os.replace(tmp, self.path)
+        self.dirty = False
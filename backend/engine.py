@@ -1,88 +1,412 @@
 import cv2
 import os
+import threading
 import numpy as np
-from insightface.app import FaceAnalysis
+from insightface.app.common import Face
+from insightface.utils import face_align
 
-DATASET_DIR = "data/registered_faces"
+from backend.gallery import Gallery, GalleryStore
+from backend.metrics import METRICS
+from backend.quality import QUALITY_GATE, QualityGate
+from backend.runtime import FacePack, SessionConfig
+from backend.tiling import DET_TILE, TiledDetector
 
 SIM_THRESHOLD = 0.45
 
+# InsightFace model packs. Only detection and recognition are loaded from
+# each pack; the landmark and gender/age models are never used here.
+MODEL_PACKS = {
+    "buffalo_l":  "ResNet50 recognizer, 10 GF detector (most accurate)",
+    "buffalo_m":  "ResNet50 recognizer, 2.5 GF detector",
+    "buffalo_s":  "MobileFaceNet recognizer, 500 MF detector",
+    "buffalo_sc": "MobileFaceNet recognizer, 500 MF detector, det + rec only (fastest)",
+}
+
+# Deployment modes: "fast" for kiosks and laptops, "accurate" for audits
+MODES = {
+    "accurate": "buffalo_l",
+    "fast":     "buffalo_sc",
+}
+
+MODEL_PACK = os.environ.get("ATTEND_MODEL_PACK", "buffalo_l")
+DET_SIZE   = int(os.environ.get("ATTEND_DET_SIZE", "640"))
+
+# Most faces embedded in one recognizer call
+REC_BATCH  = int(os.environ.get("ATTEND_REC_BATCH", "32") or 32)
+
+# Second look: a match scoring within this margin of SIM_THRESHOLD is decided
+# again with the mirrored face embedded too (0 turns it off)
+TTA_MARGIN = float(os.environ.get("ATTEND_TTA_MARGIN", "0") or 0)
+
+
+def resolve_pack(name):
+
+    name = MODES.get(name, name)
+
+    if name not in MODEL_PACKS:
+        raise ValueError(f"Unknown model pack {name!r}, expected one of "
+                         f"{', '.join(list(MODES) + list(MODEL_PACKS))}")
+
+    return name
+
+
 class Engine:
 
-    def __init__(self):
+    def __init__(self, model_pack=None, det_size=None, load_gallery=True, session_config=None,
+                 quantization=None, det_tile=None, quality=None, tta_margin=None):
 
-        print("Loading InsightFace buffalo_l model...")
+        self.model_pack = resolve_pack(model_pack or MODEL_PACK)
+        self.det_size = det_size or DET_SIZE
 
-        self.app = FaceAnalysis(
-            name="buffalo_l",
-            providers=["CPUExecutionProvider"]
-        )
+        # smaller detection size for live frames, chosen by the pace
+        # controller (backend/pacing.py); None uses det_size
+        self.live_det_size = None
 
-        self.app.prepare(ctx_id=0, det_size=(640, 640))
+        # frames larger than det_tile pixels are detected in tiles (backend/tiling.py)
+        self.det_tile = DET_TILE if det_tile is None else det_tile
+        self._tiler = None
 
-        print("Model ready")
+        # faces failing the gate are not embedded (backend/quality.py);
+        # pass quality=False to embed every face
+        if quality is None:
+            quality = QUALITY_GATE
+        self.quality = (QualityGate() if quality is True else quality) or None
+
+        self.tta_margin = TTA_MARGIN if tta_margin is None else tta_margin
+        self.session_config = session_config or SessionConfig.from_env()
+
+        # "dynamic" / "static" selects the INT8 models (see backend/quantize.py)
+        if quantization is not None:
+            self.session_config = SessionConfig(**{**vars(self.session_config), "quantization": quantization})
+
+        # Models are loaded on first use (see `app`); a fully cached gallery
+        # can be served without loading them at all.
+        self._app = None
+        self._lock = threading.Lock()
+
+        # The default gallery is always kept; named ones (backend/gallery.py)
+        # are loaded on demand and share these models
+        self.gallery = Gallery()
+        self.galleries = GalleryStore(self)
+
+        if load_gallery:
+            self.load_faces()
+
+    @property
+    def embeddings(self):
+        return self.gallery.embeddings
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self.gallery.embeddings = value
+
+    @property
+    def names(self):
+        return self.gallery.names
+
+    @names.setter
+    def names(self, value):
+        self.gallery.names = value
+
+    @property
+    def gallery_tag(self):
+        return self.gallery.tag
+
+    @property
+    def gallery_version(self):
+        return self.gallery.version
+
+    @property
+    def model_tag(self):
+        # identifies the embedding space; gallery entries are tagged with it
+        tag = f"{self.model_pack}_det{self.det_size}"
+
+        if self.session_config.quantization:
+            tag += f"_int8-{self.session_config.quantization}"
+
+        return tag
+
+    @property
+    def app(self):
+
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    self._app = self.load_model()
+
+        return self._app
 
-        self.embeddings = []
-        self.names = []
+    def load_model(self):
 
-        self.load_faces()
+        print(f"Loading InsightFace {self.model_pack} model...")
+
+        app = FacePack(self.model_pack, self.session_config)
+
+        app.prepare(ctx_id=0, det_size=(self.det_size, self.det_size))
+
+        print("Model ready")
+
+        return app
 
     def load_faces(self):
 
-        print("Loading registered faces...")
+        self.gallery.load(self)
 
-        for person in os.listdir(DATASET_DIR):
+    def warm_up(self):
 
-            person_dir = os.path.join(DATASET_DIR, person)
+        # Load the models and push one dummy input through each, so the first
+        # real frame does not pay for session initialisation
 
-            if not os.path.isdir(person_dir):
-                continue
+        frame = np.zeros((self.det_size, self.det_size, 3), dtype=np.uint8)
 
-            for file in os.listdir(person_dir):
+        self.app.det_model.detect(frame, max_num=0, metric="default")
 
-                if not file.lower().endswith((".jpg",".jpeg",".png")):
-                    continue
+        rec = self.app.models.get("recognition")
 
-                path = os.path.join(person_dir, file)
+        if rec is not None:
+            rec.get_feat(np.zeros((112, 112, 3), dtype=np.uint8))
 
-                img = cv2.imread(path)
+    def analyze(self, frame, det_size=None):
 
-                if img is None:
-                    continue
+        # Same as FaceAnalysis.get, split so detection and the per-face
+        # models are timed as separate stages
+
+        faces = self.detect(frame, det_size)
+
+        self.embed(frame, faces)
+
+        return faces
+
+    @property
+    def det_scalable(self):
+
+        # whether the detector takes any input size, so live_det_size can change
+
+        return isinstance(self.app.det_model.session.get_inputs()[0].shape[2], str)
+
+    @property
+    def tiler(self):
+
+        det_model = self.app.det_model
+
+        if self._tiler is None or self._tiler.det_model is not det_model:
+            with self._lock:
+                if self._tiler is None or self._tiler.det_model is not det_model:
+                    self._tiler = TiledDetector(det_model, self.det_tile)
+
+        return self._tiler
+
+    def detect(self, frame, det_size=None):
+
+        # det_size overrides live_det_size for this call only
+
+        with METRICS.time("detect"):
+
+            size = det_size or self.live_det_size
+
+            if self.det_tile and self.tiler.applies(frame):
+                bboxes, kpss = self.tiler.detect(frame, size)
+            else:
+                bboxes, kpss = self.app.det_model.detect(frame, input_size=(size, size) if size else None,
+                                                         max_num=0, metric="default")
+
+        faces = []
+
+        for i in range(bboxes.shape[0]):
+
+            kps = kpss[i] if kpss is not None else None
+
+            faces.append(Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4]))
+
+        METRICS.inc("faces", len(faces))
+
+        return faces
 
-                faces = self.app.get(img)
+    def embed(self, frame, faces):
 
-                if len(faces) == 0:
+        # Runs the per-face models on faces from detect(). All faces are
+        # aligned first and the recognizer embeds them in batches of up to
+        # REC_BATCH, one ONNX call each, instead of one call per face.
+        # Faces failing the quality gate get `skipped` set and no embedding.
+
+        all_faces = faces
+
+        if self.quality is not None:
+
+            for face in faces:
+                face.skipped = self.quality.check(frame, face)
+
+            faces = [face for face in faces if not face.skipped]
+
+            METRICS.inc("skipped_faces", len(all_faces) - len(faces))
+
+        if not faces:
+            return all_faces
+
+        with METRICS.time("recognize"):
+
+            rec = self.app.models.get("recognition")
+
+            if rec is not None:
+
+                crops = [face_align.norm_crop(frame, landmark=face.kps, image_size=rec.input_size[0])
+                         for face in faces]
+
+                for face, feat in zip(faces, self._embed_crops(rec, crops)):
+                    face.embedding = feat.flatten()
+
+                # kept for a second look at borderline matches (match_batch)
+                if self.tta_margin:
+                    for face, crop in zip(faces, crops):
+                        face.crop = crop
+
+            for taskname, model in self.app.models.items():
+                if taskname in ("detection", "recognition"):
                     continue
+                for face in faces:
+                    model.get(frame, face)
+
+        return all_faces
+
+    def _embed_crops(self, rec, crops):
 
-                emb = faces[0].embedding
+        # a model exported with a fixed batch size takes that many
+        batch = rec.session.get_inputs()[0].shape[0]
+        batch = batch if isinstance(batch, int) and batch > 0 else REC_BATCH
 
-                emb = emb / np.linalg.norm(emb)
+        feats = [rec.get_feat(crops[start:start + batch]) for start in range(0, len(crops), batch)]
 
-                self.embeddings.append(emb)
-                self.names.append(person)
+        return np.concatenate(feats) if feats else np.zeros((0, 512), np.float32)
 
-        self.embeddings = np.array(self.embeddings)
+    def index(self, identities=None, gallery=None):
 
-        print("Loaded", len(self.names), "faces")
+        # Sub-index of a gallery (default: the engine's own) for a class roster
+        return self.galleries.get(gallery).index(identities)
 
-    def match(self, emb):
+    def rows(self, index=None):
 
-        if len(self.embeddings) == 0:
+        # -> (embeddings, names) to search: the index's, or the whole gallery
+
+        if self.gallery_tag is not None and self.gallery_tag != self.model_tag:
+            self.gallery.ensure(self)
+
+        if index is None:
+            return self.gallery.rows
+
+        source = index.source
+
+        if source.tag is not None and source.tag != self.model_tag:
+            source.ensure(self)
+
+        if index.version != source.version:
+            index = source.index(index.identities)
+
+        return index.rows
+
+    def match(self, emb, index=None, count=True):
+
+        # index: optional GalleryIndex to search instead of the whole gallery.
+        # count=False leaves unknown_faces to a caller that looks a face up
+        # more than once and counts it after the last lookup
+
+        gallery, names = self.rows(index)
+
+        if len(gallery) == 0:
+            if count:
+                METRICS.inc("unknown_faces")
             return "Unknown", 0
 
-        emb = emb / np.linalg.norm(emb)
+        with METRICS.time("match"):
+
+            emb = emb / np.linalg.norm(emb)
 
-        sims = np.dot(self.embeddings, emb)
+            sims = np.dot(gallery, emb)
 
-        idx = np.argmax(sims)
+            idx = np.argmax(sims)
 
         if sims[idx] > SIM_THRESHOLD:
 
-            return self.names[idx], sims[idx]
+            return names[idx], sims[idx]
+
+        if count:
+            METRICS.inc("unknown_faces")
 
         return "Unknown", sims[idx]
 
+    def match_batch(self, embs, index=None, faces=None, count=True):
+
+        # match() for all faces of a frame in one matrix product
+        # -> [(name, score), ...] in the order of embs. With `faces` (the ones
+        # embs came from) borderline matches get a second look, see below.
+        # count: as for match()
+
+        if len(embs) == 0:
+            return []
+
+        gallery, names = self.rows(index)
+
+        if len(gallery) == 0:
+            if count:
+                METRICS.inc("unknown_faces", len(embs))
+            return [("Unknown", 0)] * len(embs)
+
+        results = self._nearest(embs, gallery, names)
+
+        if faces is not None and self.tta_margin:
+            results = self._second_look(faces, results, gallery, names)
+
+        if count:
+            METRICS.inc("unknown_faces", sum(1 for name, _ in results if name == "Unknown"))
+
+        return results
+
+    def _nearest(self, embs, gallery, names):
+
+        with METRICS.time("match"):
+
+            embs = np.asarray(embs, dtype=np.float32)
+
+            embs = embs / np.linalg.norm(embs, axis=1, keepdims=True)
+
+            sims = embs @ gallery.T
+
+            idx = np.argmax(sims, axis=1)
+
+            best = sims[np.arange(len(idx)), idx]
+
+        return [(names[i], s) if s > SIM_THRESHOLD else ("Unknown", s) for i, s in zip(idx, best)]
+
+    def _second_look(self, faces, results, gallery, names):
+
+        # Faces whose best score is within tta_margin of the threshold are
+        # embedded again from their mirrored crop, and matched with the mean
+        # of both embeddings. Clear matches and clear misses cost nothing more.
+        # The fused embedding replaces face.embedding for any later lookups.
+
+        borderline = [i for i, (_, score) in enumerate(results)
+                      if abs(score - SIM_THRESHOLD) <= self.tta_margin and faces[i].crop is not None]
+
+        if not borderline:
+            return results
+
+        rec = self.app.models.get("recognition")
+
+        with METRICS.time("recognize"):
+            flipped = self._embed_crops(rec, [cv2.flip(faces[i].crop, 1) for i in borderline])
+
+        for i, feat in zip(borderline, flipped):
+            face = faces[i]
+            face.embedding = face.embedding / np.linalg.norm(face.embedding) + feat / np.linalg.norm(feat)
+
+        METRICS.inc("second_looks", len(borderline))
+
+        results = list(results)
+
+        for i, result in zip(borderline, self._nearest([faces[i].embedding for i in borderline], gallery, names)):
+            results[i] = result
+
+        return results
+
 
 def remove_duplicates(faces):
 
@@ -130,15 +454,19 @@ def run():
 
     while True:
 
-        ret, frame = cap.read()
+        with METRICS.time("capture"):
+            ret, frame = cap.read()
 
         if not ret:
+            METRICS.inc("dropped_frames")
             break
 
+        METRICS.inc("frames")
+
         # FIX inverted preview
         frame = cv2.flip(frame,1)
 
-        faces = engine.app.get(frame)
+        faces = engine.analyze(frame)
 
         faces = remove_duplicates(faces)
 
@@ -146,6 +474,9 @@ def run():
 
             emb = face.embedding
 
+            if emb is None:
+                continue
+
             name,score = engine.match(emb)
 
             x1,y1,x2,y2 = map(int, face.bbox)
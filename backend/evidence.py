@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from collections import deque
+
+# Evidence needed before a student is marked present. One frame above the
+# threshold is easy to get wrong, so a session collects matches per student
+# and only marks them once the policy is met:
+#
+#   hits    EVIDENCE_HITS matches within EVIDENCE_WINDOW seconds
+#   score   match scores summing to EVIDENCE_SCORE within the window
+#   single  the first match (no accumulation)
+#
+# Every match is kept in the student's record (hits, summed and best score,
+# first seen, confirmed at), which is saved with the attendance.
+
+EVIDENCE_POLICY = os.environ.get("ATTEND_EVIDENCE", "hits")
+EVIDENCE_HITS   = int(os.environ.get("ATTEND_EVIDENCE_HITS", "2") or 2)
+EVIDENCE_SCORE  = float(os.environ.get("ATTEND_EVIDENCE_SCORE", "1.2") or 1.2)
+EVIDENCE_WINDOW = float(os.environ.get("ATTEND_EVIDENCE_WINDOW", "10") or 10)
+
+POLICIES = ("single", "hits", "score")
+
+
+class Evidence:
+
+    def __init__(self, policy=EVIDENCE_POLICY, hits=EVIDENCE_HITS, score=EVIDENCE_SCORE,
+                 window=EVIDENCE_WINDOW):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown evidence policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.hits = hits
+        self.score = score
+        self.window = window
+        self.lock = threading.Lock()
+        self.recent = {}
+        self.records = {}
+
+    def add(self, name, score, now=None):
+        # one match; -> True once the student is confirmed (now or earlier)
+        now = time.time() if now is None else now
+        score = float(score)
+
+        with self.lock:
+            record = self.records.get(name)
+            if record is None:
+                record = self.records[name] = {"hits": 0, "score": 0.0, "best": 0.0,
+                                               "first_seen": now, "confirmed": None}
+            record["hits"] += 1
+            record["score"] += score
+            record["best"] = max(record["best"], score)
+
+            if record["confirmed"] is not None:
+                return True
+
+            recent = self.recent.setdefault(name, deque())
+            recent.append((now, score))
+            while recent[0][0] < now - self.window:
+                recent.popleft()
+
+            if self.policy == "single":
+                met = True
+            elif self.policy == "hits":
+                met = len(recent) >= self.hits
+            else:
+                met = sum(s for _, s in recent) >= self.score
+
+            if met:
+                record["confirmed"] = now
+                del self.recent[name]
+            return met
+
+    def confirmed(self):
+        with self.lock:
+            return {name for name, r in self.records.items() if r["confirmed"] is not None}
+
+    def record(self, name):
+        with self.lock:
+            record = self.records.get(name)
+            return dict(record) if record else None
+
+    def __getstate__(self):
+        # picklable (sent back from the inference worker), minus the lock
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def describe(self):
+        return {"policy": self.policy, "hits": self.hits, "score": self.score, "window": self.window}
@@ -0,0 +1,466 @@
+import cv2
+import glob
+import os
+import re
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+
+from backend.embedding_cache import EmbeddingCache
+from backend.memory import MB, names_nbytes
+
+# Named galleries, one per department or campus, so a single server can host
+# several student bodies. Each lives in its own folder laid out like
+# data/registered_faces (<gallery>/<person>/<images>) and has its own
+# embedding cache. "default" is data/registered_faces itself.
+#
+# The engine always keeps the default gallery. Others are loaded the first
+# time a session or request asks for them and stay resident while they fit
+# in ATTEND_GALLERY_BUDGET_MB; past that, the least recently used ones are
+# dropped (a session that still holds one keeps using it until it ends).
+
+DATASET_DIR     = "data/registered_faces"
+GALLERIES_DIR   = os.environ.get("ATTEND_GALLERIES_DIR", "data/galleries")
+DEFAULT_GALLERY = "default"
+GALLERY_BUDGET  = float(os.environ.get("ATTEND_GALLERY_BUDGET_MB", "256") or 256) * MB
+
+# Roster sub-indexes kept per gallery (one per class that ran recently)
+INDEX_CACHE_SIZE = 16
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+GALLERY_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+def gallery_dir(name):
+
+    if name in (None, "", DEFAULT_GALLERY):
+        return DATASET_DIR
+
+    if not GALLERY_NAME.match(name):
+        raise ValueError(f"Invalid gallery name {name!r}")
+
+    path = os.path.join(GALLERIES_DIR, name)
+
+    if not os.path.isdir(path):
+        raise ValueError(f"Unknown gallery {name!r}, expected one of {', '.join(list_galleries())}")
+
+    return path
+
+
+def list_galleries():
+
+    names = [DEFAULT_GALLERY]
+
+    if os.path.isdir(GALLERIES_DIR):
+        names += sorted(d for d in os.listdir(GALLERIES_DIR)
+                        if GALLERY_NAME.match(d) and os.path.isdir(os.path.join(GALLERIES_DIR, d)))
+
+    return names
+
+
+def sample_images(limit, root=DATASET_DIR):
+
+    # up to `limit` decoded registration images, for warm-ups and reports
+
+    images = []
+
+    for path in sorted(glob.glob(os.path.join(root, "*", "*"))):
+
+        if not path.lower().endswith(IMAGE_EXTS):
+            continue
+
+        img = cv2.imread(path)
+
+        if img is not None:
+            images.append(img)
+
+        if len(images) >= limit:
+            break
+
+    return images
+
+
+class Gallery:
+
+    # One student body: a normalised embedding matrix and the matching
+    # person names, tagged with the model configuration that produced them
+
+    def __init__(self, name=DEFAULT_GALLERY, root=None):
+
+        self.name = name or DEFAULT_GALLERY
+        self.root = root or gallery_dir(self.name)
+
+        # (embeddings, names), replaced as one so readers never see a
+        # matrix and a name list from different loads
+        self.rows = (np.zeros((0, 512), np.float32), [])
+        self.tag = None
+        self.version = 0
+
+        self._load_lock = threading.RLock()
+        self._indexes = OrderedDict()
+        self._full_index = None
+        self._index_lock = threading.Lock()
+
+    @property
+    def embeddings(self):
+        return self.rows[0]
+
+    @embeddings.setter
+    def embeddings(self, value):
+        self.rows = (value, self.rows[1])
+
+    @property
+    def names(self):
+        return self.rows[1]
+
+    @names.setter
+    def names(self, value):
+        self.rows = (self.rows[0], value)
+
+    @property
+    def nbytes(self):
+
+        total = getattr(self.embeddings, "nbytes", 0) + names_nbytes(self.names)
+
+        with self._index_lock:
+            for index in self._indexes.values():
+                if index.embeddings is not self.embeddings:
+                    total += index.embeddings.nbytes
+
+        return total
+
+    def cache_tag(self, model_tag):
+
+        # the default gallery keeps its original cache file name
+        return model_tag if self.name == DEFAULT_GALLERY else f"{self.name}-{model_tag}"
+
+    def ensure(self, engine):
+
+        # (Re)load if the gallery was never loaded or the engine's model changed
+        if self.tag != engine.model_tag:
+            with self._load_lock:
+                if self.tag != engine.model_tag:
+                    self.load(engine)
+
+        return self
+
+    def load(self, engine):
+
+        with self._load_lock:
+            self._load(engine)
+
+    def _load(self, engine):
+
+        print(f"Loading registered faces ({self.name})...")
+
+        model_tag = engine.model_tag
+
+        cache = EmbeddingCache(self.cache_tag(model_tag))
+
+        embeddings = []
+        names = []
+        embedded = 0
+
+        for person in sorted(os.listdir(self.root)):
+
+            embs, n = self._embed_person(engine, cache, person)
+
+            embeddings += embs
+            names += [person] * len(embs)
+            embedded += n
+
+        cache.prune()
+        cache.save()
+
+        self.rows = (np.array(embeddings, dtype=np.float32).reshape(-1, 512), names)
+        self.tag = model_tag
+        self.version += 1
+
+        print("Loaded", len(self.names), "faces",
+              f"({embedded} embedded with {model_tag}, rest cached)")
+
+    def apply(self, engine, persons, cached_only=False):
+
+        # Re-reads only these person folders (added, changed or removed) and
+        # swaps in the result; the other rows are kept as they are. Readers
+        # keep matching against the old rows until the swap. cached_only takes
+        # the embeddings another process already wrote to the cache and never
+        # runs the models; images missing from it are left out.
+
+        with self._load_lock:
+
+            if self.tag != engine.model_tag:
+                if not cached_only:
+                    self.load(engine)
+                return
+
+            cache = EmbeddingCache(self.cache_tag(self.tag))
+
+            old, old_names = self.rows
+
+            keep = [i for i, name in enumerate(old_names) if name not in persons]
+
+            embeddings = [old[keep]]
+            names = [old_names[i] for i in keep]
+            embedded = 0
+
+            for person in sorted(persons):
+
+                embs, n = self._embed_person(engine, cache, person, cached_only=cached_only)
+
+                if embs:
+                    embeddings.append(np.array(embs, dtype=np.float32))
+                    names += [person] * len(embs)
+                embedded += n
+
+            if not cached_only:
+                cache.prune()
+                cache.save()
+
+            self.rows = (np.concatenate(embeddings), names)
+            self.version += 1
+
+        print(f"Updated {', '.join(sorted(persons))} in {self.name}:", len(names), "faces",
+              f"({embedded} embedded)")
+
+    def samples(self, engine):
+
+        # -> (embeddings, names, image paths), one row per image with a face,
+        # without touching the loaded rows (used by backend/compact.py)
+
+        cache = EmbeddingCache(self.cache_tag(engine.model_tag))
+
+        embeddings, names, paths = [], [], []
+
+        for person in sorted(os.listdir(self.root)):
+
+            embs, _ = self._embed_person(engine, cache, person, paths)
+
+            embeddings += embs
+            names += [person] * len(embs)
+
+        cache.save()
+
+        return np.array(embeddings, dtype=np.float32).reshape(-1, 512), names, paths
+
+    def _embed_person(self, engine, cache, person, paths=None, cached_only=False):
+
+        # -> (normalised embeddings of one person's images, number not cached);
+        # the image path of each embedding is appended to `paths` if given.
+        # With cached_only, images not in the cache are skipped.
+
+        person_dir = os.path.join(self.root, person)
+
+        if not os.path.isdir(person_dir):
+            return [], 0
+
+        embeddings = []
+        embedded = 0
+
+        for file in sorted(os.listdir(person_dir)):
+
+            if not file.lower().endswith(IMAGE_EXTS):
+                continue
+
+            path = os.path.join(person_dir, file)
+
+            hit, emb, _ = cache.get(path)
+
+            if not hit and cached_only:
+                continue
+
+            if not hit:
+
+                img = cv2.imread(path)
+
+                if img is None:
+                    continue
+
+                t0 = time.perf_counter()
+
+                faces = engine.app.get(img)
+
+                emb = faces[0].embedding if faces else None
+
+                cache.put(path, emb, (time.perf_counter() - t0) * 1000)
+
+                embedded += 1
+
+            if emb is None:
+                continue
+
+            embeddings.append(emb / np.linalg.norm(emb))
+
+            if paths is not None:
+                paths.append(path)
+
+        return embeddings, embedded
+
+    def index(self, identities=None):
+
+        # Cached per identity set and gallery version, so every session of the
+        # same class reuses one sub-index. None: the whole gallery (no copy),
+        # built once per version so per-face lookups stay O(1).
+
+        if identities is None:
+            with self._index_lock:
+                index = self._full_index
+                if index is None or index.version != self.version:
+                    index = self._full_index = GalleryIndex(self, self.names)
+            return index
+
+        key = frozenset(identities)
+
+        with self._index_lock:
+
+            index = self._indexes.get(key)
+
+            if index is not None and index.version == self.version:
+                self._indexes.move_to_end(key)
+                return index
+
+            index = GalleryIndex(self, key)
+
+            self._indexes[key] = index
+
+            while len(self._indexes) > INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+
+        return index
+
+    def __len__(self):
+
+        return len(self.names)
+
+
+class GalleryIndex:
+
+    # The gallery rows of a set of identities, copied once so matching against
+    # it costs only its own size. Rebuilt by Engine.match if the gallery reloads.
+
+    def __init__(self, source, identities, base=None):
+
+        if base is None:
+            base = source
+
+        self.source = source
+        self.identities = frozenset(identities)
+        self.version = base.version
+
+        embeddings, names = base.rows
+
+        rows = [i for i, name in enumerate(names) if name in self.identities]
+
+        self.names = [names[i] for i in rows]
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        if not rows:
+            self.embeddings = np.zeros((0, 512), np.float32)
+        elif len(rows) == len(names):
+            self.embeddings = embeddings  # everything: share, don't copy
+        else:
+            self.embeddings = embeddings[rows]
+
+    @property
+    def rows(self):
+        return self.embeddings, self.names
+
+    def subset(self, identities):
+
+        return GalleryIndex(self.source, self.identities & frozenset(identities), base=self)
+
+    def __len__(self):
+
+        return len(self.names)
+
+
+class GalleryStore:
+
+    # The named galleries resident in this process, least recently used first
+
+    def __init__(self, engine, budget=GALLERY_BUDGET):
+
+        self.engine = engine
+        self.budget = budget
+        self.resident = OrderedDict()
+        self.lock = threading.Lock()
+        self._loading = {}
+
+    def get(self, name):
+
+        # the default gallery is loaded by the engine itself (load_faces)
+        if name in (None, "", DEFAULT_GALLERY):
+            return self.engine.gallery
+
+        with self.lock:
+
+            gallery = self.resident.get(name)
+
+            if gallery is not None:
+                self.resident.move_to_end(name)
+
+        if gallery is not None:
+            return gallery.ensure(self.engine)
+
+        # names come from requests: reject unknown ones before keeping a lock for them
+        gallery_dir(name)
+
+        with self.lock:
+            loading = self._loading.setdefault(name, threading.Lock())
+
+        # one load per gallery; other requests for it wait, the rest carry on
+        with loading:
+
+            with self.lock:
+                gallery = self.resident.get(name)
+
+            if gallery is None:
+                try:
+                    gallery = Gallery(name).ensure(self.engine)
+                except Exception:
+                    with self.lock:
+                        self._loading.pop(name, None)
+                    raise
+
+                with self.lock:
+                    self.resident[name] = gallery
+                    self._loading.pop(name, None)
+                    self._evict(keep=name)
+
+        return gallery.ensure(self.engine)
+
+    def _evict(self, keep):
+
+        used = sum(g.nbytes for g in self.resident.values())
+
+        while used > self.budget and len(self.resident) > 1:
+
+            name = next(n for n in self.resident if n != keep)
+            gallery = self.resident.pop(name)
+            used -= gallery.nbytes
+
+            print(f"Gallery {name} evicted ({gallery.nbytes / MB:.1f} MB, "
+                  f"budget {self.budget / MB:.0f} MB)")
+
+        if used > self.budget:
+            print(f"Gallery {keep} alone is over the budget ({used / MB:.1f} MB)")
+
+    def clear(self):
+
+        with self.lock:
+            self.resident.clear()
+
+    def describe(self):
+
+        with self.lock:
+            resident = list(self.resident.values())
+
+        return {
+            "budget_bytes": int(self.budget),
+            "used_bytes": sum(g.nbytes for g in resident),
+            "resident": [{"name": g.name, "rows": len(g), "identities": len(set(g.names)),
+                          "bytes": g.nbytes, "tag": g.tag} for g in resident],
+            "available": list_galleries(),
+        }
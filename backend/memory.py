@@ -0,0 +1,362 @@
+"""Memory accounting for the engine, gallery and frame buffers.
+
+    python -m backend.memory                       # current pack, gallery and 20 frames
+    python -m backend.memory --pack fast --workers 1,2,4 --json
+
+The report breaks the footprint down into:
+
+  models     RSS growth while each ONNX session was created (ORT allocates
+             natively, so this is the only reliable per-session number)
+  gallery    embedding matrix shape, dtype and bytes, plus the name index;
+             named galleries resident next to it (backend/gallery.py)
+  buffers    frame buffers registered by the apps (camera ring, preview)
+  transient  per-frame / per-request Python and NumPy allocations, traced
+             with tracemalloc when ATTEND_MEMORY_TRACE=1 (traced frames and
+             requests then run one at a time; meant for measurement runs)
+  peak       peak RSS of the process and of the last session
+
+and projects how the other settings move it: model pack, INT8 models,
+float16 gallery, gallery size and number of web workers.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# /proc is Linux-only and resource POSIX-only (and only has the peak); psutil
+# (requirements.txt) gives the current RSS on macOS and Windows. Without it
+# there the RSS figures read 0.
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MEMORY_TRACE  = os.environ.get("ATTEND_MEMORY_TRACE", "") not in ("", "0")
+PEAK_INTERVAL = 0.2
+MB            = 1024 * 1024
+
+# Size of each pack's float32 detector + recognizer on disk. Loaded sessions
+# take roughly this much, plus the ORT arena; INT8 weights are about a quarter.
+PACK_WEIGHTS_MB = {
+    "buffalo_l":  16.9 + 174.4,
+    "buffalo_m":  3.3 + 174.4,
+    "buffalo_s":  2.5 + 13.6,
+    "buffalo_sc": 2.5 + 13.6,
+}
+
+GALLERY_PROJECTIONS = (1000, 10000, 100000)
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return 0
+
+
+def peak_rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    if psutil is not None:
+        # Windows keeps the peak working set
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss)
+    return 0
+
+
+def names_nbytes(names):
+    # the list plus each distinct string (repeated names share one object)
+    return sys.getsizeof(names) + sum(sys.getsizeof(s) for s in {id(n): n for n in names}.values())
+
+
+class Transient:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, nbytes):
+        self.count += 1
+        self.total += nbytes
+        self.max = max(self.max, nbytes)
+
+    def describe(self):
+        return {
+            "count": self.count,
+            "mean_bytes": self.total // self.count if self.count else 0,
+            "max_bytes": self.max,
+        }
+
+
+class MemoryTracker:
+
+    def __init__(self, trace=MEMORY_TRACE):
+        self.trace_enabled = trace
+        self.lock = threading.Lock()
+        self.trace_lock = threading.Lock()
+        self.buffers = {}
+        self.models = {}
+        self.transient = {}
+        self.session_peak = None
+        self.last_session = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # ── components ──────────────────────────────────────────────────────────
+
+    def track(self, name, nbytes):
+        # nbytes: callable returning the buffer's current size
+        with self.lock:
+            self.buffers[name] = nbytes
+
+    def untrack(self, name):
+        with self.lock:
+            self.buffers.pop(name, None)
+
+    def record_model(self, pack, task, path, rss_delta):
+        with self.lock:
+            self.models[(pack, task)] = {
+                "pack": pack,
+                "task": task,
+                "file": os.path.basename(path),
+                "file_bytes": os.path.getsize(path),
+                "rss_bytes": max(rss_delta, 0),
+            }
+
+    @contextmanager
+    def trace(self, label):
+        # peak Python/NumPy allocation above the starting point while the
+        # block runs; ORT's own buffers are native and not included.
+        # tracemalloc has one process-wide peak, so traced blocks run one at
+        # a time (concurrent web requests queue up here) and must not nest.
+        if not self.trace_enabled:
+            yield
+            return
+        with self.trace_lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            try:
+                yield
+            finally:
+                _, peak = tracemalloc.get_traced_memory()
+                with self.lock:
+                    self.transient.setdefault(label, Transient()).observe(max(peak - start, 0))
+
+    # ── session peak ────────────────────────────────────────────────────────
+
+    def start_session(self):
+        self.end_session()
+        self.session_peak = rss_bytes()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample, name="memory-peak", daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(PEAK_INTERVAL):
+            self.session_peak = max(self.session_peak, rss_bytes())
+
+    def end_session(self):
+        # -> peak RSS seen during the session, in bytes
+        if self._sampler is None:
+            return None
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+        self.last_session = max(self.session_peak, rss_bytes())
+        return self.last_session
+
+    # ── report ──────────────────────────────────────────────────────────────
+
+    def report(self, engine=None, workers=(1, 2, 4)):
+        rss = rss_bytes()
+        with self.lock:
+            models = list(self.models.values())
+            buffers = {name: int(fn()) for name, fn in self.buffers.items()}
+            transient = {label: t.describe() for label, t in self.transient.items()}
+
+        report = {
+            "rss_bytes": rss,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "session_peak_rss_bytes": self.last_session,
+            "models": models,
+            "buffers": buffers,
+            "transient": transient,
+            "trace_enabled": self.trace_enabled,
+        }
+
+        if engine is not None:
+            report["engine"] = {
+                "model_pack": engine.model_pack,
+                "model_tag": engine.model_tag,
+                "models_loaded": engine._app is not None,
+            }
+            report["gallery"] = gallery_report(engine)
+            report["galleries"] = engine.galleries.describe()
+
+        report["projections"] = projections(report, workers)
+        return report
+
+
+def gallery_report(engine):
+    emb = engine.embeddings
+    rows = len(engine.names)
+    nbytes = getattr(emb, "nbytes", 0)
+    dim = emb.shape[1] if getattr(emb, "ndim", 0) == 2 else 0
+    identities = len(set(engine.names))
+    return {
+        "rows": rows,
+        "identities": identities,
+        "dim": dim,
+        "dtype": str(getattr(emb, "dtype", "none")),
+        "matrix_bytes": int(nbytes),
+        "names_bytes": names_nbytes(engine.names),
+        "bytes_per_row": int(nbytes // rows) if rows else 0,
+        "rows_per_identity": rows / identities if identities else 0,
+    }
+
+
+def projections(report, workers):
+    out = {}
+
+    out["model_packs"] = {pack: {"float32_mb": mb, "int8_mb": round(mb / 4, 1)}
+                          for pack, mb in PACK_WEIGHTS_MB.items()}
+
+    g = report.get("gallery")
+    if g and g["rows"]:
+        per_row = g["bytes_per_row"]
+        per_identity = per_row * g["rows_per_identity"]
+        out["gallery"] = {
+            "float16_matrix_bytes": g["matrix_bytes"] // 2 if g["dtype"] == "float32" else g["matrix_bytes"],
+            "identities": {n: int(per_identity * n) for n in GALLERY_PROJECTIONS},
+        }
+
+    # without preloading, every gunicorn worker holds its own sessions,
+    # gallery and buffers: the whole process footprint multiplies
+    out["workers"] = {n: report["rss_bytes"] * n for n in workers}
+    return out
+
+
+def render(report):
+    def mb(n):
+        return f"{n / MB:8.1f} MB" if n is not None else "       n/a"
+
+    lines = [f"Process RSS     {mb(report['rss_bytes'])}   peak {mb(report['peak_rss_bytes']).strip()}"]
+    if report["session_peak_rss_bytes"] is not None:
+        lines.append(f"Last session    {mb(report['session_peak_rss_bytes'])}   (peak RSS)")
+
+    if report["models"]:
+        lines.append("Models (RSS growth at session creation, file size)")
+        for m in report["models"]:
+            lines.append(f"  {m['pack']:<11}{m['task']:<13}{mb(m['rss_bytes'])}  {mb(m['file_bytes'])}  {m['file']}")
+
+    g = report.get("gallery")
+    if g:
+        lines.append(f"Gallery         {mb(g['matrix_bytes'])}   {g['rows']} x {g['dim']} {g['dtype']}, "
+                     f"{g['identities']} identities")
+        lines.append(f"Name index      {mb(g['names_bytes'])}")
+
+    gs = report.get("galleries")
+    if gs and gs["resident"]:
+        lines.append(f"Named galleries {mb(gs['used_bytes'])}   of {mb(gs['budget_bytes']).strip()} budget")
+        for r in gs["resident"]:
+            lines.append(f"  {r['name']:<14}{mb(r['bytes'])}   {r['rows']} rows, {r['identities']} identities")
+
+    for name, nbytes in sorted(report["buffers"].items()):
+        lines.append(f"Buffer {name:<9}{mb(nbytes)}")
+
+    for label, t in sorted(report["transient"].items()):
+        lines.append(f"Transient {label:<6}{mb(t['mean_bytes'])} mean, {mb(t['max_bytes']).strip()} max "
+                     f"over {t['count']}")
+    if not report["trace_enabled"]:
+        lines.append("Transient       not traced (set ATTEND_MEMORY_TRACE=1)")
+
+    p = report["projections"]
+    lines.append("What moves it")
+    for pack, w in p["model_packs"].items():
+        lines.append(f"  pack {pack:<11}{w['float32_mb']:7.1f} MB weights, {w['int8_mb']:6.1f} MB as INT8")
+    if "gallery" in p:
+        lines.append(f"  float16 gallery {mb(p['gallery']['float16_matrix_bytes'])}")
+        for n, nbytes in p["gallery"]["identities"].items():
+            lines.append(f"  {n:>7} identities {mb(nbytes)}")
+    for n, nbytes in p["workers"].items():
+        lines.append(f"  {n} worker{'s' if n != 1 else ' '}      {mb(nbytes)}")
+    return "\n".join(lines)
+
+
+MEMORY = MemoryTracker()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory report for the recognition engine")
+    parser.add_argument("--pack", help="model pack or mode")
+    parser.add_argument("--det-size", type=int)
+    parser.add_argument("--quantization", help="dynamic or static")
+    parser.add_argument("--frames", type=int, default=20, help="sample frames to trace")
+    parser.add_argument("--workers", default="1,2,4", help="worker counts to project")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # the tracker the engine records into (not this __main__ module's copy)
+    from backend.memory import MEMORY
+    from backend.engine import Engine
+    from backend.gallery import sample_images
+
+    MEMORY.trace_enabled = True
+    MEMORY.start_session()
+
+    base = rss_bytes()
+    engine = Engine(args.pack, args.det_size, load_gallery=False, quantization=args.quantization)
+    engine.warm_up()
+    after_models = rss_bytes()
+    engine.load_faces()
+    after_gallery = rss_bytes()
+
+    for img in sample_images(args.frames):
+        with MEMORY.trace("frame"):
+            engine.analyze(img)
+
+    MEMORY.end_session()
+    report = MEMORY.report(engine, [int(w) for w in args.workers.split(",") if w])
+    report["steps"] = {
+        "baseline_bytes": base,
+        "models_bytes": after_models - base,
+        "gallery_bytes": after_gallery - after_models,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(render(report))
+    s = report["steps"]
+    print(f"Startup         baseline {base / MB:.1f} MB, +{s['models_bytes'] / MB:.1f} MB models, "
+          f"+{s['gallery_bytes'] / MB:.1f} MB gallery")
+
+
+if __name__ == "__main__":
+    main()
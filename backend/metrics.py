@@ -0,0 +1,135 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Per-stage latency histograms and event counters for the recognition loop.
+# Everything is in-process and lock-protected; one observation costs a couple
+# of perf_counter calls and a bisect, so it can stay on in production.
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+STAGES = ("capture", "decode", "detect", "recognize", "match", "persist")
+
+COUNTERS = {
+    "frames":         "Frames that entered the pipeline",
+    "faces":          "Faces detected",
+    "unknown_faces":  "Faces that matched no registered student",
+    "skipped_faces":  "Faces not recognised because they failed the quality gate",
+    "second_looks":   "Borderline matches decided again with the mirrored face",
+    "dropped_frames": "Frames dropped because they could not be read, decoded or processed",
+    "errors":         "Exceptions raised while processing frames",
+}
+
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+        # smoothed recent value for live displays
+        self.recent = value if self.count == 1 else 0.9 * self.recent + 0.1 * value
+
+
+class Metrics:
+
+    def __init__(self, prefix="attend"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.stages = {name: Histogram() for name in STAGES}
+        self.counters = {name: 0 for name in COUNTERS}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            if stage not in self.stages:
+                self.stages[stage] = Histogram()
+            self.stages[stage].observe(seconds)
+
+    def inc(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextmanager
+    def time(self, stage):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def take(self):
+        # -> (stages, counters) observed since the last take, for merge() in
+        # another process (the desktop app's inference worker reports this way)
+        with self.lock:
+            taken = (self.stages, self.counters)
+            self.stages = {name: Histogram() for name in STAGES}
+            self.counters = {name: 0 for name in COUNTERS}
+        return taken
+
+    def merge(self, taken):
+        stages, counters = taken
+        with self.lock:
+            for stage, h in stages.items():
+                if not h.count:
+                    continue
+                mine = self.stages.setdefault(stage, Histogram(h.buckets))
+                mine.counts = [a + b for a, b in zip(mine.counts, h.counts)]
+                mine.total += h.total
+                mine.count += h.count
+                mine.recent = h.recent
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.stages = {name: Histogram() for name in STAGES}
+            self.counters = {name: 0 for name in COUNTERS}
+
+    def render(self):
+        # Prometheus text exposition format (version 0.0.4)
+        p = self.prefix
+        lines = [
+            f"# HELP {p}_stage_seconds Time spent in each pipeline stage",
+            f"# TYPE {p}_stage_seconds histogram",
+        ]
+        with self.lock:
+            for stage, h in self.stages.items():
+                cumulative = 0
+                for le, n in zip(h.buckets, h.counts):
+                    cumulative += n
+                    lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{p}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{p}_stage_seconds_sum{{stage="{stage}"}} {h.total}')
+                lines.append(f'{p}_stage_seconds_count{{stage="{stage}"}} {h.count}')
+
+            for name, value in self.counters.items():
+                lines.append(f"# HELP {p}_{name}_total {COUNTERS.get(name, name)}")
+                lines.append(f"# TYPE {p}_{name}_total counter")
+                lines.append(f"{p}_{name}_total {value}")
+
+        lines.append(f"# HELP {p}_start_time_seconds Unix time the metrics were last reset")
+        lines.append(f"# TYPE {p}_start_time_seconds gauge")
+        lines.append(f"{p}_start_time_seconds {self.started}")
+        return "\n".join(lines) + "\n"
+
+    def brief(self):
+        # one-line summary of recent stage latencies, for overlays and logs
+        with self.lock:
+            parts = [f"{stage} {h.recent * 1000:.1f}ms"
+                     for stage, h in self.stages.items() if h.count]
+            c = self.counters
+            parts.append(f"{c['frames']} frames, {c['faces']} faces, {c['dropped_frames']} dropped")
+        return " · ".join(parts)
+
+
+METRICS = Metrics()
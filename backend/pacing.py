@@ -0,0 +1,215 @@
+import glob
+import os
+import threading
+import time
+
+# Adaptive pacing of live inference. Instead of a fixed delay between frames,
+# the controller measures what each processed frame cost (wall time and CPU
+# time of the whole process, ONNX Runtime threads included) and decides
+#
+#   interval   how long to wait before the next frame is processed
+#   det_size   the detector input size for live frames
+#
+# Modes (ATTEND_PACE):
+#   cpu      frames are spaced so inference uses about PACE_CPU cores on
+#            average; a machine with headroom runs close to MIN_INTERVAL, a
+#            slow one backs off. On battery the budget is scaled by
+#            PACE_BATTERY so laptops stay cool.
+#   latency  frames are processed back to back (MIN_INTERVAL apart).
+#   off      a fixed interval, as before.
+#
+# In cpu and latency mode the detection size steps down when a frame takes
+# longer than PACE_SLO_MS (or, in cpu mode, when the budget would push the
+# interval past MAX_INTERVAL), and back up once the next size up is
+# estimated to fit comfortably. A step needs PACE_PATIENCE frames in a row
+# agreeing, so the size does not flap. The size never goes above the
+# engine's det_size, and only changes for detectors with a dynamic input.
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PACE          = os.environ.get("ATTEND_PACE", "cpu")
+PACE_CPU      = float(os.environ.get("ATTEND_PACE_CPU", "1") or 1)
+PACE_BATTERY  = float(os.environ.get("ATTEND_PACE_BATTERY", "0.5") or 0.5)
+PACE_SLO_MS   = float(os.environ.get("ATTEND_PACE_SLO_MS", "250") or 250)
+MIN_INTERVAL  = float(os.environ.get("ATTEND_PACE_MIN_INTERVAL", "0.03") or 0)
+MAX_INTERVAL  = float(os.environ.get("ATTEND_PACE_MAX_INTERVAL", "2") or 2)
+PACE_PATIENCE = 5
+
+MODES       = ("cpu", "latency", "off")
+DET_STEPS   = (256, 320, 416, 512, 640, 800, 960, 1280)
+SMOOTHING   = 0.3
+HEADROOM    = 0.7
+BATTERY_TTL = 30.0
+
+
+def det_sizes(largest):
+    # detection sizes the controller can pick from, smallest first
+    return tuple(s for s in DET_STEPS if s < largest) + (largest,)
+
+
+def on_battery():
+    if psutil is not None and hasattr(psutil, "sensors_battery"):
+        battery = psutil.sensors_battery()
+        return battery is not None and not battery.power_plugged
+
+    # Linux without psutil: a battery present and no mains supply online
+    battery = mains = False
+    for path in glob.glob("/sys/class/power_supply/*"):
+        try:
+            with open(os.path.join(path, "type")) as f:
+                kind = f.read().strip()
+            if kind == "Battery":
+                battery = True
+            elif kind == "Mains":
+                with open(os.path.join(path, "online")) as f:
+                    mains = mains or f.read().strip() == "1"
+        except OSError:
+            continue
+    return battery and not mains
+
+
+class PaceController:
+
+    def __init__(self, engine=None, mode=PACE, cpu=PACE_CPU, slo_ms=PACE_SLO_MS,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, fixed=MIN_INTERVAL, drive_engine=True):
+        # drive_engine=False leaves engine.live_det_size alone: for an engine
+        # shared by several sessions, which pass live_det_size per call instead
+        if mode not in MODES:
+            raise ValueError(f"Unknown pace mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.engine = engine
+        self.mode = mode
+        self.cpu = cpu
+        self.slo = slo_ms / 1000
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fixed = fixed
+        self.drive_engine = drive_engine
+        self.lock = threading.Lock()
+
+        # detection sizes are worked out on the first frame, once the
+        # engine's models are loaded
+        self.sizes = None
+        self.level = 0
+
+        self.interval = fixed if mode == "off" else min_interval
+        self.latency = None
+        self.cpu_time = None
+        self.streak = 0
+        self.next_due = 0.0
+        self._battery = (False, 0.0)
+
+    @property
+    def det_size(self):
+        return self.sizes[self.level] if self.sizes else None
+
+    @property
+    def live_det_size(self):
+        # detection size to run at, or None for the engine's own
+        return self.det_size if self.sizes and self.level < len(self.sizes) - 1 else None
+
+    @property
+    def budget(self):
+        # cores inference may use on average
+        return self.cpu * (PACE_BATTERY if self.on_battery() else 1.0)
+
+    def on_battery(self):
+        state, checked = self._battery
+        if time.monotonic() - checked > BATTERY_TTL:
+            try:
+                state = on_battery()
+            except Exception:
+                state = False
+            self._battery = (state, time.monotonic())
+        return state
+
+    def due(self):
+        return time.monotonic() >= self.next_due
+
+    def start(self):
+        return time.perf_counter(), time.process_time()
+
+    def observe(self, started):
+        # a frame processed since start(); -> seconds until the next one
+        wall = time.perf_counter() - started[0]
+        cpu = time.process_time() - started[1]
+
+        with self.lock:
+            if self.latency is None:
+                self.latency, self.cpu_time = wall, cpu
+            else:
+                self.latency += SMOOTHING * (wall - self.latency)
+                self.cpu_time += SMOOTHING * (cpu - self.cpu_time)
+
+            if self.mode == "cpu":
+                # spread each frame's CPU over enough wall time to average out at the budget
+                wanted = self.cpu_time / max(self.budget, 1e-3) - self.latency
+                self.interval = min(max(wanted, self.min_interval), self.max_interval)
+            elif self.mode == "latency":
+                self.interval = self.min_interval
+
+            if self.sizes is None:
+                self._init_sizes()
+            if self.sizes:
+                self._resize()
+
+            self.next_due = time.monotonic() + self.interval
+            return self.interval
+
+    def _init_sizes(self):
+        self.sizes = ()
+        if self.engine is not None and self.mode != "off" and self.engine.det_scalable:
+            self.sizes = det_sizes(self.engine.det_size)
+            self.level = len(self.sizes) - 1
+            if self.drive_engine:
+                self.engine.live_det_size = None
+
+    def _resize(self):
+        # -1 to shrink detection, +1 to grow it, 0 to stay; estimates assume
+        # cost grows with the detector's input area
+        step = 0
+        over_budget = self.mode == "cpu" and self.cpu_time / max(self.budget, 1e-3) > self.max_interval
+        if self.level > 0 and (self.latency > self.slo or over_budget):
+            step = -1
+        elif self.level < len(self.sizes) - 1:
+            growth = (self.sizes[self.level + 1] / self.sizes[self.level]) ** 2
+            fits = self.latency * growth <= HEADROOM * self.slo
+            if self.mode == "cpu":
+                fits = fits and self.cpu_time * growth / max(self.budget, 1e-3) <= HEADROOM * self.max_interval
+            step = 1 if fits else 0
+
+        self.streak = self.streak + step if step and (self.streak * step) >= 0 else step
+        if abs(self.streak) < PACE_PATIENCE:
+            return
+
+        before = self.det_size
+        self.level += step
+        ratio = (self.det_size / before) ** 2
+        self.latency *= ratio
+        self.cpu_time *= ratio
+        self.streak = 0
+        if self.drive_engine:
+            self.engine.live_det_size = self.live_det_size
+        print(f"Pace: detection size {before} -> {self.det_size} "
+              f"(frame {self.latency * 1000:.0f}ms, budget {self.budget:g} cores)")
+
+    def describe(self):
+        with self.lock:
+            return {
+                "mode": self.mode,
+                "interval": round(self.interval, 3),
+                "det_size": self.det_size,
+                "latency_ms": None if self.latency is None else round(self.latency * 1000, 1),
+                "cpu_ms": None if self.cpu_time is None else round(self.cpu_time * 1000, 1),
+                "budget": self.budget if self.mode == "cpu" else None,
+                "on_battery": self.on_battery(),
+                "slo_ms": self.slo * 1000,
+            }
+
+    def brief(self):
+        parts = [f"every {self.interval * 1000:.0f}ms"]
+        if self.det_size:
+            parts.append(f"det {self.det_size}")
+        return "pace " + ", ".join(parts)
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Opt-in sampling profiler for live sessions and sampled web requests.
+#
+#   ATTEND_PROFILE=1               profile every desktop attendance session
+#   ATTEND_PROFILE_SAMPLE=0.05     profile this fraction of web /process requests
+#   ATTEND_PROFILE_DIR=profiles    where dumps are written
+#   ATTEND_PROFILE_INTERVAL_MS=5   sampling interval
+#
+# Each dump is a pair of files: <label>-<time>.collapsed holds one
+# "thread;outer;...;inner count" line per stack (flamegraph.pl / speedscope
+# input) and <label>-<time>.txt lists the top functions by self and total time.
+
+PROFILE_SESSIONS = os.environ.get("ATTEND_PROFILE", "") not in ("", "0")
+PROFILE_SAMPLE   = float(os.environ.get("ATTEND_PROFILE_SAMPLE", "0") or 0)
+PROFILE_DIR      = os.environ.get("ATTEND_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("ATTEND_PROFILE_INTERVAL_MS", "5") or 5) / 1000
+TOP_N            = 25
+MAX_DEPTH        = 64
+
+
+def _label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+
+    def __init__(self, label, interval=PROFILE_INTERVAL, out_dir=PROFILE_DIR):
+        self.label = label
+        self.interval = interval
+        self.out_dir = out_dir
+        self.threads = {}
+        self.stacks = Counter()
+        self.lock = threading.Lock()
+        self.started = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def add_thread(self, ident=None, name=None):
+        # only registered threads are sampled, so idle workers cost nothing
+        ident = ident or threading.get_ident()
+        with self.lock:
+            self.threads[ident] = name or str(ident)
+
+    def remove_thread(self, ident=None):
+        with self.lock:
+            self.threads.pop(ident or threading.get_ident(), None)
+
+    def start(self):
+        self.started = time.time()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler:
+            self._sampler.join()
+            self._sampler = None
+        return self.dump()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, name in self.threads.items():
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None and len(stack) < MAX_DEPTH:
+                        stack.append(_label(frame.f_code))
+                        frame = frame.f_back
+                    if stack:
+                        stack.append(name)
+                        self.stacks[tuple(reversed(stack))] += 1
+
+    def dump(self, reset=True):
+        with self.lock:
+            stacks = self.stacks
+            started = self.started
+            if reset:
+                self.stacks = Counter()
+                self.started = time.time()
+
+        if not stacks:
+            return None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, f"{self.label}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+
+        with open(base + ".collapsed", "w") as f:
+            for stack, n in stacks.most_common():
+                f.write(";".join(stack) + f" {n}\n")
+
+        with open(base + ".txt", "w") as f:
+            f.write(self.summary(stacks, time.time() - started))
+
+        return base + ".txt"
+
+    def summary(self, stacks, duration):
+        total = sum(stacks.values())
+        own = Counter()
+        cumulative = Counter()
+        per_thread = Counter()
+        for stack, n in stacks.items():
+            per_thread[stack[0]] += n
+            own[stack[-1]] += n
+            for func in set(stack[1:]):
+                cumulative[func] += n
+
+        lines = [
+            f"Profile: {self.label}",
+            f"Duration: {duration:.1f}s  Samples: {total}  Interval: {self.interval * 1000:.1f}ms",
+            "Threads: " + ", ".join(f"{t} ({n})" for t, n in per_thread.most_common()),
+            "",
+            f"Top {TOP_N} by self time",
+        ]
+        for func, n in own.most_common(TOP_N):
+            lines.append(f"{100 * n / total:6.1f}%  {n:7d}  {func}")
+        lines += ["", f"Top {TOP_N} by total time"]
+        for func, n in cumulative.most_common(TOP_N):
+            lines.append(f"{100 * n / total:6.1f}%  {n:7d}  {func}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,84 @@
+import os
+
+import cv2
+import numpy as np
+
+# Pre-recognition quality gate. A face that is tiny, blurred, turned far away
+# or barely detected seldom matches anyone; embedding it costs a recognizer
+# call and mostly produces a noisy "Unknown" box. Such faces keep their box
+# but get no embedding: `face.skipped` says why ("score", "small", "pose" or
+# "blur") and they are reported as skipped instead of being matched.
+#
+# Checks run cheapest first. Any threshold set to 0 turns that check off.
+
+QUALITY_GATE  = os.environ.get("ATTEND_QUALITY", "1") not in ("", "0")
+MIN_FACE_SIZE = float(os.environ.get("ATTEND_MIN_FACE_SIZE", "24") or 0)
+MIN_DET_SCORE = float(os.environ.get("ATTEND_MIN_DET_SCORE", "0.6") or 0)
+MIN_SHARPNESS = float(os.environ.get("ATTEND_MIN_SHARPNESS", "15") or 0)
+MAX_YAW       = float(os.environ.get("ATTEND_MAX_YAW", "55") or 0)
+
+# faces larger than this are shrunk to it before measuring blur, so the
+# number does not grow with face size (smaller ones are not enlarged, which
+# would blur them)
+SHARPNESS_SIZE = 64
+
+
+def face_size(face):
+    x1, y1, x2, y2 = face.bbox[:4]
+    return min(x2 - x1, y2 - y1)
+
+
+def sharpness(frame, bbox):
+    # variance of the Laplacian over the face: low for blurred faces
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = (int(round(v)) for v in bbox[:4])
+    x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, w), min(y2, h)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return 0.0
+    gray = cv2.cvtColor(frame[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY)
+    if min(gray.shape) > SHARPNESS_SIZE:
+        gray = cv2.resize(gray, (SHARPNESS_SIZE, SHARPNESS_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def yaw(kps):
+    # rough head turn in degrees from the 5 detector keypoints: how far the
+    # nose sits from the middle of the eyes, along the eye line (so head tilt
+    # does not count), relative to the eye distance
+    left, right, nose = kps[0], kps[1], kps[2]
+    axis = right - left
+    dist = float(np.linalg.norm(axis))
+    if dist < 1e-6:
+        return 90.0
+    offset = float(np.dot(nose - (left + right) / 2, axis / dist)) / dist
+    return float(np.degrees(np.arcsin(np.clip(2 * offset, -1.0, 1.0))))
+
+
+class QualityGate:
+
+    def __init__(self, min_size=MIN_FACE_SIZE, min_score=MIN_DET_SCORE,
+                 min_sharpness=MIN_SHARPNESS, max_yaw=MAX_YAW):
+        self.min_size = min_size
+        self.min_score = min_score
+        self.min_sharpness = min_sharpness
+        self.max_yaw = max_yaw
+
+    def check(self, frame, face):
+        # -> None if the face is worth embedding, otherwise the reason
+        if self.min_score and face.det_score < self.min_score:
+            return "score"
+        if self.min_size and face_size(face) < self.min_size:
+            return "small"
+        if self.max_yaw and face.kps is not None and abs(yaw(face.kps)) > self.max_yaw:
+            return "pose"
+        if self.min_sharpness and sharpness(frame, face.bbox) < self.min_sharpness:
+            return "blur"
+        return None
+
+    def describe(self):
+        return {
+            "min_size": self.min_size,
+            "min_score": self.min_score,
+            "min_sharpness": self.min_sharpness,
+            "max_yaw": self.max_yaw,
+        }
@@ -0,0 +1,180 @@
+"""Produce INT8 versions of a pack's detector and recognizer.
+
+    python -m backend.quantize --pack buffalo_l --mode static
+    python -m backend.quantize --pack buffalo_l --mode dynamic --tasks recognition
+
+Static quantization calibrates activation ranges on real inputs: frames from
+data/registered_faces for the detector, and the aligned face crops found in
+them for the recognizer. Dynamic quantization needs no calibration data but
+only quantizes weights ahead of time, so it usually gains less on CNNs.
+
+The models are written to data/models/<pack>/ and used by setting
+ATTEND_QUANTIZATION (or Engine(quantization=...)). Check them against the
+float models with benchmarks/quantization.py before rolling them out.
+"""
+
+import argparse
+import glob
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from insightface.utils import ensure_available
+from insightface.utils import face_align
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_dynamic, quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+from backend.engine import DET_SIZE, resolve_pack
+from backend.gallery import DATASET_DIR
+from backend.runtime import QUANT_DIR, QUANT_MODES, SessionConfig, USED_TASKS, load_models, quantized_path
+
+CALIBRATION_IMAGES = 64
+
+CALIBRATION_METHODS = {
+    "minmax":     CalibrationMethod.MinMax,
+    "entropy":    CalibrationMethod.Entropy,
+    "percentile": CalibrationMethod.Percentile,
+}
+
+
+def calibration_images(root, limit):
+    # spread the picks over identities instead of taking the first few people
+    people = [sorted(glob.glob(os.path.join(root, p, "*"))) for p in sorted(os.listdir(root))
+              if os.path.isdir(os.path.join(root, p))]
+    paths = []
+    for i in range(max(len(p) for p in people) if people else 0):
+        for files in people:
+            if i < len(files) and files[i].lower().endswith((".jpg", ".jpeg", ".png")):
+                paths.append(files[i])
+    images = []
+    for path in paths:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+        if len(images) >= limit:
+            break
+    return images
+
+
+def detector_blob(det, img, size):
+    # same letterboxing and normalisation as RetinaFace.detect
+    scale = min(size / img.shape[0], size / img.shape[1])
+    h, w = int(img.shape[0] * scale), int(img.shape[1] * scale)
+    canvas = np.zeros((size, size, 3), np.uint8)
+    canvas[:h, :w] = cv2.resize(img, (w, h))
+    return cv2.dnn.blobFromImage(canvas, 1.0 / det.input_std, (size, size),
+                                 (det.input_mean,) * 3, swapRB=True)
+
+
+def recognizer_blobs(det, rec, images, size):
+    blobs = []
+    for img in images:
+        bboxes, kpss = det.detect(img, input_size=(size, size), max_num=0, metric="default")
+        for kps in (kpss if kpss is not None else []):
+            crop = face_align.norm_crop(img, landmark=kps, image_size=rec.input_size[0])
+            blobs.append(cv2.dnn.blobFromImage(crop, 1.0 / rec.input_std, rec.input_size,
+                                               (rec.input_mean,) * 3, swapRB=True))
+    return blobs
+
+
+class BlobReader(CalibrationDataReader):
+
+    def __init__(self, input_name, blobs):
+        self.input_name = input_name
+        self.blobs = iter(blobs)
+
+    def get_next(self):
+        blob = next(self.blobs, None)
+        return None if blob is None else {self.input_name: blob}
+
+
+def preprocess(model_file, workdir):
+    # shape inference + graph cleanup recommended before quantizing; some
+    # exported graphs do not survive it, in which case the original is used
+    out = os.path.join(workdir, os.path.basename(model_file))
+    try:
+        quant_pre_process(model_file, out)
+        return out
+    except Exception as e:
+        print("Pre-processing skipped for", os.path.basename(model_file), "-", e)
+        return model_file
+
+
+def quantize_pack(pack, mode, tasks=USED_TASKS, det_size=DET_SIZE, calib_images=CALIBRATION_IMAGES,
+                  method="minmax", per_channel=True, quant_dir=QUANT_DIR, root="~/.insightface"):
+
+    model_dir = ensure_available("models", pack, root=root)
+    models = load_models(model_dir, SessionConfig(cache_optimized=False))
+    det = models["detection"]
+    det.input_size = (det_size, det_size)
+
+    images = []
+    if mode == "static":
+        images = calibration_images(DATASET_DIR, calib_images)
+        if not images:
+            raise RuntimeError(f"No calibration images in {DATASET_DIR}")
+
+    written = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for task in tasks:
+            model = models.get(task)
+            if model is None:
+                print(f"{pack}: no {task} model, skipped")
+                continue
+
+            src = preprocess(model.model_file, workdir)
+            dst = quantized_path(model.model_file, mode, quant_dir)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+
+            if mode == "dynamic":
+                quantize_dynamic(src, dst, weight_type=QuantType.QUInt8)
+            else:
+                if task == "detection":
+                    blobs = [detector_blob(det, img, det_size) for img in images]
+                else:
+                    blobs = recognizer_blobs(det, model, images, det_size)
+                if not blobs:
+                    raise RuntimeError(f"No faces found for {task} calibration")
+                reader = BlobReader(model.session.get_inputs()[0].name, blobs)
+                # U8 activations / S8 weights in QDQ form is the fast path on x86
+                # CPUs. The int32-bias weight-scale adjustment crashes on
+                # per-channel Gemm weights in onnxruntime 1.20, so it is skipped
+                quantize_static(src, dst, reader, quant_format=QuantFormat.QDQ,
+                                activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                                per_channel=per_channel, calibrate_method=CALIBRATION_METHODS[method],
+                                extra_options={"QDQDisableWeightAdjustForInt32Bias": per_channel})
+
+            before = os.path.getsize(model.model_file) / 1e6
+            after = os.path.getsize(dst) / 1e6
+            print(f"{pack} {task}: {before:.1f} MB -> {after:.1f} MB  {dst}")
+            written.append(dst)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize a model pack to INT8")
+    parser.add_argument("--pack", default="buffalo_l", help="model pack or mode")
+    parser.add_argument("--mode", choices=QUANT_MODES, default="static")
+    parser.add_argument("--tasks", default=",".join(USED_TASKS), help="detection,recognition")
+    parser.add_argument("--det-size", type=int, default=DET_SIZE, help="detector calibration size")
+    parser.add_argument("--calib-images", type=int, default=CALIBRATION_IMAGES)
+    parser.add_argument("--method", choices=CALIBRATION_METHODS, default="minmax")
+    parser.add_argument("--per-tensor", action="store_true", help="per-tensor instead of per-channel weights")
+    parser.add_argument("--out-dir", default=QUANT_DIR)
+    args = parser.parse_args()
+
+    tasks = [t for t in args.tasks.split(",") if t]
+    for t in tasks:
+        if t not in USED_TASKS:
+            parser.error(f"unknown task {t!r}, expected one of {', '.join(USED_TASKS)}")
+
+    quantize_pack(resolve_pack(args.pack), args.mode, tasks, args.det_size, args.calib_images,
+                  args.method, not args.per_tensor, args.out_dir)
+
+
+if __name__ == "__main__":
+    main()
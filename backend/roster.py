@@ -0,0 +1,39 @@
+import os
+
+# Class rosters: the registered students a session is for. Entries are the
+# folder names under data/registered_faces ("2400351_Aryan") or just the roll
+# number before the underscore ("2400351"). Roster files hold one entry per
+# line; for CSV files the first column is used, blank lines and lines starting
+# with "#" are skipped, and a header row simply fails to match.
+
+ROSTER_FALLBACK = os.environ.get("ATTEND_ROSTER_FALLBACK", "") not in ("", "0")
+
+
+def read_roster(path):
+    entries = []
+    with open(path) as f:
+        for line in f:
+            entry = line.split(",", 1)[0].strip().strip('"')
+            if entry and not entry.startswith("#"):
+                entries.append(entry)
+    return entries
+
+
+def resolve_roster(entries, names):
+    # -> (set of gallery folder names, entries that matched nobody)
+    known = set(names)
+    by_roll = {}
+    for name in known:
+        by_roll.setdefault(name.split("_", 1)[0], []).append(name)
+
+    roster = set()
+    missing = []
+    for entry in entries:
+        entry = str(entry).strip()
+        if entry in known:
+            roster.add(entry)
+        elif entry in by_roll:
+            roster.update(by_roll[entry])
+        else:
+            missing.append(entry)
+    return roster, missing
@@ -0,0 +1,322 @@
+import functools
+import glob
+import hashlib
+import json
+import os
+import platform
+
+import onnxruntime
+from insightface.app import FaceAnalysis
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.retinaface import RetinaFace
+from insightface.utils import ensure_available
+
+from backend.memory import MEMORY, rss_bytes
+
+# ONNX Runtime session settings for the engine's models, and a loader that
+# builds the detector and recognizer with them. Every setting can come from the
+# environment so each deployment (and each worker count) can be tuned:
+#
+#   ATTEND_ORT_INTRA_THREADS  threads per operator; 0 = ORT default. When unset
+#                             and WEB_CONCURRENCY (gunicorn workers) is set, the
+#                             cores are split evenly between the workers
+#   ATTEND_ORT_INTER_THREADS  threads across operators (parallel mode only)
+#   ATTEND_ORT_EXECUTION      sequential | parallel
+#   ATTEND_ORT_OPT_LEVEL      disable | basic | extended | all
+#   ATTEND_ORT_MEM_ARENA      1 | 0, CPU memory arena (0 trades speed for RSS)
+#   ATTEND_ORT_SPIN           1 | 0, let idle ORT threads spin; 0 when sharing cores
+#   ATTEND_CPU_AFFINITY       CPU list for this process, e.g. "0-3" or "0,2,4,6"
+#   ATTEND_QUANTIZATION       dynamic | static, run the INT8 models made by
+#                             backend/quantize.py instead of the float ones
+#
+# Optimized graphs are saved under ORT_CACHE_DIR on first load, keyed by source
+# model, ORT version, optimization level and host CPU (level "all" writes
+# graphs with kernels for this CPU, so a data/ directory copied to another box
+# rebuilds them); later startups load them directly and skip graph
+# optimization.
+
+ORT_CACHE_DIR = "data/.cache/ort"
+
+QUANT_DIR = "data/models"
+QUANT_MODES = ("dynamic", "static")
+
+OPT_LEVELS = {
+    "disable":  onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic":    onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all":      onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    "sequential": onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel":   onnxruntime.ExecutionMode.ORT_PARALLEL,
+}
+
+USED_TASKS = ("detection", "recognition")
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.lower() not in ("0", "false", "no", "off")
+
+
+def parse_cpus(spec):
+    # "0-3,6" -> {0, 1, 2, 3, 6}
+    cpus = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part:
+            cpus.add(int(part))
+    return cpus
+
+
+def cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+@functools.lru_cache(maxsize=None)
+def host_key():
+    # short tag for the machine an optimized graph was built on
+    host = f"{platform.node()}|{platform.machine()}|{cpu_model()}|{os.cpu_count()}"
+    return hashlib.sha1(host.encode()).hexdigest()[:8]
+
+
+def default_intra_threads():
+    workers = int(os.environ.get("WEB_CONCURRENCY", "0") or 0)
+    if workers > 1:
+        return max(1, (os.cpu_count() or 1) // workers)
+    return 0
+
+
+class SessionConfig:
+
+    def __init__(self, intra_threads=None, inter_threads=None, execution="sequential",
+                 opt_level="all", mem_arena=True, spin=None, cpu_affinity=None,
+                 quantization=None, cache_optimized=True, cache_dir=ORT_CACHE_DIR,
+                 quant_dir=QUANT_DIR):
+
+        if opt_level not in OPT_LEVELS:
+            raise ValueError(f"Unknown optimization level {opt_level!r}, expected one of {', '.join(OPT_LEVELS)}")
+        if execution not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode {execution!r}, expected one of {', '.join(EXECUTION_MODES)}")
+        if quantization is not None and quantization not in QUANT_MODES:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {', '.join(QUANT_MODES)}")
+
+        self.intra_threads = default_intra_threads() if intra_threads is None else intra_threads
+        self.inter_threads = inter_threads or 0
+        self.execution = execution
+        self.opt_level = opt_level
+        self.mem_arena = mem_arena
+        self.spin = spin
+        self.cpu_affinity = cpu_affinity
+        self.quantization = quantization
+        self.cache_optimized = cache_optimized
+        self.cache_dir = cache_dir
+        self.quant_dir = quant_dir
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        intra = env("ATTEND_ORT_INTRA_THREADS")
+        return cls(
+            intra_threads=int(intra) if intra else None,
+            inter_threads=int(env("ATTEND_ORT_INTER_THREADS", "0") or 0),
+            execution=env("ATTEND_ORT_EXECUTION", "sequential"),
+            opt_level=env("ATTEND_ORT_OPT_LEVEL", "all"),
+            mem_arena=_env_flag("ATTEND_ORT_MEM_ARENA", True),
+            spin=_env_flag("ATTEND_ORT_SPIN", None),
+            cpu_affinity=env("ATTEND_CPU_AFFINITY") or None,
+            quantization=env("ATTEND_QUANTIZATION") or None,
+        )
+
+    def describe(self):
+        return {
+            "intra_threads": self.intra_threads,
+            "inter_threads": self.inter_threads,
+            "execution": self.execution,
+            "opt_level": self.opt_level,
+            "mem_arena": self.mem_arena,
+            "spin": self.spin,
+            "cpu_affinity": self.cpu_affinity,
+            "quantization": self.quantization,
+        }
+
+    def options(self):
+        opts = onnxruntime.SessionOptions()
+        opts.intra_op_num_threads = self.intra_threads
+        opts.inter_op_num_threads = self.inter_threads
+        opts.execution_mode = EXECUTION_MODES[self.execution]
+        opts.graph_optimization_level = OPT_LEVELS[self.opt_level]
+        opts.enable_cpu_mem_arena = self.mem_arena
+        opts.log_severity_level = 3
+        if self.spin is not None:
+            flag = "1" if self.spin else "0"
+            opts.add_session_config_entry("session.intra_op.allow_spinning", flag)
+            opts.add_session_config_entry("session.inter_op.allow_spinning", flag)
+        return opts
+
+    def apply_affinity(self):
+        # pins the whole process; ORT's thread pools inherit it
+        if self.cpu_affinity and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, parse_cpus(self.cpu_affinity))
+
+    def optimized_path(self, model_file):
+        # the optimized graph depends on the source file, the ORT build, the
+        # optimization level and the host CPU; thread settings do not change it
+        st = os.stat(model_file)
+        stem = os.path.splitext(os.path.basename(model_file))[0]
+        pack = os.path.basename(os.path.dirname(model_file))
+        key = (f"{stem}.{self.opt_level}.ort{onnxruntime.__version__}.{host_key()}."
+               f"{st.st_size}-{int(st.st_mtime)}")
+        return os.path.join(self.cache_dir, pack, key + ".onnx")
+
+
+def quantized_path(model_file, mode, quant_dir=QUANT_DIR):
+    # data/models/buffalo_l/w600k_r50.int8-static.onnx
+    stem = os.path.splitext(os.path.basename(model_file))[0]
+    pack = os.path.basename(os.path.dirname(model_file))
+    return os.path.join(quant_dir, pack, f"{stem}.int8-{mode}.onnx")
+
+
+def create_session(model_file, config, providers=("CPUExecutionProvider",)):
+    providers = list(providers)
+
+    if not config.cache_optimized or config.opt_level == "disable":
+        return onnxruntime.InferenceSession(model_file, sess_options=config.options(), providers=providers)
+
+    optimized = config.optimized_path(model_file)
+
+    if os.path.exists(optimized):
+        # already optimized offline: load it as is
+        opts = config.options()
+        opts.graph_optimization_level = OPT_LEVELS["disable"]
+        try:
+            return onnxruntime.InferenceSession(optimized, sess_options=opts, providers=providers)
+        except Exception as e:
+            print("Optimized model unusable, rebuilding:", optimized, e)
+
+    # written under a per-process name and renamed, so workers starting
+    # together never read each other's half-written file
+    os.makedirs(os.path.dirname(optimized), exist_ok=True)
+    tmp = f"{optimized}.{os.getpid()}.tmp"
+    opts = config.options()
+    opts.optimized_model_filepath = tmp
+    session = onnxruntime.InferenceSession(model_file, sess_options=opts, providers=providers)
+    if os.path.exists(tmp):
+        os.replace(tmp, optimized)
+    return session
+
+
+def route(session):
+    # Same decision order as insightface's ModelRouter
+    inputs = session.get_inputs()
+    shape = inputs[0].shape
+    if len(session.get_outputs()) >= 5:
+        return "detection"
+    if shape[2] == 192 and shape[3] == 192:
+        return "landmark"
+    if shape[2] == 96 and shape[3] == 96:
+        return "genderage"
+    if len(inputs) == 2 and shape[2] == 128 and shape[3] == 128:
+        return "swapper"
+    if isinstance(shape[2], int) and shape[2] == shape[3] and shape[2] >= 112 and shape[2] % 16 == 0:
+        return "recognition"
+    return None
+
+
+def load_models(model_dir, config, tasks=USED_TASKS):
+    # Which file is which task is remembered in a manifest, so unused models
+    # in a pack (landmarks, gender/age) are not even opened on later loads
+    manifest_path = os.path.join(config.cache_dir, os.path.basename(model_dir), "manifest.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    models = {}
+    changed = False
+    quantized = []
+
+    for model_file in sorted(glob.glob(os.path.join(model_dir, "*.onnx"))):
+        name = os.path.basename(model_file)
+        task = manifest.get(name)
+
+        if task is not None and (task not in tasks or task in models):
+            continue
+
+        session_file = model_file
+        if config.quantization:
+            q = quantized_path(model_file, config.quantization, config.quant_dir)
+            if os.path.exists(q):
+                session_file = q
+
+        rss = rss_bytes()
+        session = create_session(session_file, config)
+        rss = rss_bytes() - rss
+
+        if task is None:
+            task = route(session)
+            manifest[name] = task
+            changed = True
+
+        if task not in tasks or task in models:
+            del session
+            continue
+
+        if session_file != model_file:
+            quantized.append(task)
+
+        MEMORY.record_model(os.path.basename(model_dir), task, session_file, rss)
+
+        # model_file stays the float source: ArcFaceONNX reads its first nodes
+        # to pick the input normalisation
+        if task == "detection":
+            models[task] = RetinaFace(model_file=model_file, session=session)
+        else:
+            models[task] = ArcFaceONNX(model_file=model_file, session=session)
+
+    if changed:
+        # per-process temp name and rename, as for the optimized models
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        tmp = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, manifest_path)
+
+    if config.quantization:
+        # a pack may be only partly quantized (e.g. recognizer only), but
+        # asking for INT8 with nothing to load is a setup mistake
+        if not quantized:
+            raise FileNotFoundError(
+                f"No {config.quantization} INT8 models for {os.path.basename(model_dir)} in "
+                f"{config.quant_dir}; run: python -m backend.quantize --pack "
+                f"{os.path.basename(model_dir)} --mode {config.quantization}")
+        print(f"INT8 ({config.quantization}):", ", ".join(sorted(quantized)))
+
+    return models
+
+
+class FacePack(FaceAnalysis):
+
+    # FaceAnalysis built from our own sessions; prepare() and get() are inherited
+
+    def __init__(self, name, config=None, root="~/.insightface"):
+        onnxruntime.set_default_logger_severity(3)
+        self.config = config or SessionConfig.from_env()
+        self.config.apply_affinity()
+        self.model_dir = ensure_available("models", name, root=root)
+        self.models = load_models(self.model_dir, self.config)
+        assert "detection" in self.models, f"no detection model in {self.model_dir}"
+        self.det_model = self.models["detection"]
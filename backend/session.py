@@ -0,0 +1,132 @@
+import os
+import time
+
+from backend.engine import remove_duplicates
+from backend.evidence import Evidence
+from backend.metrics import METRICS
+from backend.roster import ROSTER_FALLBACK
+from backend.tracking import FaceTracker
+
+# Attendance session that gets cheaper as students are marked present.
+#
+#  - faces are tracked across frames; a track that has been recognised is
+#    not embedded again
+#  - new faces are matched against the students not yet seen; only if that
+#    misses are they compared with the present ones, to label the box
+#  - a track that matched nobody is retried every UNKNOWN_RETRY frames
+#  - a match only marks the student once it has enough evidence (see
+#    backend/evidence.py); until then the track stays a candidate and is
+#    matched again on every frame
+#  - once the whole roster is present, inference drops to a presence check
+#    (detection only) every PRESENCE_INTERVAL seconds
+#
+# With a class roster only that class is searched. Faces it does not know
+# are checked against the whole gallery only when `fallback` is on; such
+# students are labelled and listed in `guests` but not marked present.
+# `gallery` names the student body (see backend/gallery.py); by default the
+# engine's own.
+
+PRESENCE_INTERVAL = float(os.environ.get("ATTEND_PRESENCE_INTERVAL", "2") or 2)
+UNKNOWN_RETRY     = 5
+
+
+class AttendanceSession:
+
+    def __init__(self, engine, roster=None, fallback=ROSTER_FALLBACK, gallery=None):
+        self.engine = engine
+        self.gallery = engine.galleries.get(gallery)
+        self.roster = frozenset(self.gallery.names if roster is None else roster)
+        self.scoped = roster is not None
+        self.fallback = fallback
+        self.present = set()
+        self.guests = set()
+        self.evidence = Evidence()
+        self.tracker = FaceTracker()
+        self.frame_no = 0
+        self.last_run = None
+        self._unseen = None
+        self._seen = None
+
+    @property
+    def complete(self):
+        return bool(self.roster) and self.roster <= self.present
+
+    def due(self):
+        # whether the next frame should go through inference at all
+        if not self.complete or self.last_run is None:
+            return True
+        return time.monotonic() - self.last_run >= PRESENCE_INTERVAL
+
+    def mark(self, name):
+        if name not in self.present:
+            self.present.add(name)
+            self._unseen = self._seen = None
+
+    def _indexes(self):
+        # the class roster's index is shared through the gallery's cache; the
+        # seen / unseen halves change with every mark and are built from it
+        if self._unseen is None or self._unseen.version != self.gallery.version:
+            if not self.scoped:
+                # students registered during the session join it
+                self.roster = frozenset(self.gallery.names)
+            base = self.gallery.index(self.roster)
+            self._unseen = base.subset(self.roster - self.present)
+            self._seen = base.subset(self.present)
+        return self._unseen, self._seen
+
+    def process(self, frame, det_size=None):
+        # det_size: detection size for this frame, see Engine.detect
+        self.frame_no += 1
+        self.last_run = time.monotonic()
+
+        faces = remove_duplicates(self.engine.detect(frame, det_size))
+        tracks = self.tracker.update(faces)
+
+        pending = []
+        if not self.complete:
+            for face, track in zip(faces, tracks):
+                if track.name is not None:
+                    continue
+                if (track.candidate is None and track.last_embedded is not None
+                        and self.frame_no - track.last_embedded < UNKNOWN_RETRY):
+                    continue
+                pending.append((face, track))
+
+        self.engine.embed(frame, [face for face, _ in pending])
+
+        # faces failing the quality gate are tried again on the next frame
+        pending = [(face, track) for face, track in pending if not face.skipped]
+
+        unseen, seen = self._indexes()
+        matches = self.engine.match_batch([face.embedding for face, _ in pending], unseen,
+                                          [face for face, _ in pending], count=False)
+
+        # a face may be looked up up to three times; it counts as unknown once
+        unknown = 0
+        for (face, track), (name, score) in zip(pending, matches):
+            track.last_embedded = self.frame_no
+            track.candidate = None
+            if name != "Unknown":
+                if not self.evidence.add(name, score):
+                    track.candidate, track.score = name, float(score)
+                    continue
+                self.mark(name)
+            elif len(seen):
+                name, score = self.engine.match(face.embedding, seen, count=False)
+            if name == "Unknown" and self.scoped and self.fallback:
+                name, score = self.engine.match(face.embedding, self.gallery.index(), count=False)
+                if name != "Unknown":
+                    track.guest = True
+                    self.guests.add(name)
+            if name != "Unknown":
+                track.name, track.score = name, float(score)
+            else:
+                unknown += 1
+
+        METRICS.inc("unknown_faces", unknown)
+
+        return [{"name": track.name or track.candidate or "Unknown", "score": track.score,
+                 "box": tuple(map(int, face.bbox)), "track": track.id, "guest": track.guest,
+                 "pending": track.name is None and track.candidate is not None,
+                 "skipped": face.skipped if track.name is None else None}
+                for face, track in zip(faces, tracks)]
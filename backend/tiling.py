@@ -0,0 +1,133 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Tiled detection for large frames. The detector sees every frame resized to
+# det_size, so in a 4K shot of a lecture hall the back rows shrink to a few
+# pixels. Instead of raising det_size (cost grows with its square), the frame
+# is cut into overlapping tiles of DET_TILE pixels, each detected at det_size,
+# plus one pass over the whole frame for faces too big for a tile. The boxes
+# are shifted back to frame coordinates and merged with NMS.
+#
+# Faces cut by an inner tile border are dropped; with the overlap, the
+# neighbouring tile (or the whole-frame pass) has them in one piece.
+#
+# A paced detection size (backend/pacing.py) applies to every tile and to the
+# whole-frame pass alike, so pacing cuts the cost of tiled frames too.
+
+DET_TILE         = int(os.environ.get("ATTEND_DET_TILE", "0") or 0)
+DET_TILE_OVERLAP = float(os.environ.get("ATTEND_DET_TILE_OVERLAP", "0.25") or 0.25)
+DET_TILE_WORKERS = int(os.environ.get("ATTEND_DET_TILE_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+
+NMS_IOU     = 0.4
+EDGE_MARGIN = 2
+
+# one pool per worker count, shared by every TiledDetector: engines are
+# rebuilt on pack or det_size changes and by the compact / bench tools, and a
+# pool per detector would leave its threads behind each time
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def tile_pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix="det-tile")
+        return _pools[workers]
+
+
+def tile_grid(height, width, tile, overlap=DET_TILE_OVERLAP):
+    # -> [(x0, y0, x1, y1), ...] covering the frame; the last row and column
+    # are aligned to the frame edge rather than running past it
+    step = max(int(tile * (1 - overlap)), 1)
+
+    def starts(size):
+        if size <= tile:
+            return [0]
+        n = int(np.ceil((size - tile) / step)) + 1
+        return sorted({min(i * step, size - tile) for i in range(n)})
+
+    return [(x, y, min(x + tile, width), min(y + tile, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(dets, iou=NMS_IOU):
+    # dets: (N, 5) x1, y1, x2, y2, score -> indices to keep, best first
+    x1, y1, x2, y2, scores = dets[:, 0], dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = np.argsort(-scores)
+
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0.0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]) + 1)
+        h = np.maximum(0.0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]) + 1)
+        inter = w * h
+        order = rest[inter / (areas[i] + areas[rest] - inter) <= iou]
+    return np.array(keep, dtype=np.int64)
+
+
+class TiledDetector:
+
+    def __init__(self, det_model, tile=DET_TILE, overlap=DET_TILE_OVERLAP, workers=DET_TILE_WORKERS):
+        self.det_model = det_model
+        self.tile = tile
+        self.overlap = overlap
+        self.pool = tile_pool(workers) if workers > 1 else None
+
+    def applies(self, frame):
+        return self.tile > 0 and max(frame.shape[:2]) > self.tile
+
+    def detect(self, frame, det_size=None):
+        # -> (bboxes (N, 5), kpss (N, 5, 2) or None), like RetinaFace.detect;
+        # det_size: detection size per tile, None for the model's own
+        h, w = frame.shape[:2]
+        jobs = [(0, 0, w, h)] + tile_grid(h, w, self.tile, self.overlap)
+        input_size = (det_size, det_size) if det_size else None
+
+        if self.pool is not None:
+            parts = list(self.pool.map(lambda box: self._detect_tile(frame, box, input_size), jobs))
+        else:
+            parts = [self._detect_tile(frame, box, input_size) for box in jobs]
+
+        dets = np.concatenate([d for d, _ in parts])
+        kpss = None if parts[0][1] is None else np.concatenate([k for _, k in parts])
+
+        if not len(dets):
+            return dets, kpss
+
+        keep = nms(dets)
+        return dets[keep], None if kpss is None else kpss[keep]
+
+    def _detect_tile(self, frame, box, input_size=None):
+        x0, y0, x1, y1 = box
+        h, w = frame.shape[:2]
+
+        dets, kpss = self.det_model.detect(frame[y0:y1, x0:x1], input_size=input_size,
+                                           max_num=0, metric="default")
+
+        # boxes touching a border shared with another tile are cut faces
+        cut = np.zeros(len(dets), bool)
+        if x0 > 0:
+            cut |= dets[:, 0] < EDGE_MARGIN
+        if y0 > 0:
+            cut |= dets[:, 1] < EDGE_MARGIN
+        if x1 < w:
+            cut |= dets[:, 2] > x1 - x0 - EDGE_MARGIN
+        if y1 < h:
+            cut |= dets[:, 3] > y1 - y0 - EDGE_MARGIN
+
+        dets = dets[~cut].copy()
+        dets[:, [0, 2]] += x0
+        dets[:, [1, 3]] += y0
+
+        if kpss is not None:
+            kpss = kpss[~cut].copy()
+            kpss[..., 0] += x0
+            kpss[..., 1] += y0
+
+        return dets, kpss
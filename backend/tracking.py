@@ -0,0 +1,79 @@
+import numpy as np
+
+# Frame-to-frame face tracks by box overlap. Good enough for a classroom
+# camera at 20-30 fps, where a face moves a fraction of its size per frame;
+# a track that is not seen for TRACK_MAX_MISSES frames is dropped.
+
+TRACK_IOU        = 0.3
+TRACK_MAX_MISSES = 5
+
+
+class Track:
+
+    def __init__(self, track_id, bbox):
+        self.id = track_id
+        self.bbox = bbox
+        self.name = None
+        self.score = 0.0
+        self.guest = False
+        self.candidate = None
+        self.misses = 0
+        self.last_embedded = None
+
+
+def iou_matrix(a, b):
+    # (N, 4) x (M, 4) boxes -> (N, M) intersection over union
+    a = a[:, None, :]
+    b = b[None, :, :]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = w * h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class FaceTracker:
+
+    def __init__(self, iou=TRACK_IOU, max_misses=TRACK_MAX_MISSES):
+        self.iou = iou
+        self.max_misses = max_misses
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, faces):
+        # -> one Track per face, in the same order; greedy assignment by
+        # highest overlap, new tracks for faces nobody claimed
+        assigned = [None] * len(faces)
+
+        if faces and self.tracks:
+            boxes = np.array([f.bbox[:4] for f in faces], np.float32)
+            known = np.array([t.bbox[:4] for t in self.tracks], np.float32)
+            overlap = iou_matrix(boxes, known)
+            taken = set()
+            for flat in np.argsort(overlap, axis=None)[::-1]:
+                fi, ti = divmod(int(flat), len(self.tracks))
+                if overlap[fi, ti] < self.iou:
+                    break
+                if assigned[fi] is None and ti not in taken:
+                    assigned[fi] = self.tracks[ti]
+                    taken.add(ti)
+
+        seen = set()
+        for i, face in enumerate(faces):
+            track = assigned[i]
+            if track is None:
+                track = Track(self.next_id, face.bbox)
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[i] = track
+            track.bbox = face.bbox
+            track.misses = 0
+            seen.add(track.id)
+
+        for track in self.tracks:
+            if track.id not in seen:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        return assigned
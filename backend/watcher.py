@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+from backend.gallery import IMAGE_EXTS
+
+# Keeps a running engine's gallery in step with its folder, so students
+# registered from the desktop app are recognised by the web server without a
+# restart. Only the person folders that changed are re-read and re-embedded
+# (Gallery.apply); everything else, including the embedding cache, is reused.
+#
+# With the optional `watchdog` package, file system events (inotify on Linux)
+# say which folders to look at; without it the whole tree is stat'ed every
+# ATTEND_WATCH_INTERVAL seconds, which is cheap next to embedding. A change is
+# applied once its folder has been quiet for WATCH_SETTLE seconds, so a
+# registration that is still writing images is picked up in one go.
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler, Observer = object, None
+
+WATCH_INTERVAL = float(os.environ.get("ATTEND_WATCH_INTERVAL", "2") or 0)
+WATCH_SETTLE   = 1.0
+
+
+def scan(root, persons=None):
+    # -> {person: ((file, size, mtime_ns), ...)} for the given folders (all if None)
+    if persons is None:
+        persons = os.listdir(root) if os.path.isdir(root) else []
+
+    snapshot = {}
+    for person in persons:
+        person_dir = os.path.join(root, person)
+        try:
+            files = sorted(os.listdir(person_dir))
+        except (NotADirectoryError, FileNotFoundError):
+            continue
+        stamps = []
+        for file in files:
+            if not file.lower().endswith(IMAGE_EXTS):
+                continue
+            try:
+                st = os.stat(os.path.join(person_dir, file))
+            except FileNotFoundError:
+                continue
+            stamps.append((file, st.st_size, st.st_mtime_ns))
+        snapshot[person] = tuple(stamps)
+    return snapshot
+
+
+class _Events(FileSystemEventHandler):
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path:
+                self.watcher.touch(path)
+
+
+class GalleryWatcher:
+
+    def __init__(self, engine, gallery=None, interval=WATCH_INTERVAL, settle=WATCH_SETTLE):
+        self.engine = engine
+        self.gallery = engine.gallery if gallery is None else gallery
+        self.root = os.path.abspath(self.gallery.root)
+        self.interval = interval
+        self.settle = settle
+        self.snapshot = {}
+        self.dirty = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.observer = None
+
+    @property
+    def mode(self):
+        return "events" if self.observer is not None else "polling"
+
+    def start(self):
+        self.snapshot = scan(self.root)
+        if Observer is not None:
+            try:
+                self.observer = Observer()
+                self.observer.schedule(_Events(self), self.root, recursive=True)
+                self.observer.start()
+            except Exception as e:
+                print("Gallery events unavailable, polling instead:", e)
+                self.observer = None
+        self.thread = threading.Thread(target=self._run, name="gallery-watch", daemon=True)
+        self.thread.start()
+        print(f"Watching {self.root} for changes ({self.mode})")
+        return self
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+        if self.thread is not None:
+            self.thread.join()
+
+    def touch(self, path):
+        # an event under root: remember which person folder it belongs to
+        rel = os.path.relpath(os.path.abspath(path), self.root)
+        person = rel.split(os.sep, 1)[0]
+        if person in (".", "..") or rel.startswith(".."):
+            return
+        with self.lock:
+            self.dirty.add(person)
+        self.wake.set()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            woke = self.wake.wait(self.interval if self.observer is None else None)
+            if self.stopping.is_set():
+                break
+            if woke:
+                # wait for the burst of writes to end before reading the folder
+                while self.wake.is_set() and not self.stopping.is_set():
+                    self.wake.clear()
+                    time.sleep(self.settle)
+            with self.lock:
+                persons, self.dirty = self.dirty, set()
+            try:
+                self.check(persons if self.observer is not None else None)
+            except Exception as e:
+                print("Gallery update error:", e)
+
+    def check(self, persons=None):
+        # compares the given folders (all if None) with the last snapshot and
+        # applies the ones that changed; -> the changed person names
+        current = scan(self.root, persons)
+        names = set(current) | (set(self.snapshot) if persons is None else set(persons))
+        changed = {p for p in names if current.get(p) != self.snapshot.get(p)}
+
+        if not changed:
+            return changed
+
+        # a folder still being written is simply applied again next time
+        self.gallery.apply(self.engine, changed)
+
+        for person in changed:
+            if person in current:
+                self.snapshot[person] = current[person]
+            else:
+                self.snapshot.pop(person, None)
+        return changed
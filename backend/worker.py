@@ -0,0 +1,414 @@
+import collections
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from backend.evidence import Evidence
+from backend.metrics import METRICS
+from backend.profiling import SamplingProfiler
+
+# Out-of-process inference for the desktop app. The camera thread in the GUI
+# process only captures frames and writes them into a SharedFrameRing; the
+# inference worker, a separate process with its own engine, reads them from
+# shared memory and sends back small result messages. ONNX and NumPy work no
+# longer competes with Qt for the GIL, and a crash in inference costs a
+# worker restart instead of the app.
+#
+# Frames never go through a pipe: a "frame" message only names the ring slot
+# (by frame id). At most one frame is in flight, so when inference is slower
+# than the camera the worker simply sees fewer frames while the preview keeps
+# the camera's rate.
+#
+# Inference stages are timed, and with ATTEND_PROFILE sampled, in the worker;
+# a stopping client gets the worker's metrics since the last stop and the path
+# of its session profile back, so the desktop totals still cover the hot path.
+#
+# The attendance session lives in the worker. The GUI keeps a RemoteSession
+# with the same present / complete / evidence it reads from a local session;
+# the students already present are handed to a restarted worker. Each camera
+# thread is a separate client, so the register camera can run next to a live
+# attendance session without either seeing the other's frames or replies.
+#
+# ATTEND_INFERENCE=thread runs inference in the camera thread as before.
+
+INFERENCE     = os.environ.get("ATTEND_INFERENCE", "process")
+RING_SIZE     = 4
+START_TIMEOUT = 120.0
+STOP_TIMEOUT  = 5.0
+
+
+class SharedFrameRing:
+
+    # FrameRing (app.py) in a shared memory block: `size` frame slots plus an
+    # id per slot. A slot's id is -1 while it is being written, so a reader
+    # that copies a slot and then finds its id unchanged has a whole frame.
+    #
+    # put() hands the caller a slot of a private ring, never a view of the
+    # shared block: the GUI keeps frames in queued signals and page buffers
+    # after the block is closed or reallocated, and a view into an unmapped
+    # block crashes the process when read.
+
+    def __init__(self, size=RING_SIZE):
+        self.size = size
+        self.shm = None
+        self.shape = None
+        self.ids = None
+        self.slots = None
+        self.local = []
+
+    @classmethod
+    def attach(cls, name, shape, size):
+        ring = cls(size)
+        ring._map(shared_memory.SharedMemory(name=name), shape)
+        return ring
+
+    def _map(self, shm, shape):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.ids = np.ndarray((self.size,), np.int64, buffer=shm.buf)
+        self.slots = np.ndarray((self.size,) + self.shape, np.uint8, buffer=shm.buf, offset=self.ids.nbytes)
+
+    @property
+    def name(self):
+        return self.shm.name if self.shm is not None else None
+
+    def put(self, frame, frame_id):
+        if self.shm is None or self.shape != frame.shape:
+            self.close(unlink=True)
+            shm = shared_memory.SharedMemory(create=True, size=8 * self.size + frame.nbytes * self.size)
+            self._map(shm, frame.shape)
+            self.ids[:] = 0
+        if not self.local or self.local[0].shape != frame.shape:
+            # old arrays stay alive for as long as the GUI holds them
+            self.local = [np.empty_like(frame) for _ in range(self.size)]
+        i = frame_id % self.size
+        self.ids[i] = -1
+        cv2.flip(frame, 1, dst=self.local[i])
+        np.copyto(self.slots[i], self.local[i])
+        self.ids[i] = frame_id
+        return self.local[i]
+
+    def read(self, frame_id, out=None):
+        # private copy of the frame, or None if its slot was already reused
+        if not self.valid(frame_id):
+            return None
+        i = frame_id % self.size
+        if out is None or out.shape != self.shape:
+            out = np.empty(self.shape, np.uint8)
+        np.copyto(out, self.slots[i])
+        return out if self.valid(frame_id) else None
+
+    def valid(self, frame_id):
+        return self.ids is not None and self.ids[frame_id % self.size] == frame_id
+
+    @property
+    def nbytes(self):
+        shared = self.slots.nbytes if self.slots is not None else 0
+        return shared + sum(s.nbytes for s in self.local)
+
+    def close(self, unlink=False):
+        if self.shm is None:
+            return
+        self.ids = self.slots = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+        self.shm = None
+
+
+class RemoteSession:
+
+    # what the GUI reads from an AttendanceSession, kept up to date from the
+    # worker's replies
+
+    def __init__(self, roster=None):
+        self.roster = roster
+        self.present = set()
+        self.complete = False
+        self.evidence = Evidence()
+
+
+class Client:
+
+    # worker-side state of one camera thread: its session, pace and frame ring
+
+    def __init__(self, engine, mode, session):
+        from backend.pacing import PaceController
+
+        self.mode = mode
+        self.session = session
+        # sessions share the engine, so each passes its detection size per call
+        self.pace = PaceController(engine, drive_engine=False)
+        self.ring = None
+        self.frame = None
+
+        self.profiler = None
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def stop_profile(self):
+        # -> path of the profile written, or None
+        if self.profiler is None:
+            return None
+        path, self.profiler = self.profiler.stop(), None
+        return path
+
+
+def serve(requests, replies, model_pack, det_size):
+    # worker process main loop; every reply starts with the client it is for
+    # (None for the worker itself)
+    from backend.engine import Engine
+    from backend.session import PRESENCE_INTERVAL, AttendanceSession
+
+    engine = Engine(model_pack=model_pack, det_size=det_size)
+    engine.warm_up()
+    replies.put((None, "ready", os.getpid()))
+
+    clients = {}
+
+    while True:
+        msg = requests.get()
+        kind = msg[0]
+
+        if kind == "quit":
+            break
+
+        if kind == "start":
+            _, client, mode, roster, present, profile = msg
+            session = AttendanceSession(engine, roster) if mode == "attendance" else None
+            for name in present if session else ():
+                session.mark(name)
+            if client in clients:
+                clients[client].close()
+                clients[client].stop_profile()
+            state = clients[client] = Client(engine, mode, session)
+            if profile:
+                state.profiler = SamplingProfiler(f"{mode}-worker")
+                state.profiler.add_thread(threading.get_ident(), "inference")
+                state.profiler.start()
+
+        elif kind == "stop":
+            state = clients.pop(msg[1], None)
+            present, evidence, profile = set(), None, None
+            if state is not None:
+                state.close()
+                profile = state.stop_profile()
+                if state.session is not None:
+                    present, evidence = set(state.session.present), state.session.evidence
+            replies.put((msg[1], "stopped", present, evidence, profile, METRICS.take()))
+
+        elif kind == "apply":
+            try:
+                engine.gallery.apply(engine, set(msg[1]))
+            except Exception as e:
+                print("Inference worker gallery update error:", e)
+                METRICS.inc("errors")
+            replies.put((None, "applied", msg[1]))
+
+        elif kind == "frame":
+            _, client, name, shape, size, frame_id = msg
+            state = clients.get(client)
+            if state is None:
+                continue
+            if state.ring is None or state.ring.name != name:
+                state.close()
+                state.ring = SharedFrameRing.attach(name, shape, size)
+            frame = state.frame = state.ring.read(frame_id, state.frame)
+            session, pace = state.session, state.pace
+
+            results, wait = None, 0.0
+            if frame is None:
+                METRICS.inc("dropped_frames")
+            elif session is not None and not session.due():
+                wait = max(session.last_run + PRESENCE_INTERVAL - time.monotonic(), 0.0)
+            else:
+                started = pace.start()
+                try:
+                    if session is not None:
+                        results = session.process(frame, pace.live_det_size)
+                    else:
+                        # register mode keeps the embeddings for the duplicate check
+                        results = []
+                        for face in engine.analyze(frame, pace.live_det_size):
+                            x1, y1, x2, y2 = map(int, face.bbox)
+                            results.append({"box": (x1, y1, x2, y2), "embedding": face.embedding,
+                                            "skipped": face.skipped})
+                except Exception as e:
+                    print("Inference worker error:", e)
+                    METRICS.inc("errors")
+                    METRICS.inc("dropped_frames")
+                    results = []
+                wait = pace.observe(started)
+                for r in results:
+                    r["frame_id"] = frame_id
+
+            present = set(session.present) if session is not None else set()
+            complete = session.complete if session is not None else False
+            replies.put((client, "results", frame_id, results, present, complete, wait,
+                         f"{METRICS.brief()} · {pace.brief()}"))
+
+    for state in clients.values():
+        state.close()
+        state.stop_profile()
+
+
+class InferenceWorker:
+
+    # GUI side of the worker process. One worker is shared by the pages and
+    # kept between sessions, so models load once. Each camera thread is a
+    # client with its own session in the worker and its own inbox here; a
+    # dispatcher thread sorts the worker's replies into the inboxes.
+
+    _shared = None
+    _shared_lock = threading.Lock()
+    _client_ids = itertools.count(1)
+
+    def __init__(self, model_pack, det_size):
+        self.model_pack = model_pack
+        self.det_size = det_size
+        self.ctx = mp.get_context("spawn")
+        self.process = None
+        self.requests = None
+        self.replies = None
+        self.inboxes = {}
+        self.on_applied = collections.deque()
+
+    @classmethod
+    def shared(cls, engine):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(engine.model_pack, engine.det_size)
+            cls._shared.ensure()
+            return cls._shared
+
+    @classmethod
+    def running(cls):
+        worker = cls._shared
+        return worker if worker is not None and worker.alive else None
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def ensure(self):
+        # (re)start the process if needed; blocks until its models are loaded
+        if self.alive:
+            return
+        if self.process is not None:
+            print(f"Inference worker exited (code {self.process.exitcode}), restarting")
+            METRICS.inc("errors")
+        # updates the old process never answered are not coming
+        self.on_applied.clear()
+        self.requests = self.ctx.Queue()
+        self.replies = self.ctx.Queue()
+        self.process = self.ctx.Process(target=serve, name="attend-inference", daemon=True,
+                                        args=(self.requests, self.replies, self.model_pack, self.det_size))
+        self.process.start()
+
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                reply = self.replies.get(timeout=0.5)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    break
+                continue
+            if reply[1] == "ready":
+                print(f"Inference worker ready (pid {reply[2]})")
+                threading.Thread(target=self._dispatch, args=(self.process, self.replies),
+                                 name="attend-replies", daemon=True).start()
+                return
+        raise RuntimeError("inference worker failed to start")
+
+    def _dispatch(self, process, replies):
+        # runs until this worker process is gone; a restarted one gets its own
+        while process.is_alive():
+            try:
+                reply = replies.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            if reply[0] is None and reply[1] == "applied":
+                self._applied()
+                continue
+            inbox = self.inboxes.get(reply[0])
+            if inbox is not None:
+                inbox.put(reply[1:])
+
+    def _applied(self):
+        # applies are answered in order; callbacks run on the dispatcher thread
+        try:
+            done = self.on_applied.popleft()
+        except IndexError:
+            return
+        if done is not None:
+            try:
+                done()
+            except Exception as e:
+                print("Gallery update callback error:", e)
+
+    def connect(self):
+        # -> id of a new client
+        client = next(self._client_ids)
+        self.inboxes[client] = queue.Queue()
+        return client
+
+    def disconnect(self, client):
+        self.inboxes.pop(client, None)
+
+    def start(self, client, mode, roster=None, present=(), profile=False):
+        self.requests.put(("start", client, mode, None if roster is None else sorted(roster),
+                           sorted(present), profile))
+
+    def send(self, client, ring, frame_id):
+        self.requests.put(("frame", client, ring.name, ring.shape, ring.size, frame_id))
+
+    def poll(self, client):
+        try:
+            return self.inboxes[client].get_nowait()
+        except (KeyError, queue.Empty):
+            return None
+
+    def stop(self, client):
+        # -> (present, evidence, profile path) of the client's session, or None
+        # if the worker is gone; the worker's metrics are merged into METRICS
+        inbox = self.inboxes.get(client)
+        if not self.alive or inbox is None:
+            return None
+        self.requests.put(("stop", client))
+        deadline = time.monotonic() + STOP_TIMEOUT
+        while time.monotonic() < deadline and self.alive:
+            try:
+                reply = inbox.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if reply[0] == "stopped":
+                METRICS.merge(reply[4])
+                return reply[1], reply[2], reply[3]
+        return None
+
+    def apply(self, persons, done=None):
+        # done() is called once the worker's gallery has the new rows and
+        # their embeddings are in the cache
+        if self.alive:
+            self.on_applied.append(done)
+            self.requests.put(("apply", sorted(persons)))
+
+    def close(self):
+        if self.alive:
+            self.requests.put(("quit",))
+            self.process.join(STOP_TIMEOUT)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
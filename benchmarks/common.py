@@ -0,0 +1,48 @@
+"""Helpers shared by the benchmarks that do not need the model stack, so
+clients such as the load tester run without insightface or ONNX Runtime."""
+
+import os
+import platform
+import socket
+import subprocess
+
+import cv2
+import numpy as np
+
+
+def fit_frame(img, size):
+    # Letterbox a sample photo into a camera-sized frame without distorting it
+    w, h = size
+    s = min(w / img.shape[1], h / img.shape[0])
+    nw, nh = int(img.shape[1] * s), int(img.shape[0] * s)
+    frame = np.zeros((h, w, 3), np.uint8)
+    x, y = (w - nw) // 2, (h - nh) // 2
+    frame[y:y + nh, x:x + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_AREA)
+    return frame
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except Exception:
+        return None
+
+
+def host_info():
+    info = {
+        "host": socket.gethostname(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+    try:
+        import onnxruntime
+        info["onnxruntime"] = onnxruntime.__version__
+    except ImportError:
+        pass
+    return info
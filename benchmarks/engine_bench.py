@@ -0,0 +1,321 @@
+"""Microbenchmarks for the engine hot paths.
+
+Runs without a camera. Matching and duplicate removal use synthetic
+galleries and faces; decode, detection and recognition use the sample
+frames in data/registered_faces at several resolutions. Tiled detection is
+compared with plain detection at larger det_size on a 4K "lecture hall"
+frame made of many small sample photos. Results are written as JSON so runs
+can be compared across commits and hosts. Matching is timed per face, for
+all faces of a frame at once (Engine.match_batch) and against a class
+roster's sub-index; recognition is timed per face and batched
+(Engine.embed) for frames with up to 50 faces:
+
+    python -m benchmarks.engine_bench --out bench.json
+    python -m benchmarks.engine_bench --quick --skip-models
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+from backend.engine import Engine, remove_duplicates
+from backend.gallery import GalleryIndex, sample_images
+from backend.tiling import tile_grid
+from benchmarks.common import fit_frame, git_commit, host_info
+
+GALLERY_SIZES = [10, 100, 1000, 10000, 100000]
+FACE_COUNTS   = [1, 5, 20, 50]
+RESOLUTIONS   = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+EMB_DIM       = 512
+FRAME_FACES   = 20   # faces per frame for the batched and roster matching
+ROSTER_SIZE   = 60   # identities in a class roster
+
+# Lecture hall: HALL_GRID sample photos per row and column in a 4K frame,
+# detected plainly at each DET_SIZES and in tiles of TILE_SIZES at 640
+HALL_RESOLUTION = (3840, 2160)
+HALL_GRID       = (8, 6)
+DET_SIZES       = [640, 1280, 1920]
+TILE_SIZES      = [960, 1280]
+
+
+def timeit(fn, repeat, warmup=2):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times = np.array(times)
+    return {
+        "n": int(repeat),
+        "mean_ms": float(times.mean()),
+        "p50_ms": float(np.percentile(times, 50)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "min_ms": float(times.min()),
+    }
+
+
+def synthetic_engine(identities, per_identity=1, seed=0):
+    # Models load lazily, so a gallery-only engine never touches them
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((identities * per_identity, EMB_DIM)).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True)
+    engine = Engine(load_gallery=False)
+    engine.embeddings = emb
+    engine.names = [f"{i:07d}_synthetic" for i in range(identities) for _ in range(per_identity)]
+    return engine
+
+
+def synthetic_queries(engine, count, seed=1):
+    # Half are noisy copies of gallery rows (genuine), half are random (impostors)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(engine.embeddings), count // 2)
+    genuine = engine.embeddings[rows] + 0.05 * rng.standard_normal((len(rows), EMB_DIM))
+    impostor = rng.standard_normal((count - len(rows), EMB_DIM))
+    return np.vstack([genuine, impostor]).astype(np.float32)
+
+
+def synthetic_faces(count, seed=2, size=(1280, 720)):
+    rng = np.random.default_rng(seed)
+    faces = []
+    for _ in range(count):
+        w = rng.integers(40, 160)
+        x = rng.integers(0, size[0] - w)
+        y = rng.integers(0, size[1] - w)
+        bbox = np.array([x, y, x + w, y + w], np.float32)
+        faces.append(SimpleNamespace(bbox=bbox, det_score=float(rng.random())))
+    return faces
+
+
+def hall_frame(images, size=HALL_RESOLUTION, grid=HALL_GRID):
+    # Many small faces, like the back rows of a large room
+    w, h = size
+    cols, rows = grid
+    cw, ch = w // cols, h // rows
+    frame = np.zeros((h, w, 3), np.uint8)
+    for i in range(cols * rows):
+        x, y = (i % cols) * cw, (i // cols) * ch
+        frame[y:y + ch, x:x + cw] = fit_frame(images[i % len(images)], (cw, ch))
+    return frame
+
+
+def bench_match(sizes, repeat):
+    results = []
+    for n in sizes:
+        engine = synthetic_engine(n)
+        queries = synthetic_queries(engine, 64)
+        it = iter(range(1 << 30))
+
+        def run():
+            engine.match(queries[next(it) % len(queries)])
+
+        stats = timeit(run, repeat)
+        results.append({"name": "match", "params": {"identities": n}, **stats})
+        print(f"match                identities={n:<7} {stats['p50_ms']:.3f} ms")
+    return results
+
+
+def bench_match_batch(sizes, repeat):
+    # one frame's faces matched one by one and in a single matrix product
+    results = []
+    for n in sizes:
+        engine = synthetic_engine(n)
+        queries = synthetic_queries(engine, FRAME_FACES)
+
+        stats = timeit(lambda: [engine.match(q) for q in queries], repeat)
+        results.append({"name": "match_loop", "params": {"identities": n, "faces": FRAME_FACES}, **stats})
+        loop_ms = stats["p50_ms"]
+
+        stats = timeit(lambda: engine.match_batch(queries), repeat)
+        results.append({"name": "match_batch", "params": {"identities": n, "faces": FRAME_FACES}, **stats})
+        print(f"match_batch          identities={n:<7} {loop_ms:.3f} ms loop, {stats['p50_ms']:.3f} ms batched")
+    return results
+
+
+def bench_roster(sizes, repeat):
+    # building a roster's sub-index (a cache miss) and matching against it
+    results = []
+    for n in sizes:
+        if n <= ROSTER_SIZE:
+            continue
+        engine = synthetic_engine(n)
+        queries = synthetic_queries(engine, FRAME_FACES)
+        roster = engine.names[::n // ROSTER_SIZE][:ROSTER_SIZE]
+        params = {"identities": n, "roster": len(roster), "faces": FRAME_FACES}
+
+        stats = timeit(lambda: GalleryIndex(engine.gallery, roster), max(repeat // 5, 3))
+        results.append({"name": "roster_index_build", "params": params, **stats})
+        build_ms = stats["p50_ms"]
+
+        index = engine.index(roster)
+        stats = timeit(lambda: engine.match_batch(queries, index), repeat)
+        results.append({"name": "match_batch_roster", "params": params, **stats})
+        print(f"match_batch_roster   identities={n:<7} {stats['p50_ms']:.3f} ms, "
+              f"index built in {build_ms:.3f} ms")
+    return results
+
+
+def bench_remove_duplicates(repeat):
+    results = []
+    for n in FACE_COUNTS:
+        faces = synthetic_faces(n)
+        stats = timeit(lambda: remove_duplicates(faces), repeat)
+        results.append({"name": "remove_duplicates", "params": {"faces": n}, **stats})
+        print(f"remove_duplicates    faces={n:<10} {stats['p50_ms']:.3f} ms")
+    return results
+
+
+def bench_decode(images, repeat):
+    results = []
+    for size in RESOLUTIONS:
+        ok, buf = cv2.imencode(".jpg", fit_frame(images[0], size), [cv2.IMWRITE_JPEG_QUALITY, 90])
+        data = buf.tobytes()
+
+        def run():
+            cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+        stats = timeit(run, repeat)
+        params = {"resolution": f"{size[0]}x{size[1]}", "jpeg_bytes": len(data)}
+        results.append({"name": "decode", "params": params, **stats})
+        print(f"decode               {params['resolution']:<16} {stats['p50_ms']:.3f} ms")
+    return results
+
+
+def bench_models(images, repeat, pack=None):
+    results = []
+    engine = Engine(model_pack=pack, load_gallery=False)
+    det = engine.app.det_model
+    rec = engine.app.models.get("recognition")
+
+    for size in RESOLUTIONS:
+        res = f"{size[0]}x{size[1]}"
+        frames = [fit_frame(img, size) for img in images]
+        it = iter(range(1 << 30))
+
+        stats = timeit(lambda: det.detect(frames[next(it) % len(frames)]), repeat)
+        results.append({"name": "detect", "params": {"resolution": res}, **stats})
+        print(f"detect               {res:<16} {stats['p50_ms']:.3f} ms")
+
+        stats = timeit(lambda: engine.app.get(frames[next(it) % len(frames)]), repeat)
+        results.append({"name": "pipeline", "params": {"resolution": res}, **stats})
+        print(f"pipeline             {res:<16} {stats['p50_ms']:.3f} ms")
+
+        faces = [(f, face) for f in frames for face in engine.app.get(f)]
+        if rec is None or not faces:
+            continue
+
+        def run():
+            frame, face = faces[next(it) % len(faces)]
+            rec.get(frame, face)
+
+        stats = timeit(run, repeat)
+        results.append({"name": "recognize", "params": {"resolution": res, "per": "face"}, **stats})
+        print(f"recognize            {res:<16} {stats['p50_ms']:.3f} ms/face")
+    return results
+
+
+def bench_tiled(images, repeat, pack=None):
+    # Per-frame cost and faces found: plain detection at growing det_size
+    # against 640 detection in tiles, on the same hall frame
+    results = []
+    frame = hall_frame(images)
+    res = f"{frame.shape[1]}x{frame.shape[0]}"
+
+    configs = [{"det_size": n, "det_tile": 0} for n in DET_SIZES]
+    configs += [{"det_size": 640, "det_tile": t} for t in TILE_SIZES]
+
+    for config in configs:
+        engine = Engine(model_pack=pack, load_gallery=False, **config)
+        faces = len(engine.detect(frame))
+        stats = timeit(lambda: engine.detect(frame), repeat)
+        tiles = len(tile_grid(frame.shape[0], frame.shape[1], config["det_tile"])) + 1 if config["det_tile"] else 1
+        params = {"resolution": res, **config, "tiles": tiles, "faces": faces,
+                  "fps": round(1000 / stats["mean_ms"], 2)}
+        results.append({"name": "detect_tiled" if config["det_tile"] else "detect_large",
+                        "params": params, **stats})
+        label = f"tiles {config['det_tile']} x{tiles}" if config["det_tile"] else f"det_size {config['det_size']}"
+        print(f"hall detect          {label:<16} {stats['p50_ms']:.3f} ms, {faces} faces")
+    return results
+
+
+def bench_batch(images, repeat, pack=None):
+    # Recognizer cost for a frame with n faces: one call per face against
+    # Engine.embed's batched calls
+    results = []
+    engine = Engine(model_pack=pack, load_gallery=False, quality=False)
+    rec = engine.app.models.get("recognition")
+    found = []
+    for img in images:
+        frame = fit_frame(img, (1280, 720))
+        found = engine.detect(frame)
+        if found:
+            break
+    if rec is None or not found:
+        return results
+
+    for n in FACE_COUNTS:
+        faces = [found[i % len(found)] for i in range(n)]
+
+        def per_face():
+            for face in faces:
+                rec.get(frame, face)
+
+        stats = timeit(per_face, repeat)
+        results.append({"name": "recognize_loop", "params": {"faces": n}, **stats})
+        loop_ms = stats["p50_ms"]
+
+        stats = timeit(lambda: engine.embed(frame, faces), repeat)
+        results.append({"name": "recognize_batch", "params": {"faces": n}, **stats})
+        print(f"recognize            faces={n:<10} {loop_ms:.3f} ms loop, {stats['p50_ms']:.3f} ms batched")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark engine hot paths")
+    parser.add_argument("--out", default="bench_results.json", help="JSON output path")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions, galleries up to 10k")
+    parser.add_argument("--skip-models", action="store_true", help="skip detection and recognition")
+    parser.add_argument("--images", type=int, default=8, help="sample frames to use")
+    parser.add_argument("--pack", help="model pack or mode for the model benchmarks")
+    args = parser.parse_args()
+
+    repeat = 20 if args.quick else 100
+    sizes = [n for n in GALLERY_SIZES if not args.quick or n <= 10000]
+    images = sample_images(args.images)
+
+    results = []
+    results += bench_match(sizes, repeat)
+    results += bench_match_batch(sizes, max(repeat // 5, 5))
+    results += bench_roster(sizes, repeat)
+    results += bench_remove_duplicates(repeat)
+    if images:
+        results += bench_decode(images, repeat)
+    if images and not args.skip_models:
+        try:
+            results += bench_models(images, max(repeat // 5, 5), args.pack)
+            results += bench_tiled(images, max(repeat // 10, 3), args.pack)
+            results += bench_batch(images, max(repeat // 5, 5), args.pack)
+        except Exception as e:
+            print("Model benchmarks skipped:", e)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "env": host_info(),
+        "model_pack": args.pack,
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Accuracy-versus-speed evaluation over a labelled face folder.
+
+Every image is a probe in a leave-one-out identification run against all
+other images of the folder (data/registered_faces by default, or any
+<label>/<images> tree). The sweep covers model pack, detection size,
+matching backend and threshold:
+
+    python -m benchmarks.evaluate --packs buffalo_l,buffalo_s --det-sizes 320,640
+    python -m benchmarks.evaluate --quantization none,static
+    python -m benchmarks.evaluate --tta-margins 0,0.05,0.1
+
+Reported per configuration:
+  rank1     top-ranked identity is the probe's own (threshold ignored)
+  far       probes accepted as somebody when their own identity is removed
+            from the gallery (an unregistered person walking in)
+  frr       genuine probes that are not accepted as their own identity
+            (rejected or matched to someone else)
+  embed_ms  detection + recognition time per image, plus the mirrored
+            embedding for the probes that got a second look
+  match_ms  matching time per probe against the full gallery
+  look      share of probes given a second look: best score within the
+            TTA margin of the threshold, re-scored with the mean of the
+            plain and mirrored embeddings (Engine.match_batch)
+
+Embeddings are cached per pack and detection size under data/.cache, so
+re-running a sweep only pays for matching.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+
+from backend.embedding_cache import CACHE_DIR, EmbeddingCache
+from backend.engine import Engine
+from backend.gallery import DATASET_DIR
+
+BACKENDS = ("exact", "centroid")
+DEFAULT_THRESHOLDS = "0.30,0.35,0.40,0.45,0.50,0.55,0.60"
+
+
+def list_images(root):
+    items = []
+    for person in sorted(os.listdir(root)):
+        person_dir = os.path.join(root, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for path in sorted(glob.glob(os.path.join(person_dir, "*"))):
+            if path.lower().endswith((".jpg", ".jpeg", ".png")):
+                items.append((path, person))
+    return items
+
+
+def embed_all(items, pack, det_size, cache_dir, quantization=None, flip=False):
+    # same models and cache tag as the engine, so the two share cached embeddings.
+    # flip: embeddings of the mirrored face crop instead; latency then only
+    # counts that extra recognizer call
+    engine = Engine(model_pack=pack, det_size=det_size, load_gallery=False, quantization=quantization)
+    cache = EmbeddingCache(engine.model_tag + ("_flip" if flip else ""), cache_dir)
+    embeddings, labels, latency = [], [], []
+    misses = 0
+
+    for path, person in items:
+        hit, emb, ms = cache.get(path)
+        if not hit:
+            img = cv2.imread(path)
+            emb = None
+            t0 = time.perf_counter()
+            if img is not None:
+                faces = engine.app.get(img)
+                if faces:
+                    emb = faces[0].embedding
+                    if flip:
+                        rec = engine.app.models["recognition"]
+                        crop = face_align.norm_crop(img, landmark=faces[0].kps, image_size=rec.input_size[0])
+                        t0 = time.perf_counter()
+                        emb = rec.get_feat(cv2.flip(crop, 1)).flatten()
+            ms = (time.perf_counter() - t0) * 1000
+            cache.put(path, emb, ms)
+            misses += 1
+        if emb is not None:
+            embeddings.append(emb / np.linalg.norm(emb))
+            labels.append(person)
+            latency.append(ms)
+
+    cache.save()
+    print(f"{cache.tag}: {len(labels)}/{len(items)} images with a face, {misses} embedded")
+    return np.array(embeddings, np.float32), labels, np.array(latency)
+
+
+def identity_scores(emb, ids, k, backend, probes=None):
+    # (N, K) best score of each probe against each identity, with the probe
+    # itself left out of its own identity (-inf when nothing is left).
+    # probes: other embeddings of the same N images to score instead of emb
+    n = len(ids)
+    probes = emb if probes is None else probes
+    if backend == "exact":
+        sims = probes @ emb.T
+        np.fill_diagonal(sims, -np.inf)
+        order = np.argsort(ids, kind="stable")
+        starts = np.searchsorted(ids[order], np.arange(k))
+        return np.maximum.reduceat(sims[:, order], starts, axis=1)
+
+    sums = np.zeros((k, emb.shape[1]), np.float32)
+    np.add.at(sums, ids, emb)
+    counts = np.bincount(ids, minlength=k)
+    centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    scores = probes @ centroids.T
+    own = sums[ids] - emb
+    own_norm = np.linalg.norm(own, axis=1)
+    own_score = np.where(counts[ids] > 1,
+                         np.einsum("ij,ij->i", probes, own) / np.maximum(own_norm, 1e-12),
+                         -np.inf)
+    scores[np.arange(n), ids] = own_score
+    return scores
+
+
+def match_latency(emb, k, backend, repeat=200):
+    gallery = emb if backend == "exact" else np.repeat(emb[:1], k, axis=0)
+    probe = emb[0]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        sims = gallery @ probe
+        sims.argmax()
+    return (time.perf_counter() - t0) * 1000 / repeat
+
+
+def evaluate(scores, ids, thresholds):
+    n = len(ids)
+    rows = np.arange(n)
+    own = scores[rows, ids]
+    others = scores.copy()
+    others[rows, ids] = -np.inf
+    best_other = others.max(axis=1)
+
+    genuine = np.isfinite(own)
+    rank1 = float(np.mean(own[genuine] > best_other[genuine])) if genuine.any() else 0.0
+
+    results = []
+    for thr in thresholds:
+        correct = genuine & (own > best_other) & (own > thr)
+        frr = float(1 - correct[genuine].mean()) if genuine.any() else 0.0
+        far = float(np.mean(best_other > thr))
+        results.append((thr, rank1, far, frr))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Leave-one-out accuracy/speed sweep")
+    parser.add_argument("--data", default=DATASET_DIR, help="folder of <label>/<images>")
+    parser.add_argument("--packs", default="buffalo_l", help="comma-separated model packs")
+    parser.add_argument("--det-sizes", default="640", help="comma-separated detector input sizes")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--quantization", default="none", help="comma-separated: none, dynamic, static")
+    parser.add_argument("--tta-margins", default="0",
+                        help="comma-separated second-look margins around the threshold (0: off)")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--out", help="write the table as .csv or .json")
+    args = parser.parse_args()
+
+    items = list_images(args.data)
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    backends = [b for b in args.backends.split(",") if b]
+    for b in backends:
+        if b not in BACKENDS:
+            parser.error(f"unknown backend {b!r}, expected one of {', '.join(BACKENDS)}")
+
+    quants = [None if q == "none" else q for q in args.quantization.split(",") if q]
+    margins = [float(m) for m in args.tta_margins.split(",") if m]
+
+    table = []
+    for pack in args.packs.split(","):
+        for det_size, quant in ((int(s), q) for s in args.det_sizes.split(",") for q in quants):
+            emb, labels, latency = embed_all(items, pack, det_size, args.cache_dir, quant)
+            if len(labels) < 2:
+                print(f"{pack} det{det_size}: not enough faces to evaluate")
+                continue
+            names = sorted(set(labels))
+            number = {name: i for i, name in enumerate(names)}
+            ids = np.array([number[l] for l in labels])
+
+            fused, looks = None, margins
+            if any(margins):
+                flipped, flip_labels, flip_latency = embed_all(items, pack, det_size, args.cache_dir, quant,
+                                                               flip=True)
+                if flip_labels != labels:
+                    print(f"{pack} det{det_size}: mirrored embeddings do not line up, skipping TTA")
+                    looks = [0.0]
+                else:
+                    fused = emb + flipped
+                    fused /= np.linalg.norm(fused, axis=1, keepdims=True)
+
+            for backend in backends:
+                scores = identity_scores(emb, ids, len(names), backend)
+                fused_scores = identity_scores(emb, ids, len(names), backend, fused) if fused is not None else None
+                match_ms = match_latency(emb, len(names), backend)
+                best = scores.max(axis=1)
+
+                for margin, thr in ((m, t) for m in looks for t in thresholds):
+                    look = np.abs(best - thr) <= margin if margin else np.zeros(len(ids), bool)
+                    mixed = np.where(look[:, None], fused_scores, scores) if look.any() else scores
+                    _, rank1, far, frr = evaluate(mixed, ids, [thr])[0]
+                    embed_ms = float(np.median(latency))
+                    if look.any():
+                        embed_ms += float(look.mean() * np.median(flip_latency))
+                    table.append({
+                        "pack": pack, "det_size": det_size, "quantization": quant or "none",
+                        "backend": backend, "tta_margin": margin,
+                        "threshold": thr, "images": len(labels), "identities": len(names),
+                        "rank1": round(rank1, 4), "far": round(far, 4), "frr": round(frr, 4),
+                        "second_look": round(float(look.mean()), 4),
+                        "embed_ms": round(embed_ms, 2),
+                        "match_ms": round(match_ms, 4),
+                    })
+
+    header = (f"{'pack':<12}{'det':>5}  {'quant':<8}{'backend':<9}{'tta':>5}{'thr':>6}{'rank1':>8}{'far':>8}"
+              f"{'frr':>8}{'look':>7}{'embed_ms':>10}{'match_ms':>10}")
+    print(header)
+    print("-" * len(header))
+    for r in table:
+        print(f"{r['pack']:<12}{r['det_size']:>5}  {r['quantization']:<8}{r['backend']:<9}{r['tta_margin']:>5.2f}"
+              f"{r['threshold']:>6.2f}{r['rank1']:>8.3f}{r['far']:>8.3f}{r['frr']:>8.3f}{r['second_look']:>7.3f}"
+              f"{r['embed_ms']:>10.1f}{r['match_ms']:>10.4f}")
+
+    if args.out and table:
+        with open(args.out, "w", newline="") as f:
+            if args.out.endswith(".json"):
+                json.dump(table, f, indent=2)
+            else:
+                writer = csv.DictWriter(f, fieldnames=list(table[0]))
+                writer.writeheader()
+                writer.writerows(table)
+        print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
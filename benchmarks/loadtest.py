@@ -0,0 +1,275 @@
+"""Load generator for the web app's /process endpoint.
+
+Simulates M tablets, each posting JPEG frames at N frames per second inside
+one attendance session (/start ... /end), and reports throughput, error rate
+and latency percentiles. Frames come from data/registered_faces or from a
+recorded clip:
+
+    ATTEND_ATTENDANCE_FILE=/tmp/load.csv python web_app.py &
+    python -m benchmarks.loadtest --clients 4 --fps 2 --duration 60
+    python -m benchmarks.loadtest --clients 1,2,4,8,16 --fps 2 --video clip.mp4 --out load.json
+
+A comma-separated --clients runs one step per value, which shows where
+latency starts to climb. Only servers on localhost are accepted.
+
+Every /end appends the session to the server's attendance file, so start the
+server with ATTEND_ATTENDANCE_FILE pointing at a scratch file, or pass
+--no-session.
+"""
+
+import argparse
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import cv2
+import numpy as np
+
+from backend.gallery import DATASET_DIR
+from benchmarks.common import fit_frame, git_commit, host_info
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1")
+
+
+def load_frames(source, size, limit, quality):
+    images = []
+    if os.path.isfile(source):
+        cap = cv2.VideoCapture(source)
+        while len(images) < limit:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            images.append(frame)
+        cap.release()
+    else:
+        for path in sorted(glob.glob(os.path.join(source, "*", "*"))):
+            if not path.lower().endswith((".jpg", ".jpeg", ".png")):
+                continue
+            img = cv2.imread(path)
+            if img is not None:
+                images.append(img)
+            if len(images) >= limit:
+                break
+
+    # encoded once up front so the clients spend no time on it
+    frames = []
+    for img in images:
+        ok, buf = cv2.imencode(".jpg", fit_frame(img, size), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if ok:
+            frames.append(buf.tobytes())
+    return frames
+
+
+def multipart(jpeg):
+    # same form the browser sends: one "frame" file field
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="frame"; filename="frame.jpg"\r\n'
+            f"Content-Type: image/jpeg\r\n\r\n").encode() + jpeg + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {"Content-Type": content_type} if content_type else {}
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, ConnectionError):
+                # the server closed a kept-alive connection; retry once on a new one
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def wait_ready(client, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            status, _ = client.request("GET", "/ready")
+            if status == 200:
+                return True
+        except OSError:
+            pass
+        time.sleep(1)
+    return False
+
+
+def simulate(host, port, bodies, fps, duration, timeout, offset, records, lock):
+    # one tablet: frames on a fixed schedule; when a response comes back late
+    # the missed slots are skipped rather than sent in a burst
+    client = Client(host, port, timeout)
+    interval = 1.0 / fps
+    start = time.monotonic() + offset
+    end = start + duration
+    slot = 0
+    mine = []
+
+    while True:
+        due = start + slot * interval
+        now = time.monotonic()
+        if due >= end:
+            break
+        if due > now:
+            time.sleep(due - now)
+        elif now - due > interval:
+            skipped = int((now - due) / interval)
+            slot += skipped
+            mine.append((now, None, "skipped", skipped))
+            continue
+
+        body, ctype = bodies[slot % len(bodies)]
+        t0 = time.monotonic()
+        try:
+            status, data = client.request("POST", "/process", body, ctype)
+            faces = len(json.loads(data)) if status == 200 else 0
+            mine.append((t0, (time.monotonic() - t0) * 1000, status, faces))
+        except Exception as e:
+            mine.append((t0, (time.monotonic() - t0) * 1000, type(e).__name__, 0))
+        slot += 1
+
+    client.close()
+    with lock:
+        records.extend(mine)
+
+
+def summarize(records, clients, fps, duration):
+    sent = [r for r in records if r[2] != "skipped"]
+    ok = [r for r in sent if r[2] == 200]
+    latency = np.array([r[1] for r in ok]) if ok else np.zeros(1)
+    statuses = {}
+    for r in sent:
+        statuses[str(r[2])] = statuses.get(str(r[2]), 0) + 1
+
+    return {
+        "clients": clients,
+        "fps_per_client": fps,
+        "offered_fps": clients * fps,
+        "requests": len(sent),
+        "skipped_frames": sum(r[3] for r in records if r[2] == "skipped"),
+        "throughput_fps": len(ok) / duration,
+        "error_rate": (len(sent) - len(ok)) / len(sent) if sent else 0.0,
+        "statuses": statuses,
+        "faces_per_frame": float(np.mean([r[3] for r in ok])) if ok else 0.0,
+        "p50_ms": float(np.percentile(latency, 50)),
+        "p95_ms": float(np.percentile(latency, 95)),
+        "p99_ms": float(np.percentile(latency, 99)),
+        "max_ms": float(latency.max()),
+    }
+
+
+def run_step(host, port, bodies, clients, fps, duration, timeout, session):
+    control = Client(host, port, timeout)
+    if session:
+        control.request("POST", "/start")
+
+    records = []
+    lock = threading.Lock()
+    # spread the clients' phases over one frame interval, like real tablets
+    threads = [threading.Thread(target=simulate, daemon=True,
+                                args=(host, port, bodies, fps, duration, timeout,
+                                      i / (clients * fps), records, lock))
+               for i in range(clients)]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+
+    if session:
+        status, data = control.request("POST", "/end")
+        if status == 200:
+            print(f"  session ended, {json.loads(data).get('count', 0)} students marked")
+    control.close()
+
+    return summarize(records, clients, fps, max(elapsed, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the web app's /process endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--clients", default="4", help="simulated tablets, or a comma-separated ramp")
+    parser.add_argument("--fps", type=float, default=2.0, help="frames per second per client")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--images", default=DATASET_DIR, help="folder of <label>/<images>")
+    parser.add_argument("--video", help="recorded clip to replay instead of the images")
+    parser.add_argument("--frames", type=int, default=200, help="distinct frames to replay")
+    parser.add_argument("--size", default="640x480", help="frame size sent by the clients")
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--no-session", action="store_true", help="skip /start and /end")
+    parser.add_argument("--out", help="write the results as JSON")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    if url.hostname not in LOCAL_HOSTS:
+        parser.error(f"refusing to load-test {url.hostname!r}: only localhost servers are allowed")
+    host, port = url.hostname, url.port or 80
+
+    size = tuple(int(v) for v in args.size.lower().split("x"))
+    frames = load_frames(args.video or args.images, size, args.frames, args.quality)
+    if not frames:
+        parser.error("no frames to send")
+    bodies = [multipart(f) for f in frames]
+    print(f"{len(frames)} frames, {args.size}, mean {np.mean([len(f) for f in frames]) / 1024:.0f} KB")
+
+    if not wait_ready(Client(host, port, args.timeout), 120):
+        parser.error(f"{args.url} did not become ready")
+
+    steps = []
+    for clients in (int(c) for c in args.clients.split(",") if c):
+        print(f"{clients} clients x {args.fps:g} fps for {args.duration:g}s")
+        step = run_step(host, port, bodies, clients, args.fps, args.duration, args.timeout,
+                        not args.no_session)
+        steps.append(step)
+        print(f"  {step['throughput_fps']:.1f}/{step['offered_fps']:g} fps  "
+              f"errors {step['error_rate']:.1%}  skipped {step['skipped_frames']}  "
+              f"p50 {step['p50_ms']:.0f} ms  p95 {step['p95_ms']:.0f} ms  p99 {step['p99_ms']:.0f} ms")
+
+    header = f"{'clients':>8}{'offered':>9}{'served':>9}{'errors':>8}{'p50_ms':>9}{'p95_ms':>9}{'p99_ms':>9}"
+    print(header)
+    print("-" * len(header))
+    for s in steps:
+        print(f"{s['clients']:>8}{s['offered_fps']:>9.1f}{s['throughput_fps']:>9.1f}{s['error_rate']:>8.1%}"
+              f"{s['p50_ms']:>9.0f}{s['p95_ms']:>9.0f}{s['p99_ms']:>9.0f}")
+
+    if args.out:
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "env": host_info(),
+            "url": args.url,
+            "frame_size": args.size,
+            "source": args.video or args.images,
+            "steps": steps,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Compare ONNX Runtime session configurations for the engine's models.
+
+For each configuration this measures cold model load (graph optimization
+included), warm load (optimized graph read from the cache), detection and
+recognition latency. A second table runs several worker processes at once,
+as gunicorn workers or several engines on one host would, and compares
+their combined throughput with ORT's default thread count against an even
+split of the cores:
+
+    python -m benchmarks.ort_sessions --out ort.json
+    python -m benchmarks.ort_sessions --pack fast --workers 2,4,8
+
+Run it on each machine class (4, 8 and 32 cores) and keep the JSON files
+side by side; the host section records the core count.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from backend.engine import Engine
+from backend.gallery import sample_images
+from backend.runtime import SessionConfig
+from benchmarks.common import fit_frame, git_commit, host_info
+from benchmarks.engine_bench import timeit
+
+FRAME_SIZE = (1280, 720)
+
+
+def configurations(cores):
+    yield "ort-default", {"intra_threads": 0}
+    for t in sorted({1, 2, 4, max(cores // 2, 1), cores}):
+        if t <= cores:
+            yield f"intra-{t}", {"intra_threads": t}
+    yield f"intra-{cores}-no-spin", {"intra_threads": cores, "spin": False}
+    yield "opt-basic", {"opt_level": "basic"}
+    yield "opt-extended", {"opt_level": "extended"}
+    yield "parallel-inter-2", {"execution": "parallel", "inter_threads": 2}
+    yield "no-mem-arena", {"mem_arena": False}
+
+
+def load_engine(pack, settings, cache_dir):
+    config = SessionConfig(cache_dir=cache_dir, **settings)
+    t0 = time.perf_counter()
+    engine = Engine(model_pack=pack, load_gallery=False, session_config=config)
+    engine.warm_up()
+    return engine, (time.perf_counter() - t0) * 1000
+
+
+def bench_config(name, settings, pack, frames, repeat):
+    cache_dir = tempfile.mkdtemp(prefix="ort-bench-")
+    try:
+        _, cold_ms = load_engine(pack, settings, cache_dir)
+        engine, warm_ms = load_engine(pack, settings, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    det = engine.app.det_model
+    rec = engine.app.models.get("recognition")
+    it = iter(range(1 << 30))
+
+    row = {"name": name, "settings": settings, "cold_load_ms": cold_ms, "warm_load_ms": warm_ms}
+    row["detect"] = timeit(lambda: det.detect(frames[next(it) % len(frames)]), repeat)
+
+    if rec is not None:
+        crop = np.zeros((112, 112, 3), np.uint8)
+        row["recognize"] = timeit(lambda: rec.get_feat(crop), repeat)
+
+    print(f"{name:<24} cold {cold_ms:8.0f} ms  warm {warm_ms:8.0f} ms  "
+          f"detect {row['detect']['p50_ms']:7.2f} ms"
+          + (f"  recognize {row['recognize']['p50_ms']:6.2f} ms" if rec is not None else ""))
+    return row
+
+
+def _worker(pack, settings, frames, seconds, barrier, out):
+    cache_dir = tempfile.mkdtemp(prefix="ort-bench-")
+    try:
+        engine, _ = load_engine(pack, settings, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    det = engine.app.det_model
+    barrier.wait()
+    done = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        det.detect(frames[done % len(frames)])
+        done += 1
+    out.put(done / (time.perf_counter() - t0))
+
+
+def bench_workers(workers, settings, pack, frames, seconds):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(pack, settings, frames, seconds, barrier, out))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rates = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return sum(rates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ONNX Runtime session settings")
+    parser.add_argument("--out", default="ort_sessions.json")
+    parser.add_argument("--pack", help="model pack or mode")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--workers", default="2,4", help="comma-separated worker counts")
+    parser.add_argument("--seconds", type=float, default=10, help="duration of each worker run")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    images = sample_images(4)
+    if not images:
+        parser.error("no sample images found")
+    frames = [fit_frame(img, FRAME_SIZE) for img in images]
+
+    single = [bench_config(name, settings, args.pack, frames, args.repeat)
+              for name, settings in configurations(cores)]
+
+    shared = []
+    for workers in (int(w) for w in args.workers.split(",") if w):
+        split = max(cores // workers, 1)
+        for name, settings in [("ort-default", {"intra_threads": 0}),
+                               (f"intra-{split}", {"intra_threads": split}),
+                               (f"intra-{split}-no-spin", {"intra_threads": split, "spin": False})]:
+            fps = bench_workers(workers, settings, args.pack, frames, args.seconds)
+            shared.append({"workers": workers, "name": name, "settings": settings, "detect_fps": fps})
+            print(f"{workers} workers  {name:<22} {fps:8.1f} detections/s combined")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "env": host_info(),
+        "model_pack": args.pack,
+        "frame_size": list(FRAME_SIZE),
+        "single_process": single,
+        "multi_process": shared,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Wrote", args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Accuracy-regression check of the INT8 models against the float ones.
+
+Runs every image of the labelled folder through both engines and compares:
+
+  cosine    agreement between float and INT8 embeddings of the same face
+  det_iou   overlap of the top detection in both engines
+  rank1/far/frr  leave-one-out identification at SIM_THRESHOLD, as in
+            benchmarks/evaluate.py, for each engine
+  embed_ms  median detection + recognition time per image
+
+    python -m benchmarks.quantization --pack buffalo_l --mode static
+
+Exits with status 1 when the INT8 models fall outside the tolerances, so the
+check can gate a rollout.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from backend.engine import SIM_THRESHOLD, Engine
+from backend.gallery import DATASET_DIR
+from backend.runtime import QUANT_MODES
+from benchmarks.evaluate import evaluate, identity_scores, list_images
+
+
+def run_engine(engine, items):
+    engine.warm_up()
+    out = []
+    for path, _ in items:
+        img = cv2.imread(path)
+        t0 = time.perf_counter()
+        faces = engine.app.get(img) if img is not None else []
+        ms = (time.perf_counter() - t0) * 1000
+        face = max(faces, key=lambda f: f.det_score) if faces else None
+        out.append((face, ms))
+    return out
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def identification(embeddings, labels):
+    emb = np.array([e / np.linalg.norm(e) for e in embeddings], np.float32)
+    names = sorted(set(labels))
+    number = {name: i for i, name in enumerate(names)}
+    ids = np.array([number[l] for l in labels])
+    scores = identity_scores(emb, ids, len(names), "exact")
+    _, rank1, far, frr = evaluate(scores, ids, [SIM_THRESHOLD])[0]
+    return rank1, far, frr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare INT8 models with the float models")
+    parser.add_argument("--data", default=DATASET_DIR)
+    parser.add_argument("--pack", default="buffalo_l")
+    parser.add_argument("--mode", choices=QUANT_MODES, default="static")
+    parser.add_argument("--det-size", type=int)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="lowest mean float/INT8 cosine")
+    parser.add_argument("--max-rank1-drop", type=float, default=0.01)
+    parser.add_argument("--max-frr-rise", type=float, default=0.02)
+    parser.add_argument("--max-far-rise", type=float, default=0.01)
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    items = list_images(args.data)
+    ref = run_engine(Engine(args.pack, args.det_size, load_gallery=False), items)
+    q = run_engine(Engine(args.pack, args.det_size, load_gallery=False, quantization=args.mode), items)
+
+    both = [i for i in range(len(items)) if ref[i][0] is not None and q[i][0] is not None]
+    lost = sum(1 for i in range(len(items)) if ref[i][0] is not None and q[i][0] is None)
+    if len(both) < 2:
+        print("Not enough faces found by both engines to compare")
+        sys.exit(1)
+
+    cos = np.array([
+        float(np.dot(ref[i][0].normed_embedding, q[i][0].normed_embedding)) for i in both
+    ])
+    ious = np.array([iou(ref[i][0].bbox, q[i][0].bbox) for i in both])
+    labels = [items[i][1] for i in both]
+    r_rank1, r_far, r_frr = identification([ref[i][0].embedding for i in both], labels)
+    q_rank1, q_far, q_frr = identification([q[i][0].embedding for i in both], labels)
+    r_ms = float(np.median([ms for _, ms in ref]))
+    q_ms = float(np.median([ms for _, ms in q]))
+
+    report = {
+        "pack": args.pack, "mode": args.mode, "images": len(items), "compared": len(both),
+        "faces_lost": lost,
+        "cosine_mean": float(cos.mean()), "cosine_min": float(cos.min()),
+        "det_iou_mean": float(ious.mean()),
+        "float": {"rank1": r_rank1, "far": r_far, "frr": r_frr, "embed_ms": r_ms},
+        "int8": {"rank1": q_rank1, "far": q_far, "frr": q_frr, "embed_ms": q_ms},
+        "speedup": r_ms / q_ms if q_ms else None,
+    }
+
+    failures = []
+    if cos.mean() < args.min_cosine:
+        failures.append(f"mean cosine {cos.mean():.4f} < {args.min_cosine}")
+    if r_rank1 - q_rank1 > args.max_rank1_drop:
+        failures.append(f"rank-1 dropped {r_rank1 - q_rank1:.4f}")
+    if q_frr - r_frr > args.max_frr_rise:
+        failures.append(f"FRR rose {q_frr - r_frr:.4f}")
+    if q_far - r_far > args.max_far_rise:
+        failures.append(f"FAR rose {q_far - r_far:.4f}")
+    report["failures"] = failures
+
+    print(f"{args.pack} INT8 ({args.mode}) vs float on {len(both)}/{len(items)} images, {lost} faces lost")
+    print(f"  cosine   mean {cos.mean():.4f}  min {cos.min():.4f}")
+    print(f"  det IoU  mean {ious.mean():.4f}")
+    print(f"  {'':8}{'rank1':>8}{'far':>8}{'frr':>8}{'embed_ms':>10}")
+    print(f"  {'float':<8}{r_rank1:>8.3f}{r_far:>8.3f}{r_frr:>8.3f}{r_ms:>10.1f}")
+    print(f"  {'int8':<8}{q_rank1:>8.3f}{q_far:>8.3f}{q_frr:>8.3f}{q_ms:>10.1f}")
+    print(f"  speedup  {report['speedup']:.2f}x")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Wrote", args.out)
+
+    if failures:
+        print("FAIL:", "; ".join(failures))
+        sys.exit(1)
+    print("PASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ source venv/bin/activate
 python -m pip install --upgrade pip
 
 # Install dependencies
-pip install pyqt5 opencv-python numpy==1.26.4 insightface onnxruntime
+pip install pyqt5 opencv-python numpy==1.26.4 insightface onnxruntime psutil
 
 # Run app
 python app.py
\ No newline at end of file
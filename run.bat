@@ -14,7 +14,7 @@ REM Upgrade pip (optional but good)
 python -m pip install --upgrade pip
 
 REM Install dependencies
-pip install pyqt5 opencv-python numpy==1.26.4 insightface onnxruntime
+pip install pyqt5 opencv-python numpy==1.26.4 insightface onnxruntime psutil
 
 REM Run app
 python app.py
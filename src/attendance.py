@@ -13,17 +13,27 @@ def get_all_students(registered_faces_dir="data/registered_faces"):
     return students
 
 
-def write_attendance(present_students):
+def write_attendance(present_students, roster=None, evidence=None):
+    # evidence: the session's backend.evidence.Evidence; adds how many
+    # matches confirmed each present student and their summed score
     time_str = datetime.now().strftime("%H:%M:%S")
-    all_students = get_all_students()
+    all_students = sorted(roster) if roster is not None else get_all_students()
 
     with open(FILE_NAME, "w") as file:
         # Header
-        file.write(f"{'Name':<20} {'Time':<10} {'Status'}\n")
-        file.write("-" * 40 + "\n")
+        if evidence is None:
+            file.write(f"{'Name':<20} {'Time':<10} {'Status'}\n")
+            file.write("-" * 40 + "\n")
+        else:
+            file.write(f"{'Name':<20} {'Time':<10} {'Status':<8} {'Hits':>5} {'Score':>7}\n")
+            file.write("-" * 54 + "\n")
 
         # Rows
         for student in all_students:
             status = "Present" if student in present_students else "Absent"
-            file.write(f"{student:<20} {time_str:<10} {status}\n")
+            record = evidence.record(student) if evidence is not None else None
+            if record and status == "Present":
+                file.write(f"{student:<20} {time_str:<10} {status:<8} {record['hits']:>5} {record['score']:>7.3f}\n")
+            else:
+                file.write(f"{student:<20} {time_str:<10} {status}\n")
 
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+def _unit(*weights):
+    v = np.zeros(512, np.float32)
+    v[:len(weights)] = weights
+    return v
+
+
+class FakeEmbedder:
+
+    # stands in for the Engine when a gallery is loaded: embeds each image as
+    # a one-hot vector picked by its grey level, and counts the calls
+    model_tag = "fake"
+
+    def __init__(self):
+        self.calls = 0
+        self.app = SimpleNamespace(get=self.get)
+
+    def get(self, img):
+        self.calls += 1
+        emb = np.zeros(512, np.float32)
+        emb[int(img.mean())] = 1
+        return [SimpleNamespace(embedding=emb)]
+
+
+@pytest.fixture
+def unit():
+    # -> unit(*weights): a 512-d vector with the given leading components
+    return _unit
+
+
+@pytest.fixture
+def embedder():
+    # -> the FakeEmbedder class; each call makes a fresh call counter
+    return FakeEmbedder
+
+
+@pytest.fixture
+def gallery_engine():
+    # -> make(rows, **engine_kwargs): an Engine searching the given
+    # (name, embedding) rows. No models are loaded: matching only needs the
+    # gallery, and tests replace whatever else they call.
+    pytest.importorskip("insightface")
+    from backend.engine import Engine
+
+    def make(rows, **kwargs):
+        engine = Engine(load_gallery=False, **{"quality": False, "tta_margin": 0, **kwargs})
+        engine.embeddings = np.stack([emb for _, emb in rows]).astype(np.float32)
+        engine.names = [name for name, _ in rows]
+        return engine
+
+    return make
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+from backend.compact import compact, medoids
+
+
+def unit(rows):
+    rows = np.asarray(rows, np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def test_medoids_identical_rows():
+    e = unit(np.random.default_rng(0).normal(size=(1, 8)))
+    assert medoids(np.repeat(e, 4, 0), 2) == [0]
+
+
+def test_medoids_duplicates_and_distinct():
+    a, b = unit(np.eye(8)[:2])
+    emb = np.stack([a, a, a, b, b])
+    kept = medoids(emb, 3)
+    assert len(kept) == 2
+    assert {tuple(emb[i]) for i in kept} == {tuple(a), tuple(b)}
+
+
+def test_medoids_fewer_rows_than_k():
+    assert medoids(unit(np.eye(4)[:2]), 5) == [0, 1]
+
+
+def test_compact_duplicate_and_singleton_identities():
+    rng = np.random.default_rng(1)
+    alice = unit(rng.normal(size=(1, 16)))
+    bob = unit(rng.normal(size=(1, 16)))
+    emb = np.concatenate([np.repeat(alice, 6, 0), bob])
+    names = ["alice"] * 6 + ["bob"]
+
+    kept, outliers = compact(emb, names, keep=3)
+
+    assert outliers == {}
+    assert [names[i] for i in kept] == ["alice", "bob"]
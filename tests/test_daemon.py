@@ -0,0 +1,191 @@
+import http.client
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+import backend.daemon
+from backend.daemon import CameraError, Daemon, Handler
+from backend.evidence import Evidence
+
+NAMES = ["2400351_Aryan", "2402180_Daksh", "2409999_Esha"]
+
+
+class FakeCamera:
+
+    def __init__(self):
+        self.released = threading.Event()
+
+    def read(self):
+        return True, np.zeros((4, 4, 3), np.uint8)
+
+    def release(self):
+        self.released.set()
+
+
+class FakeSession:
+
+    # marks one roster student per processed frame
+    def __init__(self, engine, roster=None, fallback=False, gallery=None):
+        self.gallery = engine.galleries.get(gallery)
+        self.roster = frozenset(self.gallery.names if roster is None else roster)
+        self.scoped = roster is not None
+        self.present = set()
+        self.evidence = Evidence()
+
+    @property
+    def complete(self):
+        return self.roster <= self.present
+
+    def due(self):
+        return True
+
+    def process(self, frame):
+        for name in sorted(self.roster - self.present)[:1]:
+            self.evidence.add(name, 0.9)
+            self.present.add(name)
+        return [{"name": "x", "box": (0, 0, 4, 4)}]
+
+
+@pytest.fixture
+def camera(monkeypatch):
+    cameras = []
+
+    def open_camera(source):
+        if source == "broken":
+            raise CameraError(f"cannot open camera {source!r}")
+        cameras.append(FakeCamera())
+        return cameras[-1]
+
+    monkeypatch.setattr(backend.daemon, "open_camera", open_camera)
+    monkeypatch.setattr(backend.daemon, "AttendanceSession", FakeSession)
+    return cameras
+
+
+@pytest.fixture
+def service(camera, tmp_path, monkeypatch):
+    # attendance.csv is written to the working directory, and lists every
+    # registered student for a session without a roster
+    monkeypatch.chdir(tmp_path)
+    for name in NAMES:
+        (tmp_path / "data" / "registered_faces" / name).mkdir(parents=True)
+    galleries = {"default": SimpleNamespace(name="default", names=NAMES),
+                 "cse": SimpleNamespace(name="cse", names=["2500001_Farah", "2500002_Gita"])}
+    engine = SimpleNamespace(model_pack="fake", det_size=640, det_scalable=False, live_det_size=None,
+                             galleries=SimpleNamespace(get=lambda name: galleries[name or "default"]))
+    return Daemon(engine, camera="0")
+
+
+@pytest.fixture
+def api(service):
+    Handler.service = service
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def call(method, path, body=None):
+        conn = http.client.HTTPConnection(*server.server_address, timeout=5)
+        if body is not None and not isinstance(body, str):
+            body = json.dumps(body)
+        conn.request(method, path, body)
+        response = conn.getresponse()
+        data = response.read()
+        conn.close()
+        return response.status, json.loads(data) if path != "/metrics" else data.decode()
+
+    yield call
+
+    if service.session is not None:
+        service.stop()
+    server.shutdown()
+    server.server_close()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_session_start_status_stop(api, service, camera, tmp_path):
+    code, body = api("GET", "/status")
+    assert code == 200 and body["active"] is False
+
+    code, body = api("POST", "/session/start", {"roster": ["2400351", "2402180_Daksh", "2411111"]})
+    assert code == 200
+    assert body == {"status": "started", "missing": ["2411111"]}
+
+    wait_for(lambda: len(service.session.present) == 2)
+    code, body = api("GET", "/status")
+    assert body["active"] and body["camera_running"]
+    assert (body["roster"], body["present"], body["complete"]) == (2, 2, True)
+
+    code, body = api("GET", "/recognitions")
+    assert body["present"] == ["2400351_Aryan", "2402180_Daksh"]
+
+    code, body = api("POST", "/session/stop")
+    assert code == 200
+    assert body["status"] == "ended" and body["count"] == 2 and body["absent"] == []
+    assert body["evidence"]["2400351_Aryan"] is not None
+    assert camera[0].released.is_set()
+    assert service.session is None
+
+    sheet = (tmp_path / "attendance.csv").read_text()
+    assert "2400351_Aryan" in sheet and "Present" in sheet and "2409999_Esha" not in sheet
+
+
+def test_named_gallery_without_roster_lists_its_students(api, service, tmp_path):
+    assert api("POST", "/session/start", {"gallery": "cse"})[0] == 200
+    wait_for(lambda: service.session.complete)
+
+    code, body = api("POST", "/session/stop")
+    assert code == 200 and body["count"] == 2
+
+    rows = [line.split() for line in (tmp_path / "attendance.csv").read_text().splitlines()[2:]]
+    assert [(row[0], row[2]) for row in rows] == [("2500001_Farah", "Present"), ("2500002_Gita", "Present")]
+
+
+def test_default_gallery_without_roster_lists_registered_students(api, service, tmp_path):
+    assert api("POST", "/session/start", {})[0] == 200
+    wait_for(lambda: service.session.complete)
+    api("POST", "/session/stop")
+
+    rows = [line.split() for line in (tmp_path / "attendance.csv").read_text().splitlines()[2:]]
+    assert sorted(row[0] for row in rows) == NAMES
+
+
+def test_conflicts_are_409(api):
+    assert api("POST", "/session/stop")[0] == 409
+    assert api("POST", "/session/start", {})[0] == 200
+    assert api("POST", "/session/start", {})[0] == 409
+
+
+def test_camera_failure_is_503(api, service):
+    service.camera = "broken"
+    code, body = api("POST", "/session/start", {})
+    assert code == 503 and "broken" in body["error"]
+    assert service.session is None
+
+
+def test_rosters_must_be_inline_names(api, service, tmp_path):
+    (tmp_path / "secret.csv").write_text("2400351\n")
+
+    code, body = api("POST", "/session/start", {"roster_file": str(tmp_path / "secret.csv")})
+    assert code == 400
+    assert api("POST", "/session/start", {"roster": "2400351"})[0] == 400
+    assert api("POST", "/session/start", {"roster": ["2411111"]})[0] == 400
+    assert api("POST", "/session/start", "roster=2400351")[0] == 400
+    assert service.session is None
+
+
+def test_unknown_paths_and_metrics(api):
+    assert api("GET", "/nope")[0] == 404
+    assert api("POST", "/nope", {})[0] == 404
+    code, text = api("GET", "/metrics")
+    assert code == 200 and "attend_" in text
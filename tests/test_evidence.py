@@ -0,0 +1,48 @@
+import pytest
+
+from backend.evidence import Evidence
+
+
+def test_single_confirms_on_first_match():
+    evidence = Evidence("single")
+    assert evidence.add("alice", 0.6, now=0)
+    assert evidence.confirmed() == {"alice"}
+
+
+def test_hits_needs_matches_within_window():
+    evidence = Evidence("hits", hits=2, window=10)
+    assert not evidence.add("alice", 0.6, now=0)
+    # the first hit has left the window by now
+    assert not evidence.add("alice", 0.6, now=11)
+    assert evidence.add("alice", 0.6, now=12)
+    assert evidence.record("alice")["hits"] == 3
+    assert evidence.record("alice")["confirmed"] == 12
+
+
+def test_score_sums_within_window():
+    evidence = Evidence("score", score=1.2, window=10)
+    assert not evidence.add("bob", 0.55, now=0)
+    assert not evidence.add("bob", 0.6, now=1)
+    assert evidence.add("bob", 0.7, now=2)
+
+
+def test_confirmed_stays_confirmed():
+    evidence = Evidence("hits", hits=2)
+    evidence.add("alice", 0.6, now=0)
+    evidence.add("alice", 0.6, now=1)
+    assert evidence.add("alice", 0.4, now=100)
+    record = evidence.record("alice")
+    assert record["confirmed"] == 1
+    assert record["best"] == pytest.approx(0.6)
+
+
+def test_students_are_counted_separately():
+    evidence = Evidence("hits", hits=2)
+    assert not evidence.add("alice", 0.6, now=0)
+    assert not evidence.add("bob", 0.6, now=0)
+    assert evidence.confirmed() == set()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        Evidence("often")
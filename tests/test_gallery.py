@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from backend.gallery import Gallery, GalleryStore
+
+
+def add_images(root, person, *levels):
+    folder = root / person
+    folder.mkdir(parents=True, exist_ok=True)
+    for i, level in enumerate(levels):
+        cv2.imwrite(str(folder / f"{person}_{i}.png"), np.full((8, 8, 3), level, np.uint8))
+
+
+@pytest.fixture
+def gallery(tmp_path, monkeypatch, embedder):
+    # the embedding cache lives under data/.cache in the working directory
+    monkeypatch.chdir(tmp_path)
+    root = tmp_path / "faces"
+    add_images(root, "alice", 10, 11)
+    add_images(root, "bob", 20)
+    gallery = Gallery(root=str(root))
+    gallery.load(embedder())
+    return gallery
+
+
+def test_apply_adds_a_new_person(gallery, embedder):
+    engine = embedder()
+    add_images(Path(gallery.root), "carol", 30, 31, 32)
+    version = gallery.version
+
+    gallery.apply(engine, {"carol"})
+
+    assert gallery.names == ["alice", "alice", "bob", "carol", "carol", "carol"]
+    assert gallery.version == version + 1
+    # only carol's images were embedded, the rest came from the cache
+    assert engine.calls == 3
+
+
+def test_apply_removes_a_deleted_person(gallery, embedder):
+    for path in (Path(gallery.root) / "bob").iterdir():
+        path.unlink()
+    (Path(gallery.root) / "bob").rmdir()
+
+    gallery.apply(embedder(), {"bob"})
+
+    assert gallery.names == ["alice", "alice"]
+    assert len(gallery.embeddings) == 2
+
+
+def test_apply_cached_only_never_embeds(gallery, embedder):
+    engine = embedder()
+    add_images(Path(gallery.root), "carol", 30)
+
+    gallery.apply(engine, {"carol"}, cached_only=True)
+    assert "carol" not in gallery.names
+    assert engine.calls == 0
+
+    gallery.apply(engine, {"carol"})
+    gallery.apply(engine, {"carol"}, cached_only=True)
+    assert gallery.names.count("carol") == 1
+    assert engine.calls == 1
+
+
+def test_index_is_cached_per_version(gallery, embedder):
+    whole = gallery.index()
+    roster = gallery.index({"bob"})
+
+    assert gallery.index() is whole
+    assert gallery.index({"bob"}) is roster
+    assert roster.names == ["bob"]
+    assert np.array_equal(roster.embeddings, gallery.embeddings[2:3])
+
+    add_images(Path(gallery.root), "bob", 20, 21)
+    gallery.apply(embedder(), {"bob"})
+
+    assert gallery.index() is not whole
+    assert gallery.index({"bob"}).names == ["bob", "bob"]
+
+
+def test_store_keeps_no_lock_for_unknown_galleries(embedder):
+    store = GalleryStore(embedder())
+
+    for name in ("no-such-class", "../etc"):
+        with pytest.raises(ValueError):
+            store.get(name)
+
+    assert store._loading == {}
+    assert not store.resident
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+from backend.engine import SIM_THRESHOLD
+
+
+@pytest.fixture
+def engine(gallery_engine, unit):
+    return gallery_engine([("alice", unit(1)), ("alice", unit(1)), ("bob", unit(0, 1))])
+
+
+def test_batch_agrees_with_single_matches(engine, unit):
+    rng = np.random.default_rng(0)
+    embs = [unit(1, 0.2), unit(0.1, 3), unit(0, 0, 1)] + list(rng.normal(size=(5, 512)).astype(np.float32))
+
+    batch = engine.match_batch(embs)
+
+    assert len(batch) == len(embs)
+    for (name, score), emb in zip(batch, embs):
+        single_name, single_score = engine.match(emb)
+        assert name == single_name
+        assert score == pytest.approx(single_score, abs=1e-5)
+
+
+def test_batch_keeps_order_and_scale(engine, unit):
+    # embeddings need not be normalised
+    results = engine.match_batch([unit(0, 7), unit(5)])
+
+    assert [name for name, _ in results] == ["bob", "alice"]
+    assert [score for _, score in results] == pytest.approx([1.0, 1.0])
+
+
+def test_scores_below_the_threshold_are_unknown(engine, unit):
+    s = SIM_THRESHOLD
+    below = unit(s - 0.01, 0, np.sqrt(1 - (s - 0.01) ** 2))
+    above = unit(s + 0.01, 0, np.sqrt(1 - (s + 0.01) ** 2))
+
+    (name_below, score_below), (name_above, score_above) = engine.match_batch([below, above])
+
+    assert name_below == "Unknown" and score_below == pytest.approx(s - 0.01, abs=1e-5)
+    assert name_above == "alice" and score_above == pytest.approx(s + 0.01, abs=1e-5)
+
+
+def test_empty_inputs(engine, unit):
+    assert engine.match_batch([]) == []
+
+    engine.embeddings = np.zeros((0, 512), np.float32)
+    engine.names = []
+    assert engine.match_batch([unit(1), unit(0, 1)]) == [("Unknown", 0), ("Unknown", 0)]
+
+
+def test_batch_searches_a_roster_index(engine, unit):
+    index = engine.gallery.index({"bob"})
+
+    name, _ = engine.match_batch([unit(1, 0.1)], index)[0]
+    assert name == "Unknown"
+    name, _ = engine.match_batch([unit(0.1, 1)], index)[0]
+    assert name == "bob"
@@ -0,0 +1,73 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from backend.pacing import PACE_PATIENCE, PaceController, det_sizes
+
+
+def engine():
+    return SimpleNamespace(det_size=640, det_scalable=True, live_det_size=None)
+
+
+def pace(mode, eng=None, **kwargs):
+    controller = PaceController(eng or engine(), mode=mode, **kwargs)
+    controller.on_battery = lambda: False
+    return controller
+
+
+def frame(controller, wall, cpu=0.0):
+    # a frame that took `wall` seconds and `cpu` seconds of CPU
+    return controller.observe((time.perf_counter() - wall, time.process_time() - cpu))
+
+
+def test_det_sizes():
+    assert det_sizes(640) == (256, 320, 416, 512, 640)
+    assert det_sizes(300) == (256, 300)
+
+
+def test_off_keeps_the_fixed_interval():
+    controller = pace("off", fixed=1.0)
+    assert frame(controller, 0.5) == 1.0
+    assert controller.det_size is None
+
+
+def test_cpu_spreads_frames_over_the_budget():
+    controller = pace("cpu", cpu=1.0, min_interval=0.03, max_interval=2.0)
+    # 0.2s of CPU at one core: wait another 0.1s after a 0.1s frame
+    assert frame(controller, 0.1, cpu=0.2) == pytest.approx(0.1, abs=0.01)
+
+    controller = pace("cpu", cpu=2.0, min_interval=0.03, max_interval=2.0)
+    assert frame(controller, 0.1, cpu=0.1) == pytest.approx(0.03)
+
+
+def test_slow_frames_step_detection_down_after_patience():
+    eng = engine()
+    controller = pace("latency", eng, slo_ms=250)
+    for _ in range(PACE_PATIENCE - 1):
+        frame(controller, 0.5)
+    assert controller.det_size == 640
+    frame(controller, 0.5)
+    assert controller.det_size == 512
+    assert eng.live_det_size == 512
+
+
+def test_fast_frames_step_back_up():
+    eng = engine()
+    controller = pace("latency", eng, slo_ms=250)
+    for _ in range(PACE_PATIENCE):
+        frame(controller, 0.5)
+    assert controller.det_size == 512
+    for _ in range(PACE_PATIENCE * 10):
+        frame(controller, 0.01)
+    assert controller.det_size == 640
+    assert eng.live_det_size is None
+
+
+def test_shared_engine_is_left_alone():
+    eng = engine()
+    controller = pace("latency", eng, slo_ms=250, drive_engine=False)
+    for _ in range(PACE_PATIENCE):
+        frame(controller, 0.5)
+    assert controller.live_det_size == 512
+    assert eng.live_det_size is None
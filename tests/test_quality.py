@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend.quality import QualityGate, yaw
+
+# eyes 40 px apart, nose centred below them
+KPS = np.array([[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]], np.float32)
+
+
+def face(score=0.9, size=100, kps=KPS):
+    return SimpleNamespace(det_score=score, bbox=np.array([0, 0, size, size], np.float32), kps=kps)
+
+
+@pytest.fixture
+def sharp():
+    return np.random.default_rng(0).integers(0, 256, (120, 120, 3), dtype=np.uint8)
+
+
+def test_good_face_passes(sharp):
+    assert QualityGate().check(sharp, face()) is None
+
+
+def test_each_threshold_rejects(sharp):
+    gate = QualityGate(min_size=24, min_score=0.6, min_sharpness=15, max_yaw=55)
+    turned = KPS.copy()
+    turned[2] = [68, 60]  # nose almost under the right eye
+
+    assert gate.check(sharp, face(score=0.55)) == "score"
+    assert gate.check(sharp, face(size=20)) == "small"
+    assert gate.check(sharp, face(kps=turned)) == "pose"
+    assert gate.check(np.full((120, 120, 3), 128, np.uint8), face()) == "blur"
+
+
+def test_thresholds_are_inclusive_and_zero_turns_them_off(sharp):
+    assert QualityGate(min_score=0.6).check(sharp, face(score=0.6)) is None
+    assert QualityGate(min_size=24).check(sharp, face(size=24)) is None
+
+    off = QualityGate(min_size=0, min_score=0, min_sharpness=0, max_yaw=0)
+    assert off.check(np.zeros((120, 120, 3), np.uint8), face(score=0.1, size=4)) is None
+
+
+def test_yaw_follows_the_nose():
+    assert yaw(KPS) == pytest.approx(0)
+    turned = KPS.copy()
+    turned[2] = [60, 60]
+    assert yaw(turned) == pytest.approx(30)
+    turned[2] = [40, 60]
+    assert yaw(turned) == pytest.approx(-30)
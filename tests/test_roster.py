@@ -0,0 +1,26 @@
+from backend.roster import read_roster, resolve_roster
+
+NAMES = ["2400351_Aryan", "2400351_Aryan", "2402180_Daksh", "2409999_Mira", "guest"]
+
+
+def test_full_names_and_roll_numbers():
+    roster, missing = resolve_roster(["2400351_Aryan", "2402180", " guest "], NAMES)
+    assert roster == {"2400351_Aryan", "2402180_Daksh", "guest"}
+    assert missing == []
+
+
+def test_unmatched_entries_are_reported():
+    roster, missing = resolve_roster(["2402180", "2499999", "Roll No"], NAMES)
+    assert roster == {"2402180_Daksh"}
+    assert missing == ["2499999", "Roll No"]
+
+
+def test_roll_number_shared_by_folders_takes_all():
+    roster, _ = resolve_roster(["2400351"], ["2400351_Aryan", "2400351_Aryan_K"])
+    assert roster == {"2400351_Aryan", "2400351_Aryan_K"}
+
+
+def test_read_roster_csv(tmp_path):
+    path = tmp_path / "cse3a.csv"
+    path.write_text('roll,name\n# absent all term\n"2400351",Aryan\n\n2402180_Daksh\n')
+    assert read_roster(path) == ["roll", "2400351", "2402180_Daksh"]
@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+from insightface.app.common import Face
+
+import backend.session
+from backend.evidence import Evidence
+from backend.metrics import METRICS
+from backend.session import PRESENCE_INTERVAL, UNKNOWN_RETRY, AttendanceSession
+
+# where each person stands in the frame
+BOXES = {"alice": (0, 0, 100, 100), "bob": (200, 0, 300, 100), "stranger": (400, 0, 500, 100)}
+
+FRAME = np.zeros((100, 500, 3), np.uint8)
+
+
+class Camera:
+
+    # replaces the engine's detect and embed: the people in `scene` are found
+    # at their boxes and embedded by box. Counts detections, embedded faces
+    # per frame and the names each batch was matched against.
+    def __init__(self, engine, embeddings):
+        self.engine = engine
+        self.scene = []
+        self.detects = 0
+        self.embedded = []
+        self.searched = []
+        self.embeddings = {BOXES[name][0]: emb for name, emb in embeddings.items()}
+
+        match_batch = engine.match_batch
+
+        def spy(embs, index=None, faces=None, **kwargs):
+            if len(embs):
+                self.searched.append(sorted(set(index.names)))
+            return match_batch(embs, index, faces, **kwargs)
+
+        engine.detect, engine.embed, engine.match_batch = self.detect, self.embed, spy
+
+    def detect(self, frame, det_size=None):
+        self.detects += 1
+        return [Face(bbox=np.array(BOXES[name], np.float32), kps=None, det_score=0.9) for name in self.scene]
+
+    def embed(self, frame, faces):
+        self.embedded.append(len(faces))
+        for face in faces:
+            face.embedding = self.embeddings[int(face.bbox[0])]
+        return faces
+
+
+@pytest.fixture
+def camera(gallery_engine, unit):
+    engine = gallery_engine([("alice", unit(1)), ("bob", unit(0, 1))])
+    return Camera(engine, {"alice": unit(1), "bob": unit(0, 1), "stranger": unit(0, 0, 1)})
+
+
+@pytest.fixture
+def session(camera):
+    session = AttendanceSession(camera.engine)
+    session.evidence = Evidence("single")
+    return session
+
+
+def test_recognised_tracks_are_not_embedded_again(camera, session):
+    camera.scene = ["alice"]
+    results = session.process(FRAME)
+
+    assert results[0]["name"] == "alice"
+    assert session.present == {"alice"}
+
+    session.process(FRAME)
+    session.process(FRAME)
+    assert camera.embedded == [1, 0, 0]
+
+
+def test_new_faces_search_only_the_unseen_students(camera, session):
+    camera.scene = ["alice"]
+    session.process(FRAME)
+    camera.scene = ["alice", "bob"]
+    session.process(FRAME)
+
+    assert camera.searched == [["alice", "bob"], ["bob"]]
+    assert session.present == {"alice", "bob"}
+
+
+def test_unknown_tracks_are_retried_every_few_frames(camera, session):
+    camera.scene = ["stranger"]
+    frames = 2 * UNKNOWN_RETRY + 1
+
+    for _ in range(frames):
+        assert session.process(FRAME)[0]["name"] == "Unknown"
+
+    embedded = [i for i, n in enumerate(camera.embedded) if n]
+    assert embedded == list(range(0, frames, UNKNOWN_RETRY))
+
+
+def test_complete_session_stops_embedding(camera, session):
+    camera.scene = ["alice", "bob", "stranger"]
+    session.process(FRAME)
+    assert session.complete
+
+    # the stranger is not retried once everyone is present
+    for _ in range(2 * UNKNOWN_RETRY):
+        session.process(FRAME)
+
+    assert camera.embedded == [3] + [0] * 2 * UNKNOWN_RETRY
+    assert camera.detects == 1 + 2 * UNKNOWN_RETRY
+
+
+def test_complete_session_only_checks_presence_every_interval(camera, session, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(backend.session.time, "monotonic", lambda: now[0])
+
+    camera.scene = ["alice"]
+    session.process(FRAME)
+    # not complete: every frame is due
+    assert session.due()
+
+    camera.scene = ["alice", "bob"]
+    session.process(FRAME)
+    assert session.complete
+    assert not session.due()
+
+    now[0] += PRESENCE_INTERVAL - 0.01
+    assert not session.due()
+    now[0] += 0.01
+    assert session.due()
+
+    session.process(FRAME)
+    assert not session.due()
+
+
+def test_roster_scopes_the_search(camera):
+    session = AttendanceSession(camera.engine, roster={"bob"})
+    session.evidence = Evidence("single")
+    camera.scene = ["alice", "bob"]
+
+    results = session.process(FRAME)
+
+    assert camera.searched == [["bob"]]
+    assert session.present == {"bob"}
+    assert session.complete
+    assert {r["name"] for r in results} == {"Unknown", "bob"}
+
+
+def test_faces_count_as_unknown_once(camera, session, unit):
+    camera.scene = ["alice"]
+    session.process(FRAME)
+    # a second face of alice, where bob stands: found among the present ones
+    camera.embeddings[BOXES["bob"][0]] = unit(1)
+    camera.scene = ["alice", "bob", "stranger"]
+    before = METRICS.counters.get("unknown_faces", 0)
+
+    results = session.process(FRAME)
+
+    # the stranger missed the unseen and the seen students, and counts once
+    assert [r["name"] for r in results] == ["alice", "alice", "Unknown"]
+    assert METRICS.counters.get("unknown_faces", 0) - before == 1
@@ -0,0 +1,66 @@
+import numpy as np
+
+from backend.tiling import TiledDetector, nms, tile_grid
+
+
+def test_small_frame_is_one_tile():
+    assert tile_grid(480, 640, 960) == [(0, 0, 640, 480)]
+
+
+def test_tiles_overlap_and_cover_the_frame():
+    tiles = tile_grid(2160, 3840, 1280, overlap=0.25)
+    xs = sorted({x0 for x0, _, _, _ in tiles})
+    ys = sorted({y0 for _, y0, _, _ in tiles})
+
+    assert xs == [0, 960, 1920, 2560]
+    assert ys == [0, 880]
+    # the last row and column end at the frame edge
+    assert max(x1 for _, _, x1, _ in tiles) == 3840
+    assert max(y1 for _, _, _, y1 in tiles) == 2160
+    assert all(x1 - x0 == 1280 and y1 - y0 == 1280 for x0, y0, x1, y1 in tiles)
+    # neighbours share at least a quarter of a tile
+    assert all(b - a <= 960 for a, b in zip(xs, xs[1:]))
+
+
+def test_nms_keeps_the_best_of_overlapping_boxes():
+    dets = np.array([
+        [0, 0, 100, 100, 0.8],
+        [5, 5, 105, 105, 0.9],
+        [300, 300, 400, 400, 0.7],
+    ], np.float32)
+    assert list(nms(dets)) == [1, 2]
+
+
+def test_nms_keeps_boxes_below_the_iou_threshold():
+    dets = np.array([
+        [0, 0, 100, 100, 0.9],
+        [70, 0, 170, 100, 0.8],
+    ], np.float32)
+    assert list(nms(dets, iou=0.4)) == [0, 1]
+    assert list(nms(dets, iou=0.1)) == [0]
+
+
+class FakeDetector:
+
+    # finds nothing, and records the input size of each call
+    def __init__(self):
+        self.sizes = []
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        self.sizes.append(input_size)
+        return np.zeros((0, 5), np.float32), None
+
+
+def test_paced_det_size_reaches_every_tile():
+    det = FakeDetector()
+    tiler = TiledDetector(det, tile=100, workers=1)
+    frame = np.zeros((150, 250, 3), np.uint8)
+
+    tiler.detect(frame)
+    calls = len(det.sizes)
+    # the whole frame plus a 3 x 2 grid of tiles
+    assert calls == 1 + 6
+    assert det.sizes == [None] * calls
+
+    tiler.detect(frame, 320)
+    assert det.sizes[calls:] == [(320, 320)] * calls
@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from backend.tracking import FaceTracker, iou_matrix
+
+
+def face(x1, y1, x2, y2):
+    return SimpleNamespace(bbox=np.array([x1, y1, x2, y2], np.float32))
+
+
+def test_iou_matrix():
+    a = np.array([[0, 0, 10, 10]], np.float32)
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]], np.float32)
+    assert np.allclose(iou_matrix(a, b), [[1.0, 50 / 150, 0.0]])
+
+
+def test_moving_face_keeps_its_track():
+    tracker = FaceTracker()
+    first, = tracker.update([face(0, 0, 100, 100)])
+    second, = tracker.update([face(10, 5, 110, 105)])
+    assert second is first
+    assert second.bbox[0] == 10
+
+
+def test_faces_take_the_track_they_overlap_most():
+    tracker = FaceTracker()
+    left, right = tracker.update([face(0, 0, 100, 100), face(200, 0, 300, 100)])
+    # same faces, listed the other way round
+    a, b = tracker.update([face(205, 0, 305, 100), face(5, 0, 105, 100)])
+    assert a is right and b is left
+
+
+def test_little_overlap_starts_a_new_track():
+    tracker = FaceTracker(iou=0.3)
+    first, = tracker.update([face(0, 0, 100, 100)])
+    second, = tracker.update([face(80, 80, 180, 180)])
+    assert second is not first
+    assert second.id == first.id + 1
+
+
+def test_unseen_tracks_expire():
+    tracker = FaceTracker(max_misses=2)
+    first, = tracker.update([face(0, 0, 100, 100)])
+    tracker.update([])
+    tracker.update([])
+    assert tracker.tracks == [first]
+    tracker.update([])
+    assert tracker.tracks == []
+    again, = tracker.update([face(0, 0, 100, 100)])
+    assert again is not first
@@ -0,0 +1,98 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+from insightface.app.common import Face
+
+from backend.engine import SIM_THRESHOLD
+
+
+class FakeRecognizer:
+
+    # embeds a crop by looking it up; the mirrored crops are the ones registered
+    def __init__(self):
+        self.feats = {}
+        self.calls = []
+        self.session = SimpleNamespace(get_inputs=lambda: [SimpleNamespace(shape=["None", 3, 112, 112])])
+
+    def register(self, crop, feat):
+        self.feats[crop[:, ::-1].tobytes()] = feat
+
+    def get_feat(self, crops):
+        self.calls.append(len(crops))
+        return np.stack([self.feats[c.tobytes()] for c in crops])
+
+
+def crop(seed):
+    return np.random.default_rng(seed).integers(0, 256, (4, 4, 3), dtype=np.uint8)
+
+
+@pytest.fixture
+def rec():
+    return FakeRecognizer()
+
+
+@pytest.fixture
+def toward_alice(unit):
+    # -> a unit vector scoring `score` against alice and 0 against bob
+    return lambda score: unit(score, 0, np.sqrt(1 - score ** 2))
+
+
+@pytest.fixture
+def engine(gallery_engine, unit, rec):
+    engine = gallery_engine([("alice", unit(1)), ("bob", unit(0, 1))], tta_margin=0.05)
+    engine._app = SimpleNamespace(models={"recognition": rec})
+    return engine
+
+
+def test_borderline_miss_is_rescued_by_the_mirrored_face(engine, rec, toward_alice, unit):
+    face = Face(embedding=toward_alice(SIM_THRESHOLD - 0.02), crop=crop(0))
+    rec.register(face.crop, toward_alice(0.9))
+
+    (name, score), = engine.match_batch([face.embedding], faces=[face])
+
+    assert name == "alice" and score > SIM_THRESHOLD
+    # the fused embedding replaces the original
+    assert face.embedding @ unit(1) / np.linalg.norm(face.embedding) == pytest.approx(score, abs=1e-5)
+
+
+def test_borderline_match_can_be_withdrawn(engine, rec, toward_alice):
+    face = Face(embedding=toward_alice(SIM_THRESHOLD + 0.02), crop=crop(0))
+    rec.register(face.crop, toward_alice(0.1))
+
+    (name, _), = engine.match_batch([face.embedding], faces=[face])
+
+    assert name == "Unknown"
+
+
+def test_only_borderline_faces_are_embedded_again(engine, rec, toward_alice):
+    clear = Face(embedding=toward_alice(0.9), crop=crop(1))
+    miss = Face(embedding=toward_alice(0.1), crop=crop(2))
+    borderline = [Face(embedding=toward_alice(SIM_THRESHOLD + d), crop=crop(3 + i))
+                  for i, d in enumerate((-0.04, 0.03))]
+    for face in borderline:
+        rec.register(face.crop, toward_alice(0.8))
+    faces = [clear, borderline[0], miss, borderline[1]]
+
+    results = engine.match_batch([f.embedding for f in faces], faces=faces)
+
+    assert [name for name, _ in results] == ["alice", "alice", "Unknown", "alice"]
+    assert rec.calls == [2]
+    assert results[0][1] == pytest.approx(0.9)
+
+
+def test_no_second_look_without_margin_faces_or_crop(engine, rec, toward_alice):
+    face = Face(embedding=toward_alice(SIM_THRESHOLD - 0.01))
+
+    assert engine.match_batch([face.embedding], faces=[face])[0][0] == "Unknown"
+
+    face.crop = crop(0)
+    assert engine.match_batch([face.embedding])[0][0] == "Unknown"
+
+    engine.tta_margin = 0
+    assert engine.match_batch([face.embedding], faces=[face])[0][0] == "Unknown"
+
+    assert rec.calls == []
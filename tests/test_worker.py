@@ -0,0 +1,195 @@
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+
+import backend.engine
+import backend.session
+from backend.evidence import Evidence
+from backend.worker import InferenceWorker, SharedFrameRing, serve
+
+
+def frame(value=0):
+    # columns numbered left to right, so a mirrored frame is easy to spot
+    f = np.zeros((6, 8, 3), np.uint8)
+    f[:] = np.arange(8, dtype=np.uint8)[None, :, None] + value
+    return f
+
+
+@pytest.fixture
+def ring():
+    ring = SharedFrameRing(size=2)
+    yield ring
+    ring.close(unlink=True)
+
+
+def test_ring_round_trip_through_shared_memory(ring):
+    local = ring.put(frame(10), 1)
+    reader = SharedFrameRing.attach(ring.name, ring.shape, ring.size)
+    try:
+        out = reader.read(1)
+        assert np.array_equal(out, frame(10)[:, ::-1])
+        # the caller gets a private copy, not a view of the shared block
+        assert not np.shares_memory(local, ring.slots)
+        assert not np.shares_memory(out, reader.slots)
+
+        # frame 3 reuses frame 1's slot
+        ring.put(frame(20), 3)
+        assert reader.read(1) is None
+        assert reader.read(3)[0, 0, 0] == 27
+    finally:
+        reader.close()
+
+
+def test_ring_reallocates_for_a_new_frame_size(ring):
+    ring.put(frame(), 1)
+    first = ring.name
+    ring.put(np.zeros((4, 4, 3), np.uint8), 2)
+    assert ring.name != first
+    assert ring.shape == (4, 4, 3)
+    assert not ring.valid(1) and ring.valid(2)
+
+
+class FakeSession:
+
+    # marks every name it is given, one per processed frame
+    def __init__(self, engine, roster=None):
+        self.roster = frozenset(roster or ())
+        self.present = set()
+        self.evidence = Evidence()
+        self.last_run = None
+
+    @property
+    def complete(self):
+        return bool(self.roster) and self.roster <= self.present
+
+    def due(self):
+        return True
+
+    def mark(self, name):
+        self.present.add(name)
+
+    def process(self, frame, det_size=None):
+        self.last_run = time.monotonic()
+        name = sorted(self.roster - self.present)[0]
+        self.evidence.add(name, 0.9)
+        self.mark(name)
+        return [{"name": name, "left": int(frame[0, 0, 0])}]
+
+
+class FakeEngine:
+
+    def __init__(self, model_pack=None, det_size=None):
+        self.det_size = det_size
+        self.det_scalable = False
+        self.live_det_size = None
+
+    def warm_up(self):
+        pass
+
+    def analyze(self, frame, det_size=None):
+        return [SimpleNamespace(bbox=np.array([1, 2, 3, 4], np.float32), embedding=np.ones(4), skipped=None)]
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    # the worker loop on a thread with in-process queues; only the process
+    # boundary is missing
+    monkeypatch.setattr(backend.engine, "Engine", FakeEngine)
+    monkeypatch.setattr(backend.session, "AttendanceSession", FakeSession)
+
+    worker = InferenceWorker("fake", 64)
+    worker.requests, worker.replies = queue.Queue(), queue.Queue()
+    thread = threading.Thread(target=serve, args=(worker.requests, worker.replies, "fake", 64), daemon=True)
+    thread.start()
+    assert worker.replies.get(timeout=5)[1] == "ready"
+    worker.process = SimpleNamespace(is_alive=thread.is_alive)
+    threading.Thread(target=worker._dispatch, args=(worker.process, worker.replies), daemon=True).start()
+
+    yield worker
+
+    worker.requests.put(("quit",))
+    thread.join(5)
+
+
+def reply(worker, client):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        msg = worker.poll(client)
+        if msg is not None:
+            return msg
+        time.sleep(0.01)
+    raise AssertionError("no reply from the worker")
+
+
+def test_attendance_round_trip(worker, ring):
+    client = worker.connect()
+    # a restarted worker is handed the students already present
+    worker.start(client, "attendance", {"alice", "bob", "carol"}, present={"alice"})
+
+    ring.put(frame(40), 1)
+    worker.send(client, ring, 1)
+    kind, frame_id, results, present, complete, _, _ = reply(worker, client)
+
+    assert (kind, frame_id) == ("results", 1)
+    # the worker saw the mirrored frame the ring holds
+    assert results == [{"name": "bob", "left": 47, "frame_id": 1}]
+    assert present == {"alice", "bob"} and not complete
+
+    ring.put(frame(), 2)
+    worker.send(client, ring, 2)
+    _, _, _, present, complete, _, _ = reply(worker, client)
+    assert present == {"alice", "bob", "carol"} and complete
+
+    present, evidence, profile = worker.stop(client)
+    assert present == {"alice", "bob", "carol"}
+    assert evidence.record("carol") is not None
+    assert profile is None
+
+
+def test_register_mode_returns_embeddings(worker, ring):
+    client = worker.connect()
+    worker.start(client, "register")
+
+    ring.put(frame(), 5)
+    worker.send(client, ring, 5)
+    _, _, results, present, _, _, _ = reply(worker, client)
+
+    result, = results
+    assert result["box"] == (1, 2, 3, 4)
+    assert np.array_equal(result["embedding"], np.ones(4))
+    assert result["frame_id"] == 5
+    assert present == set()
+    assert worker.stop(client) == (set(), None, None)
+
+
+def test_overwritten_frames_are_dropped(worker, ring):
+    client = worker.connect()
+    worker.start(client, "attendance", {"alice"})
+
+    ring.put(frame(), 1)
+    ring.put(frame(), 3)
+    worker.send(client, ring, 1)
+    _, frame_id, results, present, _, _, _ = reply(worker, client)
+
+    assert frame_id == 1 and results is None and present == set()
+
+
+def test_clients_do_not_see_each_others_replies(worker, ring):
+    attend, register = worker.connect(), worker.connect()
+    worker.start(attend, "attendance", {"alice"})
+    worker.start(register, "register")
+
+    ring.put(frame(), 1)
+    worker.send(register, ring, 1)
+    assert reply(worker, register)[3] == set()
+    assert worker.poll(attend) is None
+
+    assert worker.stop(attend)[0] == set()
+    worker.disconnect(attend)
+    assert worker.stop(attend) is None
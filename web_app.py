@@ -1,17 +1,119 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, g
+import atexit
 import cv2
 import numpy as np
 import os
 import csv
+import random
+import threading
 from datetime import datetime
 from backend.engine import Engine
+from backend.evidence import Evidence
+from backend.memory import MB, MEMORY
+from backend.metrics import METRICS
+from backend.pacing import PaceController
+from backend.profiling import PROFILE_SAMPLE, SamplingProfiler
+from backend.roster import ROSTER_FALLBACK, resolve_roster
+from backend.watcher import WATCH_INTERVAL, GalleryWatcher
 
 app = Flask(__name__)
-engine = Engine()
 
-# 🔹 Session state
+# 🔹 Attendance CSV (point it elsewhere for load tests)
+ATTENDANCE_FILE = os.environ.get("ATTEND_ATTENDANCE_FILE", "attendance.csv")
+
+# 🔹 Engine: models and gallery load in the background so the worker answers
+# requests immediately; /ready and /process report "warming_up" until done.
+# Students registered later are picked up by the gallery watcher.
+engine = Engine(load_gallery=False)
+engine_ready = threading.Event()
+engine_error = None
+
+
+def warm_up_engine():
+    global engine_error
+    try:
+        # watch first, so students registered during the load are not missed
+        if WATCH_INTERVAL > 0:
+            GalleryWatcher(engine).start()
+        engine.load_faces()
+        engine.warm_up()
+        engine_ready.set()
+        print("Engine ready")
+    except Exception as e:
+        engine_error = str(e)
+        print("Engine warm-up error:", e)
+
+
+threading.Thread(target=warm_up_engine, name="engine-warm-up", daemon=True).start()
+
+# 🔹 Session state; with a roster, matching is limited to that class, and
+# with a gallery to that department's students (backend/gallery.py).
+# A student is only marked once session_evidence confirms them
+# (backend/evidence.py).
 current_session = set()
 session_active = False
+session_evidence = Evidence()
+session_gallery = None
+session_roster = None
+session_index = None
+session_fallback = ROSTER_FALLBACK
+
+# 🔹 Pacing: each /process response carries X-Next-Interval, the milliseconds
+# the client should wait before sending its next frame (backend/pacing.py);
+# with ATTEND_PACE=off that is the old fixed second. Each session gets its
+# own controller (requests outside a session share one), and its detection
+# size is passed per request, so the shared engine is never resized. Every
+# tablet of a session polls at the interval given, so web clients are never
+# told to come back sooner than WEB_MIN_INTERVAL.
+WEB_MIN_INTERVAL = float(os.environ.get("ATTEND_WEB_PACE_MIN_INTERVAL", "0.5") or 0.5)
+
+
+def new_pace():
+    return PaceController(engine, fixed=1.0, min_interval=WEB_MIN_INTERVAL, drive_engine=False)
+
+
+idle_pace = new_pace()
+session_pace = None
+
+# 🔹 Profiling: a sample of /process requests feeds one shared profiler,
+# dumped to disk every PROFILE_DUMP_EVERY sampled requests, at /end and when
+# the server exits
+PROFILE_DUMP_EVERY = 100
+profiler = SamplingProfiler("process") if PROFILE_SAMPLE > 0 else None
+profiled_requests = 0
+
+
+@app.before_request
+def start_request_profile():
+    if profiler and request.path == "/process" and random.random() < PROFILE_SAMPLE:
+        # started lazily so the sampler thread lives in the worker process
+        if profiler.started is None:
+            profiler.start()
+        profiler.add_thread(name="process")
+        g.profiled = True
+
+
+@app.teardown_request
+def stop_request_profile(_exc):
+    global profiled_requests
+    if not g.get("profiled"):
+        return
+    profiler.remove_thread()
+    profiled_requests += 1
+    if profiled_requests % PROFILE_DUMP_EVERY == 0:
+        dump_profile()
+
+
+def dump_profile():
+    # writes the samples since the last dump, if there are any
+    if profiler is None or profiler.started is None:
+        return
+    path = profiler.dump()
+    if path:
+        print("Profile written to", path)
+
+
+atexit.register(dump_profile)
 
 
 @app.route("/")
@@ -19,13 +121,63 @@ def index():
     return render_template("index.html")
 
 
+# 💓 LIVENESS
+@app.route("/healthz")
+def healthz():
+    return jsonify({"status": "ok"})
+
+
+# ✅ READINESS
+@app.route("/ready")
+def ready():
+    if engine_ready.is_set():
+        return jsonify({"status": "ready"})
+    if engine_error:
+        return jsonify({"status": "error", "error": engine_error}), 503
+    return jsonify({"status": "warming_up"}), 503
+
+
 # ▶️ START SESSION
+# Optional JSON body:
+#   {"gallery": "cse", "roster": ["2400351", "2402180_Daksh", ...], "fallback": true}
 @app.route("/start", methods=["POST"])
 def start_session():
-    global current_session, session_active
+    global current_session, session_active, session_evidence, session_gallery, session_roster, session_index
+    global session_fallback, session_pace
+
+    body = request.get_json(silent=True) or {}
+    gallery, roster, missing = None, None, []
+
+    if body.get("roster") or body.get("gallery"):
+        if not engine_ready.is_set():
+            return jsonify({"status": "error" if engine_error else "warming_up"}), 503
+        try:
+            gallery = engine.galleries.get(body.get("gallery"))
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 404
+
+    if body.get("roster"):
+        roster, missing = resolve_roster(body["roster"], gallery.names)
+        if not roster:
+            return jsonify({"status": "error", "error": "no roster entries are registered",
+                            "missing": missing}), 400
+
     current_session = set()
+    session_pace = new_pace()
     session_active = True
-    return jsonify({"status": "started"})
+    session_evidence = Evidence()
+    session_gallery = gallery
+    session_roster = roster
+    session_index = gallery.index(roster) if gallery is not None else None
+    session_fallback = bool(body.get("fallback", ROSTER_FALLBACK))
+    MEMORY.start_session()
+
+    response = {"status": "started"}
+    if gallery is not None:
+        response["gallery"] = gallery.name
+    if roster:
+        response.update({"roster": len(roster), "missing": missing})
+    return jsonify(response)
 
 
 # ⏹ END SESSION
@@ -34,74 +186,167 @@ def end_session():
     global session_active
     session_active = False
 
-    save_attendance(current_session)
+    save_attendance(current_session, session_evidence)
+    dump_profile()
 
-    return jsonify({
+    peak = MEMORY.end_session()
+    if peak:
+        print(f"Session peak RSS {peak / MB:.0f} MB")
+
+    response = {
         "status": "ended",
         "count": len(current_session),
-        "students": list(current_session)
-    })
+        "students": list(current_session),
+        "evidence": {name: session_evidence.record(name) for name in current_session}
+    }
+    if session_roster:
+        response["absent"] = sorted(session_roster - current_session)
+
+    return jsonify(response)
 
 
 # 🎥 PROCESS FRAME
+# Outside a session, a "gallery" form field or query parameter picks the
+# student body to match against
 @app.route("/process", methods=["POST"])
 def process():
     global current_session, session_active
 
+    if not engine_ready.is_set():
+        return jsonify({"status": "error" if engine_error else "warming_up"}), 503
+
+    pace = session_pace if session_active else idle_pace
+
+    if session_active:
+        index, gallery = session_index, session_gallery
+    elif request.values.get("gallery"):
+        try:
+            gallery = engine.galleries.get(request.values["gallery"])
+        except ValueError as e:
+            return jsonify({"status": "error", "error": str(e)}), 404
+        index = gallery.index()
+    else:
+        index, gallery = None, None
+
     file = request.files.get("frame")
     if not file:
         return jsonify([])
 
-    img_bytes = file.read()
-    npimg = np.frombuffer(img_bytes, np.uint8)
-    frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+    METRICS.inc("frames")
+    started = pace.start()
+
+    with METRICS.time("decode"):
+        img_bytes = file.read()
+        npimg = np.frombuffer(img_bytes, np.uint8)
+        frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+
+    if frame is None:
+        METRICS.inc("dropped_frames")
+        return jsonify([])
 
     results = []
 
     try:
-        faces = engine.app.get(frame)
+        with MEMORY.trace("request"):
+            faces = engine.analyze(frame, pace.live_det_size)
     except Exception as e:
         print("Error:", e)
+        METRICS.inc("errors")
+        METRICS.inc("dropped_frames")
         return jsonify([])
 
+    # faces that failed the quality gate are reported, not matched
     for face in faces:
+        if face.skipped:
+            x1, y1, x2, y2 = map(int, face.bbox)
+            results.append({"name": "Unknown", "score": 0.0, "box": [x1, y1, x2, y2],
+                            "skipped": face.skipped})
+
+    faces = [face for face in faces if not face.skipped]
+    # a face may be looked up twice; it counts as unknown once, below
+    matches = engine.match_batch([face.embedding for face in faces], index, faces, count=False)
+
+    for face, (name, score) in zip(faces, matches):
         x1, y1, x2, y2 = map(int, face.bbox)
-        name, score = engine.match(face.embedding)
+        guest = False
 
-        if session_active and name != "Unknown":
-            current_session.add(name)
+        # not in this class: look them up in the whole gallery only if asked
+        # to, and never mark them present
+        if name == "Unknown" and session_active and session_roster and session_fallback:
+            name, score = engine.match(face.embedding, gallery.index(), count=False)
+            guest = name != "Unknown"
 
-        results.append({
+        if name == "Unknown":
+            METRICS.inc("unknown_faces")
+
+        pending = False
+        if session_active and name != "Unknown" and not guest:
+            if session_evidence.add(name, score):
+                current_session.add(name)
+            else:
+                pending = True
+
+        result = {
             "name": name,
             "score": float(score),
             "box": [x1, y1, x2, y2]
-        })
+        }
+        if guest:
+            result["guest"] = True
+        if pending:
+            result["pending"] = True
+        results.append(result)
+
+    pace.observe(started)
 
-    return jsonify(results)
+    response = jsonify(results)
+    response.headers["X-Next-Interval"] = str(int(pace.interval * 1000))
+    if pace.det_size:
+        response.headers["X-Det-Size"] = str(pace.det_size)
+    return response
 
 
 # 💾 SAVE ATTENDANCE
-def save_attendance(names):
+# With evidence, each row also says how the student was confirmed; a file
+# started before these columns existed keeps its three
+ATTENDANCE_HEADER = "Name,Time,Status,Hits,Score,First Seen"
+
+
+def save_attendance(names, evidence=None):
     if not names:
         return
 
-    file_exists = os.path.exists("attendance.csv")
+    file_exists = os.path.exists(ATTENDANCE_FILE)
+
+    header = ATTENDANCE_HEADER
+    if file_exists:
+        with open(ATTENDANCE_FILE) as f:
+            header = f.readline().strip()
+    detailed = header == ATTENDANCE_HEADER
 
-    with open("attendance.csv", "a") as f:
+    with METRICS.time("persist"), open(ATTENDANCE_FILE, "a") as f:
         if not file_exists:
-            f.write("Name,Time,Status\n")
+            f.write(header + "\n")
 
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
         for name in names:
-            f.write(f"{name},{now},Present\n")
+            if not detailed:
+                f.write(f"{name},{now},Present\n")
+                continue
+            record = evidence.record(name) if evidence is not None else None
+            if record:
+                first = datetime.fromtimestamp(record["first_seen"]).strftime("%Y-%m-%d %H:%M:%S")
+                f.write(f"{name},{now},Present,{record['hits']},{record['score']:.3f},{first}\n")
+            else:
+                f.write(f"{name},{now},Present,,,\n")
 
 
 # 📊 ANALYTICS
 @app.route("/analytics")
 def analytics():
     registered_path = "data/registered_faces"
-    attendance_file = "attendance.csv"
+    attendance_file = ATTENDANCE_FILE
 
     total_registered = len(os.listdir(registered_path)) if os.path.exists(registered_path) else 0
 
@@ -126,13 +371,38 @@ def analytics():
     })
 
 
+# 📈 METRICS (Prometheus text format)
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+
+# ⏱ PACE (current decisions of the session's rate controller)
+@app.route("/pace")
+def pace_state():
+    pace = session_pace if session_active else idle_pace
+    return jsonify(pace.describe())
+
+
+# 🗂 GALLERIES (resident ones are per worker process)
+@app.route("/galleries")
+def galleries():
+    return jsonify(engine.galleries.describe())
+
+
+# 🧠 MEMORY REPORT (per worker process)
+@app.route("/memory")
+def memory():
+    return jsonify(MEMORY.report(engine))
+
+
 # 📥 DOWNLOAD CSV
 @app.route("/download")
 def download():
-    if not os.path.exists("attendance.csv"):
+    if not os.path.exists(ATTENDANCE_FILE):
         return "No attendance file found", 404
 
-    return send_file("attendance.csv", as_attachment=True)
+    return send_file(ATTENDANCE_FILE, as_attachment=True)
 
 
 if __name__ == "__main__":